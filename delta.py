@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Дельта-выгрузка: множество уже выгруженных GUID.
+Источники — имена <GUID>.txt (и <GUID>__N.txt) в папке TXT и журнал processed_guids.xlsx.
+Строки с GUID из этого множества пропускаются без выделения и клика экспорта.
+Режим изменений дополнительно сравнивает отпечатки ключевых ячеек строки с прошлым запуском.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Set
+
+
+logger = logging.getLogger(__name__)
+
+_DUP_SUFFIX_RE = re.compile(r"__\d+$")
+
+
+def normalize_guid(guid) -> str:
+    """GUID для сравнения между списком, таблицей, журналом и именами TXT: без пробелов, фигурных скобок и регистра"""
+    return str(guid or "").strip().strip("{}").strip().lower()
+
+
+def guids_from_txt_files(txt_out_dir: str) -> Set[str]:
+    """GUID по именам TXT в папке (суффикс __N дубликатов отбрасывается), в виде normalize_guid."""
+    out: Set[str] = set()
+    try:
+        names = os.listdir(txt_out_dir)
+    except Exception:
+        return out
+    for n in names:
+        if not n.lower().endswith(".txt") or n.startswith("_"):
+            continue
+        stem = normalize_guid(_DUP_SUFFIX_RE.sub("", n[:-4]))
+        if stem and stem != "unknown_guid":
+            out.add(stem)
+    return out
+
+
+def guids_from_ledger(ledger_path: str) -> Set[str]:
+    """GUID из первого столбца журнала (строка 1 — заголовок), в виде normalize_guid."""
+    out: Set[str] = set()
+    if not os.path.isfile(ledger_path):
+        return out
+    try:
+        from openpyxl import load_workbook  # type: ignore[import-untyped]
+    except ImportError:
+        logger.warning("openpyxl не установлен: журнал GUID для дельта-выгрузки не читается")
+        return out
+    try:
+        wb = load_workbook(ledger_path, read_only=True)
+        try:
+            for row in wb.active.iter_rows(min_row=2, max_col=1, values_only=True):
+                v = normalize_guid(row[0] if row else None)
+                if v:
+                    out.add(v)
+        finally:
+            wb.close()
+    except Exception as e:
+        logger.warning("Не удалось прочитать журнал GUID %s: %s", ledger_path, e)
+    return out
+
+
+def load_done_guids(txt_out_dir: str, ledger_path: str) -> Set[str]:
+    """Объединение GUID из имён файлов и журнала."""
+    by_files = guids_from_txt_files(txt_out_dir)
+    by_ledger = guids_from_ledger(ledger_path)
+    done = by_files | by_ledger
+    logger.info(
+        "Дельта-выгрузка: уже выгружено %d GUID (файлов %d, в журнале %d)",
+        len(done), len(by_files), len(by_ledger),
+    )
+    return done
+
+
+# --- Отпечатки строк: повторная выгрузка изменённых документов ---
+
+FINGERPRINTS_FILENAME = "_fingerprints.json"
+# столбцы отпечатка (заголовки через запятую): точное совпадение без учёта регистра, иначе первый
+# заголовок, содержащий имя. Набор фиксирован, чтобы новые столбцы таблицы не меняли все отпечатки
+FINGERPRINT_COLUMNS_ENV = "EB_FINGERPRINT_COLUMNS"
+DEFAULT_FINGERPRINT_COLUMNS = ("Статус документа", "Дата", "Сумма")
+
+
+def row_fingerprint(cells: List[str]) -> str:
+    """Хэш ячеек строки (статус, даты, суммы и т.д.)."""
+    norm = "\x1f".join(" ".join(str(c or "").split()) for c in cells)
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint_columns(header: List[str], names: Optional[List[str]] = None) -> List[int]:
+    """Номера столбцов отпечатка в header (порядок — как в names; по умолчанию EB_FINGERPRINT_COLUMNS)"""
+    if names is None:
+        env = [c.strip() for c in os.environ.get(FINGERPRINT_COLUMNS_ENV, "").split(",") if c.strip()]
+        names = env or list(DEFAULT_FINGERPRINT_COLUMNS)
+    low = [" ".join(str(h or "").split()).lower() for h in header]
+    out: List[int] = []
+    for name in names:
+        n = name.lower()
+        idx = low.index(n) if n in low else next((i for i, h in enumerate(low) if n in h), -1)
+        if idx >= 0 and idx not in out:
+            out.append(idx)
+    return out
+
+
+class FingerprintStore:
+    """
+    Отпечатки по GUID из прошлых запусков (TXT Outputs/_fingerprints.json).
+    classify(): new — GUID ещё не выгружался; changed — отпечаток изменился (TXT перевыгружается);
+    unchanged — без изменений (пропуск). Для выгруженных ранее GUID без отпечатка он просто запоминается.
+    Новый отпечаток сохраняется только после confirm() — когда TXT записан.
+    Отпечаток строится по столбцам fingerprint_columns(header); если их заголовки отличаются
+    от сохранённых, прошлые отпечатки сбрасываются (текущий запуск станет новой базой, без перевыгрузки).
+    """
+
+    def __init__(self, txt_out_dir: str, done_guids: Set[str], header: Optional[List[str]] = None):
+        self.path = os.path.join(txt_out_dir, FINGERPRINTS_FILENAME)
+        self.done_guids = done_guids
+        self.columns = fingerprint_columns(header or [])
+        self.column_names = [header[i] for i in self.columns] if header else []
+        if header and not self.columns:
+            logger.warning("Столбцы отпечатка не найдены в заголовке таблицы — отпечаток по всем ячейкам")
+        self.counts: Dict[str, int] = {"new": 0, "changed": 0, "unchanged": 0}
+        self._stored: Dict[str, str] = {}
+        self._pending: Dict[str, str] = {}
+        self._replacing: Set[str] = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f) or {}
+            # старый формат — плоский словарь отпечатков по всем ячейкам
+            stored_columns = data.get("columns") if "fingerprints" in data else None
+            if stored_columns == self.column_names:
+                self._stored = {normalize_guid(k): str(v) for k, v in (data.get("fingerprints") or {}).items()}
+            else:
+                logger.warning(
+                    "Столбцы отпечатка изменились (%s -> %s): отпечатки прошлых запусков сброшены",
+                    stored_columns, self.column_names,
+                )
+                self._dirty = True
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Не удалось прочитать %s: %s", self.path, e)
+
+    def fingerprint(self, cells: List[str]) -> str:
+        if not self.columns:
+            return row_fingerprint(cells)
+        return row_fingerprint([cells[i] if i < len(cells) else "" for i in self.columns])
+
+    def classify(self, guid: str, fingerprint: str) -> str:
+        guid = normalize_guid(guid)
+        with self._lock:
+            old = self._stored.get(guid)
+            if guid not in self.done_guids:
+                kind = "new"
+                self._pending[guid] = fingerprint
+            elif old is None:
+                kind = "unchanged"
+                self._stored[guid] = fingerprint
+                self._dirty = True
+            elif old == fingerprint:
+                kind = "unchanged"
+            else:
+                kind = "changed"
+                self._pending[guid] = fingerprint
+                self._replacing.add(guid)
+            self.counts[kind] += 1
+            return kind
+
+    def is_replacing(self, guid: str) -> bool:
+        guid = normalize_guid(guid)
+        with self._lock:
+            return guid in self._replacing
+
+    def confirm(self, guid: str) -> None:
+        """TXT по GUID записан — запоминаем новый отпечаток."""
+        guid = normalize_guid(guid)
+        with self._lock:
+            fp = self._pending.pop(guid, None)
+            self._replacing.discard(guid)
+            if fp is not None:
+                self._stored[guid] = fp
+                self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"columns": self.column_names, "fingerprints": dict(self._stored)}
+            self._dirty = False
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning("Не удалось сохранить %s: %s", self.path, e)
+
+    def report(self) -> Dict[str, int]:
+        c = dict(self.counts)
+        logger.info(
+            "Изменения: новых %d, изменённых %d, без изменений %d",
+            c["new"], c["changed"], c["unchanged"],
+        )
+        return c
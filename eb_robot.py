@@ -21,7 +21,11 @@ from selenium.webdriver.common.action_chains import ActionChains
 
 from authorization import run_authorization, click_native_ok, cert_dialog_visible
 from navigation import run_navigation
-from table_export2 import process_table_and_export
+from table_export2 import process_table_and_export, process_profile_sweep
+from profiles import load_profiles, profiles_path, select_profiles
+from multi_tab import get_tab_count, run_multi_tab_export
+from export_window import get_window_size
+from pacing import start_pacing
 from txt_output import load_progress, ask_start_index
 
 try:
@@ -218,6 +222,18 @@ def _do_click(driver, element):
 
 
 _driver_ref = []
+# рабочий процесс флота закрывает только свой браузер, чужие browser.exe не трогает
+_kill_all_browsers = [True]
+
+
+def _arg_value(name):
+    # значение аргумента вида --name=value или --name value
+    for i, a in enumerate(sys.argv):
+        if a.startswith(name + "="):
+            return a.split("=", 1)[1]
+        if a == name and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return None
 
 
 def _close_browser():
@@ -231,7 +247,8 @@ def _close_browser():
         _driver_ref.clear()
         
         time.sleep(0.5)
-        close_yandex_processes()
+        if _kill_all_browsers[0]:
+            close_yandex_processes()
 
 
 def main():
@@ -239,7 +256,12 @@ def main():
     _log_dir = os.path.dirname(os.path.abspath(__file__))
     _logs_dir = os.path.join(_log_dir, "logs")
     os.makedirs(_logs_dir, exist_ok=True)
-    _log_path = os.path.join(_logs_dir, "eb_robot.log")
+    # рабочий процесс флота (fleet.py): --worker=K --worker-dir=PATH --range=A-B
+    _worker = _arg_value("--worker")
+    _worker_dir = _arg_value("--worker-dir")
+    _range = _arg_value("--range")
+    _log_name = f"eb_robot_worker{_worker}.log" if _worker else "eb_robot.log"
+    _log_path = os.path.join(_logs_dir, _log_name)
     logging.basicConfig(
         level=logging.INFO,
         filename=_log_path,
@@ -257,23 +279,65 @@ def main():
         logging.error("EB_BASE_URL не задан. Задайте переменную окружения EB_BASE_URL")
         sys.exit(1)
 
-    # С какой записи начинать — спрашиваем в самом начале
-    _project_root = os.path.dirname(os.path.abspath(__file__))
-    _txt_out_dir = os.path.join(_project_root, "TXT Outputs")
-    _last_done = load_progress(_txt_out_dir)
-    _default_start = (_last_done + 1) if _last_done > 0 else 1
-    _start_index = ask_start_index(_default_start)
-
     yandex_path = os.environ.get("YANDEX_BROWSER", DEFAULT_YANDEX_PATH)
     user_data = os.environ.get("YANDEX_USER_DATA", DEFAULT_USER_DATA_DIR)
     headless = "--headless" in sys.argv
+    export_mode = "fire_collect" if "--fire-collect" in sys.argv else "sequential"
+    if "--requeue" in sys.argv:
+        # только записи из TXT Outputs/_requeue.json (python reconcile.py)
+        export_mode = "requeue"
+    # только новые документы: GUID, уже выгруженные в TXT Outputs, пропускаются
+    delta = "--delta" in sys.argv
+    # новые и изменённые документы (по отпечатку видимых ячеек строки)
+    changes = "--changes" in sys.argv
+    # список записей снимком таблицы (CSV/SQLite) вместо «Печати списка»
+    scrape_list = "--scrape-list" in sys.argv
+    # профили фильтров подряд в одной сессии: --profiles (все) или --profiles=имя1,имя2
+    profiles = None
+    if any(a == "--profiles" or a.startswith("--profiles=") for a in sys.argv):
+        _names = _arg_value("--profiles")
+        _names = [n.strip() for n in _names.split(",") if n.strip()] if _names and not _names.startswith("--") else None
+        _path = profiles_path(os.path.dirname(os.path.abspath(__file__)))
+        try:
+            profiles = select_profiles(load_profiles(_path), _names)
+        except Exception as e:
+            logging.error("Профили фильтров (%s): %s", _path, e)
+            sys.exit(1)
+        logging.info("Профили фильтров: %s", ", ".join(p.name for p in profiles))
+    download_dir = os.environ.get("BROWSER_DOWNLOADS_DIR")
+    # общая очередь диапазонов (work_queue.py): --queue=sqlite:///путь или EB_WORK_QUEUE
+    work_queue_url = _arg_value("--queue") or os.environ.get("EB_WORK_QUEUE", "").strip() or None
+    _end_index = None
+    _worker_txt_dir = None
+
+    if _worker and _worker_dir and _range:
+        # своя копия профиля, папка загрузок и промежуточная папка TXT; диапазон задаёт супервизор
+        _kill_all_browsers[0] = False
+        user_data = os.path.join(_worker_dir, "profile")
+        download_dir = os.path.join(_worker_dir, "downloads")
+        _worker_txt_dir = os.path.join(_worker_dir, "TXT Outputs")
+        _first, _, _last = _range.partition("-")
+        _start_index = max(1, int(_first))
+        _end_index = int(_last) if _last else None
+        logging.info("Рабочий %s: записи %s", _worker, _range)
+    elif work_queue_url or export_mode == "requeue" or profiles:
+        # у каждого профиля свой прогресс — без вопроса о начальной записи
+        _start_index = 1
+        close_yandex_processes()
+    else:
+        # С какой записи начинать — спрашиваем в самом начале
+        _project_root = os.path.dirname(os.path.abspath(__file__))
+        _txt_out_dir = os.path.join(_project_root, "TXT Outputs")
+        _last_done = load_progress(_txt_out_dir)
+        _default_start = (_last_done + 1) if _last_done > 0 else 1
+        _start_index = ask_start_index(_default_start)
+        close_yandex_processes()
 
-    close_yandex_processes()
     driver = create_yandex_driver(
         yandex_path=yandex_path,
         user_data_dir=user_data,
         headless=headless,
-        download_dir=None,
+        download_dir=download_dir if _worker_txt_dir else None,
     )
     _driver_ref.append(driver)
     atexit.register(_close_browser)
@@ -376,13 +440,54 @@ def main():
         if not nav_ok:
             logging.error("Навигация завершилась с ошибкой, выход")
             sys.exit(1)
-        if not _stop_requested():
+        tabs = 1 if (_worker_txt_dir or work_queue_url or export_mode == "requeue" or profiles) else get_tab_count()
+        if tabs > 1 and (delta or changes or export_mode == "fire_collect" or scrape_list):
+            # вкладки выгружают все строки своего диапазона сразу по клику: пропуска по журналу/отпечатку,
+            # двух фаз и чтения списка у них нет
+            logging.warning(
+                "EB_TABS=%d не используется с --delta/--changes/--fire-collect/--scrape-list — одна вкладка", tabs
+            )
+            tabs = 1
+        # контроллер AIMD — до печати списка: её ошибки тоже снижают лимит экспортов «в полёте»
+        start_pacing(get_window_size() * tabs)
+        if not _stop_requested() and profiles:
+            process_profile_sweep(
+                driver,
+                profiles,
+                download_dir=download_dir,
+                stop_check=_stop_requested,
+                do_click=_do_click,
+                export_mode=export_mode,
+                delta=delta,
+                changes=changes,
+                scrape_list=scrape_list,
+            )
+        elif not _stop_requested() and tabs > 1:
+            run_multi_tab_export(
+                driver,
+                tabs,
+                BASE_URL,
+                download_dir=download_dir,
+                stop_check=_stop_requested,
+                do_click=_do_click,
+                start_index=_start_index,
+                end_index=_end_index,
+            )
+        elif not _stop_requested():
             process_table_and_export(
                 driver,
-                download_dir=os.environ.get("BROWSER_DOWNLOADS_DIR"),
+                download_dir=download_dir,
                 stop_check=_stop_requested,
                 do_click=_do_click,
                 start_index=_start_index,
+                export_mode=export_mode,
+                end_index=_end_index,
+                txt_out_dir=_worker_txt_dir,
+                print_list=_worker_txt_dir is None and not work_queue_url,
+                work_queue_url=work_queue_url,
+                delta=delta,
+                changes=changes,
+                scrape_list=scrape_list,
             )
     except Exception as e:
         logging.exception("Ошибка при выполнении сценария")
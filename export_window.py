@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Окно одновременных экспортов TXT.
+Каждый клик «Экспорт TXT» регистрируется с GUID и временем клика. Скачанные ZIP
+сопоставляются с GUID по имени файла, именам файлов внутри архива, содержимому TXT
+и только в последнюю очередь — по порядку кликов, причём по порядку — лишь когда ожидается
+ровно один экспорт. Завершение не по порядку допустимо; несопоставленный ZIP остаётся в папке,
+а его запись уходит на повтор по таймауту.
+"""
+import os
+import json
+import time
+import zipfile
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from pacing import AimdController
+
+
+logger = logging.getLogger(__name__)
+
+# размер окна (сколько экспортов одновременно «в полёте»); 1 — прежнее поведение
+EXPORT_WINDOW_ENV = "EB_TXT_WINDOW"
+DEFAULT_WINDOW = 1
+MAX_WINDOW = 16
+
+# сколько секунд размер файла должен не меняться, чтобы считать скачивание завершённым
+STABLE_SECONDS = 1.2
+# сколько байт TXT читать при поиске GUID в содержимом
+CONTENT_PROBE_BYTES = 64 * 1024
+
+WINDOW_STATS_FILENAME = "_window_stats.jsonl"
+
+# сколько секунд после таймаута экспорт считается «возможно ещё придёт»:
+# его поздний ZIP не отдаётся другим записям и не берётся при повторе
+LATE_GRACE_SECONDS = 300
+
+# папка загрузок -> GUID просроченных экспортов -> время таймаута
+_late: Dict[str, Dict[str, float]] = {}
+_late_lock = threading.Lock()
+
+
+def _dir_key(dir_path: str) -> str:
+    return os.path.normcase(os.path.abspath(dir_path))
+
+
+def mark_late(dir_path: str, guids: List[str]) -> None:
+    """Запоминает GUID просроченных экспортов: их ZIP ещё может прийти"""
+    now = time.time()
+    with _late_lock:
+        entries = _late.setdefault(_dir_key(dir_path), {})
+        for g in guids:
+            if g:
+                entries[g] = now
+
+
+def late_guids(dir_path: str) -> Set[str]:
+    """GUID экспортов папки, просроченных не раньше LATE_GRACE_SECONDS назад"""
+    now = time.time()
+    with _late_lock:
+        entries = _late.get(_dir_key(dir_path), {})
+        for g, ts in list(entries.items()):
+            if now - ts > LATE_GRACE_SECONDS:
+                del entries[g]
+        return set(entries)
+
+
+def forget_late(dir_path: str, guid: str) -> None:
+    """ZIP записи получен (поздно или при повторе) — больше не ждём его"""
+    with _late_lock:
+        _late.get(_dir_key(dir_path), {}).pop(guid, None)
+
+
+def get_window_size() -> int:
+    """Размер окна из EB_TXT_WINDOW (1..MAX_WINDOW), по умолчанию 1."""
+    raw = os.environ.get(EXPORT_WINDOW_ENV, "").strip()
+    try:
+        w = int(raw) if raw else DEFAULT_WINDOW
+    except ValueError:
+        w = DEFAULT_WINDOW
+    return max(1, min(MAX_WINDOW, w))
+
+
+def _is_partial_download(path: str) -> bool:
+    low = path.lower()
+    return low.endswith(".crdownload") or low.endswith(".tmp") or low.endswith(".part")
+
+
+def _list_zips(dir_path: str) -> List[str]:
+    try:
+        names = os.listdir(dir_path)
+    except Exception:
+        return []
+    out = []
+    for n in names:
+        p = os.path.join(dir_path, n)
+        if not n.lower().endswith(".zip") or _is_partial_download(p):
+            continue
+        out.append(p)
+    return out
+
+
+def has_partial_downloads(dir_path: str) -> bool:
+    """Есть ли в папке незавершённые скачивания (.crdownload/.tmp/.part)."""
+    try:
+        return any(_is_partial_download(n) for n in os.listdir(dir_path))
+    except Exception:
+        return False
+
+
+def zip_mentions_guid(zip_path: str, guids: Set[str]) -> Tuple[Optional[str], str]:
+    """
+    Ищет GUID из guids в именах файлов архива, затем в начале содержимого TXT.
+    Возвращает (guid, способ) или (None, "").
+    """
+    if not guids:
+        return None, ""
+    low = {g.lower(): g for g in guids}
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            names = [n for n in zf.namelist() if not n.endswith("/")]
+            for n in names:
+                n_low = n.lower()
+                for g_low, g in low.items():
+                    if g_low in n_low:
+                        return g, "zip_name"
+            for n in names:
+                if not n.lower().endswith(".txt"):
+                    continue
+                with zf.open(n) as f:
+                    head = f.read(CONTENT_PROBE_BYTES)
+                for enc in ("utf-8", "cp1251"):
+                    try:
+                        text = head.decode(enc).lower()
+                    except UnicodeDecodeError:
+                        continue
+                    for g_low, g in low.items():
+                        if g_low in text:
+                            return g, "content"
+                    break
+    except Exception:
+        pass
+    return None, ""
+
+
+@dataclass
+class PendingExport:
+    guid: str
+    index: int  # глобальный номер записи (1-based)
+    click_ts: float
+
+
+@dataclass
+class CompletedExport:
+    pending: PendingExport
+    zip_path: str
+    matched_by: str  # filename | zip_name | content | order
+
+
+@dataclass
+class WindowStats:
+    window: int
+    started: float
+    done: int = 0
+    errors: int = 0
+    by_filename: int = 0
+    by_zip: int = 0
+    by_order: int = 0
+    unmatched: int = 0
+
+    def as_dict(self) -> dict:
+        elapsed = max(0.001, time.time() - self.started)
+        return {
+            "window": self.window,
+            "elapsed_s": round(elapsed, 1),
+            "done": self.done,
+            "errors": self.errors,
+            "per_min": round(self.done * 60.0 / elapsed, 2),
+            "matched_by_filename": self.by_filename,
+            "matched_by_zip": self.by_zip,
+            "matched_by_order": self.by_order,
+            "unmatched": self.unmatched,
+        }
+
+
+class ExportWindow:
+    """
+    Ограниченное окно экспортов, ожидающих скачивания.
+    add() — после клика экспорта; poll()/wait_one() — забрать завершённые скачивания;
+    expire() — снять просроченные клики (считаются ошибками, их ZIP ещё могут прийти поздно).
+    ZIP, который не удалось сопоставить, попадает в unmatched и остаётся в папке:
+    по порядку кликов сопоставляется только при единственном ожидаемом экспорте (by_order=False — никогда).
+    С controller фактический размер окна задаёт AIMD (size — верхняя граница).
+    """
+
+    def __init__(self, download_dir: str, size: int, since_ts: Optional[float] = None,
+                 controller: Optional[AimdController] = None, by_order: bool = True):
+        self.download_dir = download_dir
+        self.by_order = by_order
+        self.size = max(1, size)
+        self.controller = controller
+        self.pending: List[PendingExport] = []
+        self.unmatched: List[str] = []
+        self.stats = WindowStats(window=self.size, started=time.time())
+        # ZIP, которые уже лежали в папке (или появились до since_ts) или уже сопоставлены, повторно не берём
+        self._claimed: Set[str] = set()
+        for p in _list_zips(download_dir):
+            try:
+                if since_ts is None or os.path.getmtime(p) < since_ts - 0.2:
+                    self._claimed.add(p)
+            except Exception:
+                continue
+        self._sizes: Dict[str, Tuple[int, float]] = {}
+
+    def limit(self) -> int:
+        return min(self.size, self.controller.limit) if self.controller is not None else self.size
+
+    def is_full(self) -> bool:
+        return len(self.pending) >= self.limit()
+
+    def add(self, guid: str, index: int, click_ts: Optional[float] = None) -> PendingExport:
+        p = PendingExport(guid=guid, index=index, click_ts=click_ts if click_ts is not None else time.time())
+        self.pending.append(p)
+        return p
+
+    def _stable_new_zips(self) -> List[str]:
+        """Новые ZIP, размер которых не меняется STABLE_SECONDS, старые — первыми."""
+        now = time.time()
+        ready = []
+        oldest_click = min((p.click_ts for p in self.pending), default=now)
+        for path in _list_zips(self.download_dir):
+            if path in self._claimed:
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+                size = os.path.getsize(path)
+            except Exception:
+                continue
+            if mtime < oldest_click - 0.2:
+                continue
+            prev = self._sizes.get(path)
+            if prev is None or prev[0] != size:
+                self._sizes[path] = (size, now)
+                continue
+            if now - prev[1] >= STABLE_SECONDS:
+                ready.append((mtime, path))
+        ready.sort()
+        return [p for _, p in ready]
+
+    def _match(self, zip_path: str) -> Optional[CompletedExport]:
+        name_low = os.path.basename(zip_path).lower()
+        for p in self.pending:
+            if p.guid and p.guid.lower() in name_low:
+                return CompletedExport(p, zip_path, "filename")
+        guid, how = zip_mentions_guid(zip_path, {p.guid for p in self.pending if p.guid})
+        if guid:
+            for p in self.pending:
+                if p.guid == guid:
+                    return CompletedExport(p, zip_path, how)
+        late = late_guids(self.download_dir) - {p.guid for p in self.pending}
+        if late:
+            guid, _ = zip_mentions_guid(zip_path, late)
+            if guid:
+                logger.warning("окно экспорта: %s — поздний ZIP просроченного экспорта %s, не используется",
+                               os.path.basename(zip_path), guid)
+                return None
+        # по порядку — только если ждём ровно один экспорт и нет просроченных, чей ZIP может прийти
+        if not self.by_order or len(self.pending) != 1 or late:
+            return None
+        p = self.pending[0]
+        try:
+            mtime = os.path.getmtime(zip_path)
+        except Exception:
+            mtime = time.time()
+        if p.click_ts <= mtime + 0.2:
+            return CompletedExport(p, zip_path, "order")
+        return None
+
+    def poll(self) -> List[CompletedExport]:
+        """Один проход по папке загрузок: сопоставляет все готовые ZIP."""
+        done = []
+        if not self.pending:
+            return done
+        for path in self._stable_new_zips():
+            c = self._match(path)
+            self._claimed.add(path)
+            self._sizes.pop(path, None)
+            if c is None:
+                self.unmatched.append(path)
+                self.stats.unmatched += 1
+                logger.warning(
+                    "окно экспорта: %s не сопоставлен ни с одним из %d ожидаемых GUID — оставлен в папке",
+                    os.path.basename(path), len(self.pending),
+                )
+                continue
+            self.pending.remove(c.pending)
+            forget_late(self.download_dir, c.pending.guid)
+            if c.matched_by == "filename":
+                self.stats.by_filename += 1
+            elif c.matched_by == "order":
+                self.stats.by_order += 1
+            else:
+                self.stats.by_zip += 1
+            if c.matched_by == "order":
+                logger.info("окно экспорта: %s сопоставлен по порядку кликов с %s",
+                            os.path.basename(path), c.pending.guid)
+            if self.controller is not None:
+                self.controller.on_success(latency=time.time() - c.pending.click_ts)
+            done.append(c)
+            if not self.pending:
+                break
+        return done
+
+    def wait_one(self, timeout: float, stop_check: Optional[Callable[[], bool]] = None) -> List[CompletedExport]:
+        """Ждёт хотя бы одно завершённое скачивание (не дольше timeout)."""
+        deadline = time.time() + timeout
+        while time.time() < deadline and self.pending:
+            if stop_check and stop_check():
+                return []
+            done = self.poll()
+            if done:
+                return done
+            time.sleep(0.25)
+        return []
+
+    def expire(self, timeout: float) -> List[PendingExport]:
+        """Снимает клики, по которым ZIP не пришёл за timeout секунд."""
+        now = time.time()
+        expired = [p for p in self.pending if now - p.click_ts > timeout]
+        for p in expired:
+            self.pending.remove(p)
+        self.stats.errors += len(expired)
+        mark_late(self.download_dir, [p.guid for p in expired])
+        if expired and self.controller is not None:
+            self.controller.on_error(f"таймаут скачивания ({len(expired)})")
+        return expired
+
+    def report(self, txt_out_dir: Optional[str] = None) -> dict:
+        """Пишет статистику окна в лог и в _window_stats.jsonl (для сравнения разных W)."""
+        d = self.stats.as_dict()
+        if self.controller is not None:
+            d["aimd"] = self.controller.snapshot()
+        logger.info(
+            "окно экспорта W=%d: записей %d за %.1f с (%.2f зап/мин), ошибок %d; "
+            "сопоставлено по имени %d, по архиву %d, по порядку %d, не сопоставлено %d",
+            d["window"], d["done"], d["elapsed_s"], d["per_min"], d["errors"],
+            d["matched_by_filename"], d["matched_by_zip"], d["matched_by_order"], d["unmatched"],
+        )
+        if txt_out_dir:
+            try:
+                rec = dict(d, ts=time.strftime("%Y-%m-%d %H:%M:%S"))
+                with open(os.path.join(txt_out_dir, WINDOW_STATS_FILENAME), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            except Exception:
+                pass
+        return d
+
+
+class ProgressWatermark:
+    """
+    Непрерывный прогресс при завершении не по порядку:
+    last_done растёт только когда готовы все записи до него включительно.
+    """
+
+    def __init__(self, start_index: int):
+        self.last_done = max(0, start_index - 1)
+        self._done: Set[int] = set()
+
+    def mark(self, index: int) -> bool:
+        """Отмечает запись; True — если last_done сдвинулся."""
+        if index <= self.last_done:
+            return False
+        self._done.add(index)
+        moved = False
+        while self.last_done + 1 in self._done:
+            self._done.discard(self.last_done + 1)
+            self.last_done += 1
+            moved = True
+        return moved
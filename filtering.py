@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 """
 Модуль фильтрации таблицы.
-1. Очищает все применённые фильтры
-2. Устанавливает "Статус документа" = согласовано получателем
-3. Устанавливает "Период по" = 31.12.2025
+Нужное состояние фильтров задаёт FilterSpec: статус ("Статус документа") и дата "Период по".
+По умолчанию — согласовано получателем и 31.12.2025; другие значения берутся из профилей (profiles.py).
+1. Снимает применённые фильтры, которых нет в FilterSpec
+2. Устанавливает "Статус документа" = spec.status
+3. Устанавливает "Период по" = spec.period_to
+Если применённые фильтры уже совпадают с нужными — ничего не сбрасывается, применяется только разница.
 """
+import os
 import time
 import logging
 from dataclasses import dataclass
@@ -12,9 +16,12 @@ from typing import Callable, Optional, List, Tuple
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, WebDriverException
+from selenium.common.exceptions import WebDriverException
+
+from frames import ROLE_TABLE, switch_to_content
+from locator import CLICKABLE, PRESENT, race_locate
+from preflight import prefer_resolved, register_selectors
+from selector_stats import ordered, record_success
 
 
 logger = logging.getLogger(__name__)
@@ -52,8 +59,6 @@ X_STATUS_BY_TEXT = (
 X_STATUS_POPUP_TBODY = (
     "/html/body/div[4]/div/table/tbody/tr/td/table/tbody/tr[3]/td/div/div/table/tbody[1]"
 )
-# Строка "согласовано получателем" — tr[13] (используется как первая проверка)
-X_STATUS_POPUP_ROW = "/html/body/div[4]/div/table/tbody/tr/td/table/tbody/tr[3]/td/div/div/table/tbody[1]/tr[13]"
 STATUS_TITLE_NEEDLE = "Согласовано получателем"
 
 STATUS_TABLE_BASE_XPATHS = [
@@ -62,7 +67,8 @@ STATUS_TABLE_BASE_XPATHS = [
     "//div[contains(@class,'z-listbox')]//table//tbody/tr",
     "//div[contains(@class,'z-window')]//table//tbody/tr",
 ]
-STATUS_ROW_INDEX = 13
+# Строки попапа статуса: сначала контейнер по адресу, затем по классам попапов
+STATUS_ROWS_XPATHS = [X_STATUS_POPUP_TBODY + "/tr"] + STATUS_TABLE_BASE_XPATHS
 
 X_OK_BUTTON = "/html/body/div[4]/div/table/tbody/tr/td/table/tbody/tr[5]/td/table/tbody/tr/td/table/tbody/tr/td/table/tbody/tr/td/table/tbody/tr/td/table/tbody/tr/td[1]/button"
 X_OK_BUTTON_ALT = "//div[4]//button[normalize-space(.)='ОК' or normalize-space(.)='OK']"
@@ -81,6 +87,22 @@ STATUS_EXPAND_XPATHS = [X_STATUS_EXPAND_BTN, X_STATUS_EXPAND_ANCHOR, X_STATUS_BY
 PERIOD_INPUT_XPATHS = [X_PERIOD_TO_INPUT, X_PERIOD_TO_BY_TEXT]
 FILTER_CONTAINER_XPATHS = [X_APPLYING_FILTERS_CONTAINER, X_APPLYING_FILTERS_BY_CLASS]
 
+# поле «Период по» появляется после включения фильтров — не обязательно при первой проверке
+register_selectors(ROLE_TABLE, {
+    "раскрытие статуса": STATUS_EXPAND_XPATHS,
+    "период по": PERIOD_INPUT_XPATHS,
+    "зона фильтров": FILTER_CONTAINER_XPATHS,
+})
+
+
+# 1 — всегда полный сброс фильтров и установка заново (как раньше)
+FILTER_RESET_ENV = "EB_FILTER_RESET"
+DEFAULT_PERIOD_TO = "31.12.2025"
+
+# ZK показывает индикатор обработки с задержкой (~0.9 с после запроса): столько ждём начала
+# перерисовки (индикатор или изменение строк таблицы), прежде чем считать, что её не будет
+RENDER_START_GRACE = 1.5
+
 
 @dataclass
 class WaitCfg:
@@ -89,8 +111,177 @@ class WaitCfg:
     poll: float = 0.2
 
 
-def _wait(driver, timeout: int, poll: float):
-    return WebDriverWait(driver, timeout, poll_frequency=poll)
+@dataclass
+class FilterSpec:
+    """Нужное состояние фильтров таблицы"""
+    status: str = STATUS_TITLE_NEEDLE
+    period_to: str = DEFAULT_PERIOD_TO
+
+
+# Плашки применённых фильтров одним вызовом: [{text, cancel}] или null, если контейнера нет
+_JS_READ_CHIPS = """
+var xps = arguments[0];
+for (var i = 0; i < xps.length; i++) {
+    var c = document.evaluate(xps[i], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!c) continue;
+    var out = [];
+    for (var j = 0; j < c.children.length; j++) {
+        var ch = c.children[j];
+        if (ch.tagName !== 'DIV') continue;
+        var t = (ch.textContent || '').replace(/\\s+/g, ' ').trim() || (ch.getAttribute('title') || '');
+        out.push({text: t, cancel: !!ch.querySelector('button.filter-plank-cancel-button')});
+    }
+    return out;
+}
+return null;
+"""
+
+# Клик по кнопкам очистки плашек с номерами arguments[1] (null — всех) за один проход; возвращает число кликов
+_JS_CANCEL_CHIPS = """
+var xps = arguments[0], only = arguments[1];
+for (var i = 0; i < xps.length; i++) {
+    var c = document.evaluate(xps[i], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!c) continue;
+    var chips = [];
+    for (var j = 0; j < c.children.length; j++) if (c.children[j].tagName === 'DIV') chips.push(c.children[j]);
+    var n = 0;
+    for (var k = 0; k < chips.length; k++) {
+        if (only && only.indexOf(k) < 0) continue;
+        var b = chips[k].querySelector('button.filter-plank-cancel-button');
+        if (b) { b.click(); n++; }
+    }
+    return n;
+}
+return 0;
+"""
+
+# Идёт ли обработка запроса ZK (видимый индикатор загрузки или маска) в текущем или верхнем документе
+_JS_ZK_BUSY = """
+var sel = '.z-loading, .z-apply-loading, .z-loading-indicator, .z-apply-mask';
+var docs = [document];
+try { if (window.top.document !== document) docs.push(window.top.document); } catch (e) {}
+for (var d = 0; d < docs.length; d++) {
+    var nodes = docs[d].querySelectorAll(sel);
+    for (var i = 0; i < nodes.length; i++) {
+        var r = nodes[i].getBoundingClientRect();
+        if (r.width > 0 && r.height > 0) return true;
+    }
+}
+return false;
+"""
+
+# Наблюдатель за строками таблицы: ставится до клика, флаг поднимается при любом изменении тела таблицы.
+# Повторная установка сбрасывает флаг; без таблицы в документе — false
+_JS_GRID_WATCH = """
+var w = window;
+if (w.__ebGridObs) w.__ebGridObs.disconnect();
+w.__ebGridObs = null;
+w.__ebGridChanged = false;
+var b = document.querySelector('.z-grid-body, .z-listbox-body');
+if (!b) return false;
+w.__ebGridObs = new MutationObserver(function () { w.__ebGridChanged = true; });
+w.__ebGridObs.observe(b, {childList: true, subtree: true, characterData: true});
+return true;
+"""
+
+# Началась ли перерисовка: строки таблицы менялись после _JS_GRID_WATCH или виден индикатор ZK
+_JS_RENDER_STARTED = "if (window.__ebGridChanged) return true;" + _JS_ZK_BUSY
+
+# Общее начало скриптов выбора в попапах: docs — текущий документ, верхний и все iframe того же источника
+_JS_POPUP_DOCS = """
+var norm = function (s) { return (s || '').replace(/\\s+/g, ' ').trim(); };
+var visible = function (el) {
+    var r = el.getBoundingClientRect();
+    return r.width > 0 && r.height > 0 && el.ownerDocument.defaultView.getComputedStyle(el).visibility !== 'hidden';
+};
+var docs = [], seen = [];
+var walk = function (win, path) {
+    var doc;
+    try { doc = win.document; doc.body; } catch (e) { return; }
+    if (!doc || seen.indexOf(doc) >= 0) return;
+    seen.push(doc);
+    docs.push({doc: doc, path: path});
+    for (var i = 0; i < win.frames.length; i++) walk(win.frames[i], path + '/' + i);
+};
+walk(window, 'текущий');
+try { walk(window.top, 'top'); } catch (e) {}
+"""
+
+# Выбор строки попапа одним вызовом: строки — по XPath из arguments[0]; сначала видимая строка с title,
+# содержащим arguments[1], затем с таким текстом. Возвращает {how, frame, row, text} или null
+_JS_SELECT_POPUP_ROW = _JS_POPUP_DOCS + """
+var xps = arguments[0], needle = (arguments[1] || '').toLowerCase();
+var rowsOf = function (doc) {
+    var out = [];
+    for (var i = 0; i < xps.length; i++) {
+        var snap;
+        try { snap = doc.evaluate(xps[i], doc, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null); }
+        catch (e) { continue; }
+        for (var j = 0; j < snap.snapshotLength; j++) {
+            var tr = snap.snapshotItem(j);
+            if (out.indexOf(tr) < 0) out.push(tr);
+        }
+    }
+    return out;
+};
+var modes = [
+    ['title', function (tr) { return (tr.getAttribute('title') || '').toLowerCase().indexOf(needle) >= 0; }],
+    ['тексту', function (tr) { return norm(tr.textContent).toLowerCase() === needle; }]
+];
+for (var m = 0; m < modes.length; m++) {
+    for (var d = 0; d < docs.length; d++) {
+        var rows = rowsOf(docs[d].doc);
+        for (var k = 0; k < rows.length; k++) {
+            var tr = rows[k];
+            if (!modes[m][1](tr) || !visible(tr)) continue;
+            try { tr.scrollIntoView({block: 'center'}); } catch (e) {}
+            tr.click();
+            var idx = tr.parentNode ? Array.prototype.indexOf.call(tr.parentNode.children, tr) + 1 : 0;
+            return {how: modes[m][0], frame: docs[d].path, row: idx, text: norm(tr.getAttribute('title') || tr.textContent)};
+        }
+    }
+}
+return null;
+"""
+
+# Выбор пункта по тексту во всех видимых попапах одним вызовом: кандидаты td / tr с td / li без полей ввода,
+# видимые, текст содержит arguments[0] (не длиннее arguments[1], прочего текста не больше arguments[2]);
+# кликается самый короткий. Возвращает {text, tag, frame, candidates} или null
+_JS_CLICK_POPUP_TEXT = _JS_POPUP_DOCS + """
+var needle = (arguments[0] || '').trim().toLowerCase(), maxLen = arguments[1], maxOther = arguments[2];
+var best = null, bestDoc = null, count = 0;
+for (var d = 0; d < docs.length; d++) {
+    var roots = docs[d].doc.querySelectorAll(arguments[3]);
+    for (var r = 0; r < roots.length; r++) {
+        if (!visible(roots[r])) continue;
+        var items = roots[r].querySelectorAll('td, tr, li');
+        for (var i = 0; i < items.length; i++) {
+            var it = items[i];
+            if (it.tagName === 'TR' && !it.querySelector('td')) continue;
+            if (it.querySelector('input, textarea')) continue;
+            var t = norm(it.innerText || it.textContent), low = t.toLowerCase();
+            if (!t || t.length > maxLen || low.indexOf(needle) < 0) continue;
+            if (low.replace(needle, '').trim().length > maxOther) continue;
+            if (!visible(it)) continue;
+            count++;
+            if (!best || t.length < best.t.length) { best = {el: it, t: t}; bestDoc = docs[d].path; }
+        }
+    }
+}
+if (!best) return null;
+try { best.el.scrollIntoView({block: 'center'}); } catch (e) {}
+best.el.click();
+return {text: best.t, tag: best.el.tagName.toLowerCase(), frame: bestDoc, candidates: count};
+"""
+
+# подстрока класса, как contains(@class, ...) в XPath: находит и z-window-modal, z-window-highlighted и т.п.
+POPUP_ROOTS_CSS = ", ".join(
+    f'div[class*="{c}"]'
+    for c in ("z-popup", "z-window", "z-combobox-popup", "z-selectbox-popup", "z-menupopup", "z-menu-popup")
+)
+# Ограничения кандидата: длина текста и длина текста помимо искомого
+POPUP_TEXT_MAX_LEN = 80
+POPUP_TEXT_MAX_OTHER = 15
 
 
 def _safe_sleep(seconds: float, stop_check: Optional[Callable[[], bool]] = None):
@@ -119,40 +310,38 @@ def _robust_click(driver, el) -> bool:
         return False
 
 
-def _find_any(driver, xpaths: List[str], timeout: int, poll: float, by=By.XPATH):
-    """Ищет элемент по одному из XPath. Не переключает контекст (важно для iframe)."""
-    for i, xpath in enumerate(xpaths):
-        try:
-            el = _wait(driver, timeout, poll).until(
-                EC.presence_of_element_located((by, xpath))
-            )
-            logger.debug("filtering: элемент найден по xpath[%d], всего попыток: %d", i, len(xpaths))
-            return el
-        except TimeoutException:
-            logger.debug("filtering: xpath[%d] не найден: %s", i, xpath[:60] + "..." if len(xpath) > 60 else xpath)
-            continue
-    return None
+def _find_any(driver, xpaths: List[str], timeout: float, chain: Optional[str] = None, group: Optional[str] = None):
+    """Ищет элемент по одному из XPath (все альтернативы сразу, общий таймаут). Не переключает контекст (важно для iframe).
+    chain — имя цепочки в selector_stats: при одновременном появлении побеждает сработавшая последней;
+    group — группа preflight экрана таблицы: найденные проверкой альтернативы идут первыми."""
+    return _race_any(driver, xpaths, PRESENT, timeout, chain, group)
 
 
-def _find_clickable_any(driver, xpaths: List[str], timeout: int, poll: float):
-    """Ищет кликабельный элемент по одному из XPath."""
-    for i, xpath in enumerate(xpaths):
-        try:
-            el = _wait(driver, timeout, poll).until(
-                EC.element_to_be_clickable((By.XPATH, xpath))
-            )
-            logger.debug("filtering: кликабельный элемент найден по xpath[%d]", i)
-            return el
-        except TimeoutException:
-            continue
-    return None
+def _find_clickable_any(driver, xpaths: List[str], timeout: float, chain: Optional[str] = None,
+                        group: Optional[str] = None):
+    """Ищет кликабельный элемент по одному из XPath (chain — приоритет по прошлым успехам, group — по preflight)."""
+    return _race_any(driver, xpaths, CLICKABLE, timeout, chain, group)
+
 
+def _race_any(driver, xpaths: List[str], condition: str, timeout: float, chain: Optional[str],
+              group: Optional[str] = None):
+    order = prefer_resolved(ROLE_TABLE, group, ordered(chain, xpaths))
+    hit = race_locate(driver, order, condition, timeout)
+    if not hit:
+        logger.debug("filtering: ни один из %d xpath не найден (%s)", len(order), condition)
+        return None
+    idx, el = hit
+    logger.debug("filtering: элемент найден по xpath[%d], всего вариантов: %d", idx, len(order))
+    record_success(chain, order[idx], order[:idx])
+    return el
 
-def _click_xpath_any(driver, xpaths: List[str], cfg: WaitCfg, stop_check=None, attempts: int = 3) -> bool:
+
+def _click_xpath_any(driver, xpaths: List[str], cfg: WaitCfg, stop_check=None, attempts: int = 3,
+                     chain: Optional[str] = None, group: Optional[str] = None) -> bool:
     for attempt in range(attempts):
         if stop_check and stop_check():
             return False
-        el = _find_clickable_any(driver, xpaths, cfg.short, cfg.poll)
+        el = _find_clickable_any(driver, xpaths, cfg.short, chain, group)
         if el and _robust_click(driver, el):
             _safe_sleep(0.35, stop_check)
             return True
@@ -160,97 +349,197 @@ def _click_xpath_any(driver, xpaths: List[str], cfg: WaitCfg, stop_check=None, a
     return False
 
 
-def clear_all_filters(driver, cfg: WaitCfg = WaitCfg(), stop_check=None) -> bool:
-    """Очищает все фильтры из зоны применённых фильтров (applyingFiltersZonePane)."""
-    logger.info("filtering: очистка фильтров")
-    container = None
-    for xpath in FILTER_CONTAINER_XPATHS:
+def _wait_filter_zone(driver, done: Callable[[Optional[List[str]]], bool], timeout: float,
+                      poll: float, stop_check=None) -> Optional[List[str]]:
+    """Опрашивает плашки фильтров, пока done(плашки) не выполнится (не дольше timeout); возвращает последние"""
+    deadline = time.time() + timeout
+    while True:
+        chips = read_applied_filters(driver)
+        if done(chips) or time.time() >= deadline or (stop_check and stop_check()):
+            return chips
+        time.sleep(poll)
+
+
+def _watch_grid(driver) -> bool:
+    """Ставит наблюдатель за строками таблицы перед кликом, после которого ZK перерисует таблицу"""
+    try:
+        return bool(driver.execute_script(_JS_GRID_WATCH))
+    except Exception as e:
+        logger.debug("filtering: наблюдатель таблицы не установлен: %s", e)
+        return False
+
+
+def _wait_render_idle(driver, cfg: WaitCfg, stop_check=None) -> bool:
+    """
+    Ждёт, пока ZK закончит обработку, не дольше cfg.medium: сначала — начала перерисовки (индикатор
+    загрузки или изменение строк после _watch_grid) не дольше RENDER_START_GRACE, затем — пока индикатор
+    не пропадёт на две проверки подряд. Перерисовка не началась за это время — считаем, что её нет.
+    """
+    deadline = time.time() + cfg.medium
+    grace = time.time() + RENDER_START_GRACE
+    while True:
+        if stop_check and stop_check():
+            return False
         try:
-            container = _wait(driver, cfg.short, cfg.poll).until(
-                EC.presence_of_element_located((By.XPATH, xpath))
-            )
-            logger.debug("filtering: контейнер фильтров найден")
+            started = bool(driver.execute_script(_JS_RENDER_STARTED))
+        except Exception:
+            started = False
+        if started:
             break
-        except TimeoutException:
-            continue
-    if container is None:
+        if time.time() >= grace:
+            logger.debug("filtering: перерисовка таблицы не началась за %.1f с", RENDER_START_GRACE)
+            return True
+        time.sleep(cfg.poll)
+
+    idle = 0
+    while time.time() < deadline:
+        if stop_check and stop_check():
+            return False
+        try:
+            busy = bool(driver.execute_script(_JS_ZK_BUSY))
+        except Exception:
+            busy = False
+        idle = 0 if busy else idle + 1
+        if idle >= 2:
+            return True
+        time.sleep(cfg.poll)
+    return False
+
+
+def clear_all_filters(driver, cfg: WaitCfg = WaitCfg(), stop_check=None) -> bool:
+    """
+    Очищает все фильтры из зоны применённых фильтров (applyingFiltersZonePane): за проход нажимаются
+    все кнопки очистки, затем ожидается пустая зона и конец перерисовки таблицы (без фиксированных пауз).
+    Время каждого этапа пишется в лог.
+    """
+    logger.info("filtering: очистка фильтров")
+    t0 = time.time()
+    chips = _wait_filter_zone(driver, lambda c: c is not None, cfg.short, cfg.poll, stop_check)
+    if chips is None:
         logger.info("filtering: контейнер фильтров не найден — считаем, фильтров нет")
         return True
+    total = len(chips)
 
-    for round_num in range(1, 30):
+    for round_num in range(1, 11):
         if stop_check and stop_check():
             return False
+        if not chips:
+            t_empty = time.time()
+            if total:
+                _wait_render_idle(driver, cfg, stop_check)
+            logger.info(
+                "filtering: все фильтры очищены (%d, проходов %d): зона пуста через %.2f с, "
+                "таблица перерисована через %.2f с",
+                total, round_num - 1, t_empty - t0, time.time() - t0,
+            )
+            return True
 
+        logger.debug("filtering: найдено фильтров: %d, round=%d", len(chips), round_num)
+        _watch_grid(driver)
         try:
-            container = _find_any(driver, FILTER_CONTAINER_XPATHS, cfg.short, cfg.poll)
-            if container is None:
-                return True
-            children = container.find_elements(By.XPATH, "./div")
-        except StaleElementReferenceException:
-            logger.debug("filtering: stale при чтении дочерних div, повтор")
-            _safe_sleep(0.2, stop_check)
-            continue
+            clicked = int(driver.execute_script(_JS_CANCEL_CHIPS, FILTER_CONTAINER_XPATHS, None) or 0)
         except Exception as e:
-            logger.warning("filtering: ошибка при получении дочерних div: %s", e)
-            return True
+            logger.debug("filtering: ошибка клика по очистке: %s", e)
+            clicked = 0
+        t_click = time.time()
+        before = len(chips)
+        # после клика ZK перерисовывает зону: часть кликов по уже заменённым плашкам теряется — следующий проход
+        chips = _wait_filter_zone(
+            driver, lambda c, n=before: c is None or len(c) < n, cfg.medium, cfg.poll, stop_check
+        )
+        if chips is None:
+            chips = []
+        logger.debug(
+            "filtering: проход %d: нажато %d, осталось %d, ответ через %.2f с",
+            round_num, clicked, len(chips), time.time() - t_click,
+        )
+        if clicked == 0 and len(chips) >= before:
+            logger.warning("filtering: ни одна кнопка очистки не сработала")
+            return False
+        if len(chips) < before:
+            _wait_render_idle(driver, cfg, stop_check)
 
-        if not children:
-            logger.info("filtering: все фильтры очищены (контейнер пуст)")
-            return True
+    logger.warning("filtering: превышен лимит итераций очистки")
+    return False
 
-        logger.debug("filtering: найдено фильтров: %d, round=%d", len(children), round_num)
-        clicked = 0
-        for ch in children:
-            if stop_check and stop_check():
-                return False
-            try:
-                btns = ch.find_elements(By.XPATH, REL_CLEAR_BTN_IN_FILTER)
-                if not btns:
-                    logger.debug("filtering: в блоке нет кнопки очистки")
-                    continue
-                if _robust_click(driver, btns[0]):
-                    clicked += 1
-                    logger.debug("filtering: клик по кнопке очистки, всего: %d", clicked)
-                    _safe_sleep(1.0, stop_check)
-            except Exception as e:
-                logger.debug("filtering: ошибка клика по очистке: %s", e)
-                continue
 
-        if clicked == 0:
-            if round_num <= 6:
-                logger.debug("filtering: кнопки очистки не сработали, ждём и повторяем (round %d)", round_num)
-                _safe_sleep(2.5, stop_check)
-                continue
-            logger.warning("filtering: ни одна кнопка очистки не сработала")
-            return False
+def read_applied_filters(driver) -> Optional[List[str]]:
+    """Тексты плашек применённых фильтров (один вызов скрипта); None — контейнер не найден или ошибка"""
+    try:
+        chips = driver.execute_script(_JS_READ_CHIPS, FILTER_CONTAINER_XPATHS)
+    except Exception as e:
+        logger.debug("filtering: плашки фильтров не прочитаны: %s", e)
+        return None
+    if chips is None:
+        return None
+    return [str(c.get("text") or "") for c in chips]
+
+
+def _chip_value(chip: str) -> str:
+    """Значение плашки «Название: значение» (без названия)"""
+    return chip.split(":", 1)[1].strip() if ":" in chip else chip.strip()
+
+
+def _chip_kind(chip: str, spec: FilterSpec) -> Optional[str]:
+    """'status' / 'period' — плашка совпадает с нужным фильтром, иначе None (лишний фильтр)"""
+    low = chip.lower()
+    value = _chip_value(chip).lower()
+    if value == spec.status.lower() or (":" not in chip and spec.status.lower() in low):
+        return "status"
+    # именно «Период по»: плашка «Период с» с той же датой — лишний фильтр
+    if "период по" in " ".join(low.split()) and spec.period_to in chip:
+        return "period"
+    return None
 
-        _safe_sleep(1.2, stop_check)
 
-    logger.warning("filtering: превышен лимит итераций очистки")
+def _filters_diff(chips: List[str], spec: FilterSpec) -> Tuple[List[int], bool, bool]:
+    """(номера лишних плашек, нужен ли статус, нужен ли период)"""
+    extra, have = [], set()
+    for i, chip in enumerate(chips):
+        kind = _chip_kind(chip, spec)
+        if kind is None or kind in have:
+            extra.append(i)
+        else:
+            have.add(kind)
+    return extra, "status" not in have, "period" not in have
+
+
+def _remove_extra_filters(driver, spec: FilterSpec, cfg: WaitCfg, stop_check=None) -> bool:
+    """Снимает только плашки, не совпадающие со spec; после каждой — ждёт перерисовки зоны фильтров"""
+    for _ in range(30):
+        if stop_check and stop_check():
+            return False
+        chips = read_applied_filters(driver)
+        if not chips:
+            return True
+        extra, _, _ = _filters_diff(chips, spec)
+        if not extra:
+            return True
+        idx = extra[0]
+        _watch_grid(driver)
+        try:
+            clicked = driver.execute_script(_JS_CANCEL_CHIPS, FILTER_CONTAINER_XPATHS, [idx])
+        except Exception:
+            clicked = 0
+        if not clicked:
+            logger.warning("filtering: не удалось снять фильтр '%s'", chips[idx])
+            return False
+        t0 = time.time()
+        _wait_filter_zone(
+            driver, lambda c, n=len(chips): c is None or len(c) < n, cfg.short, cfg.poll, stop_check
+        )
+        _wait_render_idle(driver, cfg, stop_check)
+        logger.info("filtering: снят фильтр '%s' (%.2f с)", chips[idx], time.time() - t0)
+    logger.warning("filtering: превышен лимит снятия фильтров")
     return False
 
 
 def _restore_table_context(driver, cfg: WaitCfg):
     """Возвращает контекст в frame с таблицей (если мы переключились на default для попапов)."""
-    el = _find_any(driver, PERIOD_INPUT_XPATHS + FILTER_CONTAINER_XPATHS, 2, cfg.poll)
-    if el is not None:
-        return True
-    try:
-        driver.switch_to.default_content()
-        frames = driver.find_elements(By.TAG_NAME, "iframe")
-        for f in frames:
-            try:
-                driver.switch_to.default_content()
-                driver.switch_to.frame(f)
-                el = _find_any(driver, PERIOD_INPUT_XPATHS + FILTER_CONTAINER_XPATHS, 2, cfg.poll)
-                if el is not None:
-                    logger.debug("filtering: контекст восстановлен (frame с таблицей)")
-                    return True
-            except Exception:
-                continue
-    except Exception:
-        pass
-    return False
+    ok = switch_to_content(driver, ROLE_TABLE, PERIOD_INPUT_XPATHS + FILTER_CONTAINER_XPATHS, cfg.short, cfg.poll)
+    if ok:
+        logger.debug("filtering: контекст восстановлен (frame с таблицей)")
+    return ok
 
 
 def _find_visible_popup_root(driver):
@@ -284,180 +573,59 @@ def _is_displayed(el) -> bool:
         return False
 
 
-def _tr_has_status_title(tr_el, needle: str = STATUS_TITLE_NEEDLE) -> bool:
-    """Проверяет, что у tr есть title с текстом 'Согласовано получателем'."""
-    try:
-        title = (tr_el.get_attribute("title") or "").strip()
-        return needle in title
-    except Exception:
-        return False
-
-
-def _click_status_row_direct(driver, cfg: WaitCfg, stop_check=None) -> bool:
+def _click_status_row_direct(driver, cfg: WaitCfg, stop_check=None, value: str = STATUS_TITLE_NEEDLE) -> bool:
     """
-    Выбор строки «Согласовано получателем» в попапе статуса.
-    Сначала проверяем, что строка по текущему адресу (tr[13]) имеет title «Согласовано получателем».
-    Если нет — ищем среди всех tr в контейнере tbody строку с таким title и кликаем её.
+    Выбор строки value в попапе статуса: один вызов скрипта ищет видимую строку с title, содержащим value
+    (или с таким текстом), в текущем документе, основном и всех iframe того же источника, и кликает её.
+    Вызов повторяется, пока попап не отрисуется (не дольше cfg.short)
     """
-    if stop_check and stop_check():
-        return False
-
-    def _scroll_and_click(tr_el):
+    deadline = time.time() + cfg.short
+    while True:
+        if stop_check and stop_check():
+            return False
         try:
-            driver.execute_script(
-                "arguments[0].scrollIntoView({block:'center'});", tr_el
+            hit = driver.execute_script(_JS_SELECT_POPUP_ROW, STATUS_ROWS_XPATHS, value)
+        except Exception as e:
+            logger.debug("filtering: скрипт выбора статуса не выполнен: %s", e)
+            hit = None
+        if hit:
+            logger.info(
+                "filtering: выбран пункт '%s' (по %s, документ %s, строка %s)",
+                hit.get("text") or value, hit.get("how"), hit.get("frame"), hit.get("row"),
             )
-        except Exception:
-            try:
-                driver.execute_script("arguments[0].scrollIntoView(true);", tr_el)
-            except Exception:
-                pass
-        _safe_sleep(0.5, stop_check)
-        if _robust_click(driver, tr_el):
             _safe_sleep(0.35, stop_check)
             return True
-        return False
-
-    def _try_click_in_context():
-        # 1) Найти tbody контейнера статуса (строка не всегда под одним номером)
-        tbody = None
-        try:
-            tbody = _wait(driver, 3, cfg.poll).until(
-                EC.presence_of_element_located((By.XPATH, X_STATUS_POPUP_TBODY))
-            )
-        except TimeoutException:
-            pass
-        if tbody is not None:
-            rows = tbody.find_elements(By.XPATH, "./tr")
-            if rows:
-                # 2) Сначала проверить строку по индексу
-                idx = min(STATUS_ROW_INDEX - 1, len(rows) - 1)
-                tr = rows[idx]
-                if _tr_has_status_title(tr):
-                    if _scroll_and_click(tr):
-                        logger.info(
-                            "filtering: выбран пункт tr[%d] (title 'Согласовано получателем')",
-                            idx + 1,
-                        )
-                        return True
-                # 3) Иначе ищем любую tr с нужным title в контейнере
-                for i, tr in enumerate(rows):
-                    if stop_check and stop_check():
-                        return False
-                    try:
-                        if _tr_has_status_title(tr) and _scroll_and_click(tr):
-                            logger.info(
-                                "filtering: выбран пункт tr[%d] по title 'Согласовано получателем'",
-                                i + 1,
-                            )
-                            return True
-                    except StaleElementReferenceException:
-                        rows = tbody.find_elements(By.XPATH, "./tr")
-                        if i < len(rows) and _tr_has_status_title(rows[i]):
-                            if _scroll_and_click(rows[i]):
-                                return True
-                        continue
-                    except Exception:
-                        continue
-
-        # Fallback: клик по фиксированному XPath / по индексу без проверки title
-        for base_xpath in [X_STATUS_POPUP_ROW] + [
-            f"{bp}[{STATUS_ROW_INDEX}]" for bp in STATUS_TABLE_BASE_XPATHS
-        ]:
-            if stop_check and stop_check():
-                return False
-            try:
-                el = _wait(driver, 2, cfg.poll).until(
-                    EC.presence_of_element_located((By.XPATH, base_xpath))
-                )
-                if _tr_has_status_title(el) and _scroll_and_click(el):
-                    logger.info("filtering: выбран пункт по XPath (title совпал)")
-                    return True
-                # если по индексу нашли, но title не тот — уже искали по tbody выше
-            except TimeoutException:
-                continue
-
-        for base_xpath in STATUS_TABLE_BASE_XPATHS:
-            if stop_check and stop_check():
-                return False
-            try:
-                _wait(driver, 2, cfg.poll).until(
-                    lambda d, xp=base_xpath: len(d.find_elements(By.XPATH, xp)) > 0
-                )
-                rows = driver.find_elements(By.XPATH, base_xpath)
-                # сначала по индексу, если title подходит
-                if len(rows) >= STATUS_ROW_INDEX:
-                    tr = rows[STATUS_ROW_INDEX - 1]
-                    if _tr_has_status_title(tr) and _scroll_and_click(tr):
-                        logger.info("filtering: выбран пункт tr[%d] (по индексу)", STATUS_ROW_INDEX)
-                        return True
-                # иначе перебор всех tr по title
-                for i, tr in enumerate(rows):
-                    if stop_check and stop_check():
-                        return False
-                    try:
-                        if _tr_has_status_title(tr) and _scroll_and_click(tr):
-                            logger.info("filtering: выбран пункт tr[%d] по title", i + 1)
-                            return True
-                    except (StaleElementReferenceException, Exception):
-                        continue
-            except (TimeoutException, Exception):
-                continue
-        return False
-
-    if _try_click_in_context():
-        return True
-    try:
-        driver.switch_to.default_content()
-        if _try_click_in_context():
-            return True
-    except Exception:
-        pass
-    return False
+        if time.time() >= deadline:
+            logger.debug("filtering: строка '%s' в попапах не найдена", value)
+            return False
+        time.sleep(cfg.poll)
 
 
 def _click_text_in_filter_popup(driver, text: str, cfg: WaitCfg, stop_check=None) -> bool:
     """
-    Кликает td/tr с текстом в popup. НЕ input/textarea — иначе ставится фокус вместо выбора.
+    Кликает td/tr/li с текстом в popup. НЕ input/textarea — иначе ставится фокус вместо выбора.
+    Поиск, отбор и выбор лучшего кандидата — одним вызовом скрипта на каждую проверку (до cfg.medium).
     """
     logger.debug("filtering: ищем в попапе текст: %s", text)
     deadline = time.time() + cfg.medium
-    needle = text.strip().lower()
 
     while time.time() < deadline:
         if stop_check and stop_check():
             return False
-
-        roots, _ = _find_visible_popup_root(driver)
-        candidates = []
-        for root in roots:
-            try:
-                for it in root.find_elements(By.XPATH, ".//td | .//tr[.//td] | .//li"):
-                    try:
-                        if it.tag_name.lower() in ("input", "textarea"):
-                            continue
-                        if it.find_elements(By.XPATH, ".//input | .//textarea"):
-                            continue
-                        if not _is_displayed(it):
-                            continue
-                        t = (it.text or "").strip()
-                        t_low = t.lower()
-                        if not t or needle not in t_low or len(t) > 80:
-                            continue
-                        other = t_low.replace(needle, "").strip()
-                        if other and len(other) > 15:
-                            continue
-                        candidates.append((len(t), it, t))
-                    except Exception:
-                        continue
-            except Exception:
-                continue
-        candidates.sort(key=lambda x: x[0])
-        for _, it, t in candidates:
-            if _robust_click(driver, it):
-                logger.info("filtering: выбран пункт '%s'", t[:60])
-                _safe_sleep(0.35, stop_check)
-                return True
+        try:
+            hit = driver.execute_script(
+                _JS_CLICK_POPUP_TEXT, text, POPUP_TEXT_MAX_LEN, POPUP_TEXT_MAX_OTHER, POPUP_ROOTS_CSS
+            )
+        except Exception as e:
+            logger.debug("filtering: скрипт выбора пункта не выполнен: %s", e)
+            hit = None
+        if hit:
+            logger.info(
+                "filtering: выбран пункт '%s' (%s, документ %s, кандидатов %s)",
+                str(hit.get("text") or "")[:60], hit.get("tag"), hit.get("frame"), hit.get("candidates"),
+            )
+            _safe_sleep(0.35, stop_check)
+            return True
 
         time.sleep(cfg.poll)
 
@@ -480,17 +648,11 @@ def _popup_filter_visible(driver) -> bool:
 
 def _click_ok_direct(driver, cfg: WaitCfg, stop_check=None) -> bool:
     """Нажимает ОК — сначала в текущем контексте, затем в default."""
-    for xpath in (X_OK_BUTTON, X_OK_BUTTON_ALT, X_OK_BUTTON_ALT2):
-        try:
-            btn = _wait(driver, 2, cfg.poll).until(
-                EC.element_to_be_clickable((By.XPATH, xpath))
-            )
-            if _robust_click(driver, btn):
-                logger.info("filtering: нажата кнопка ОК")
-                _safe_sleep(0.35, stop_check)
-                return True
-        except TimeoutException:
-            continue
+    btn = _find_clickable_any(driver, [X_OK_BUTTON, X_OK_BUTTON_ALT, X_OK_BUTTON_ALT2], 2)
+    if btn and _robust_click(driver, btn):
+        logger.info("filtering: нажата кнопка ОК")
+        _safe_sleep(0.35, stop_check)
+        return True
     return False
 
 
@@ -522,22 +684,23 @@ def _click_ok_in_filter_popup(driver, cfg: WaitCfg, stop_check=None) -> bool:
     return False
 
 
-def set_status_filter(driver, cfg: WaitCfg = WaitCfg(), stop_check=None) -> bool:
-    """Устанавливает фильтр Статус документа = согласовано получателем."""
-    logger.info("filtering: установка фильтра 'Статус документа' = согласовано получателем")
+def set_status_filter(driver, cfg: WaitCfg = WaitCfg(), stop_check=None, value: str = STATUS_TITLE_NEEDLE) -> bool:
+    """Устанавливает фильтр Статус документа = value (по умолчанию согласовано получателем)."""
+    logger.info("filtering: установка фильтра 'Статус документа' = %s", value)
 
-    if not _click_xpath_any(driver, STATUS_EXPAND_XPATHS, cfg, stop_check, attempts=5):
+    if not _click_xpath_any(driver, STATUS_EXPAND_XPATHS, cfg, stop_check, attempts=5,
+                            chain="filtering.status_expand", group="раскрытие статуса"):
         logger.error("filtering: не удалось нажать раскрытие фильтра 'Статус документа'")
         return False
     logger.info("filtering: фильтр статуса раскрыт")
 
     _safe_sleep(0.6, stop_check)
 
-    row_clicked = _click_status_row_direct(driver, cfg, stop_check)
+    row_clicked = _click_status_row_direct(driver, cfg, stop_check, value)
     if not row_clicked:
-        row_clicked = _click_text_in_filter_popup(driver, "согласовано получателем", cfg, stop_check)
+        row_clicked = _click_text_in_filter_popup(driver, value, cfg, stop_check)
     if not row_clicked:
-        logger.error("filtering: не удалось выбрать значение 'Согласовано получателем'")
+        logger.error("filtering: не удалось выбрать значение '%s'", value)
         return False
 
     _safe_sleep(0.4, stop_check)
@@ -552,14 +715,15 @@ def set_status_filter(driver, cfg: WaitCfg = WaitCfg(), stop_check=None) -> bool
     return True
 
 
-def set_period_to_filter(driver, date_str: str = "31.12.2025", cfg: WaitCfg = WaitCfg(), stop_check=None) -> bool:
+def set_period_to_filter(driver, date_str: str = DEFAULT_PERIOD_TO, cfg: WaitCfg = WaitCfg(), stop_check=None) -> bool:
     """Устанавливает фильтр Период по через ввод даты в поле."""
     logger.info("filtering: установка фильтра 'Период по' = %s", date_str)
 
     for attempt in range(3):
         if stop_check and stop_check():
             return False
-        inp = _find_clickable_any(driver, PERIOD_INPUT_XPATHS, cfg.medium, cfg.poll)
+        inp = _find_clickable_any(driver, PERIOD_INPUT_XPATHS, cfg.medium,
+                                  chain="filtering.period_input", group="период по")
         if inp is None:
             logger.debug("filtering: поле 'Период по' не найдено, попытка %d/3", attempt + 1)
             _safe_sleep(0.35, stop_check)
@@ -594,7 +758,7 @@ def _wait_table_ready(driver, cfg: WaitCfg, stop_check=None) -> bool:
     for _ in range(int(cfg.medium / 0.5)):
         if stop_check and stop_check():
             return False
-        el = _find_any(driver, FILTER_CONTAINER_XPATHS + STATUS_EXPAND_XPATHS, 2, cfg.poll)
+        el = _find_any(driver, FILTER_CONTAINER_XPATHS + STATUS_EXPAND_XPATHS, 2)
         if el is not None:
             _safe_sleep(1.5, stop_check)
             return True
@@ -602,14 +766,19 @@ def _wait_table_ready(driver, cfg: WaitCfg, stop_check=None) -> bool:
     return False
 
 
-def run_filtering(driver, cfg: WaitCfg = WaitCfg(), stop_check=None) -> bool:
+def run_filtering(driver, cfg: WaitCfg = WaitCfg(), stop_check=None, spec: Optional[FilterSpec] = None,
+                  force: bool = False) -> bool:
     """
-    1. Очищает все применённые фильтры
-    2. Устанавливает "Статус документа" = согласовано получателем
-    3. Устанавливает "Период по" = 31.12.2025
+    Приводит фильтры таблицы к spec (None — FilterSpec() по умолчанию, иначе — из профиля):
+    "Статус документа" = spec.status, "Период по" = spec.period_to.
+    Сначала плашки применённых фильтров сравниваются со spec: снимаются только лишние,
+    устанавливаются только недостающие (при EB_FILTER_RESET=1 — полный сброс, как раньше).
+    force=True — всегда полный сброс: так таблица гарантированно возвращается на первую страницу.
     Не переключает контекст драйвера — работает в текущем (в т.ч. iframe).
     """
     logger.info("filtering: запуск фильтрации")
+    spec = spec or FilterSpec()
+    full_reset = force or os.environ.get(FILTER_RESET_ENV, "").strip() == "1"
 
     if not _wait_table_ready(driver, cfg, stop_check):
         logger.warning("filtering: таблица/фильтры не готовы, продолжаем попытки")
@@ -624,22 +793,41 @@ def run_filtering(driver, cfg: WaitCfg = WaitCfg(), stop_check=None) -> bool:
         except Exception:
             pass
 
-        ok = clear_all_filters(driver, cfg, stop_check)
+        chips = None if full_reset else read_applied_filters(driver)
+        need_status = need_period = True
+        if chips is not None:
+            extra, need_status, need_period = _filters_diff(chips, spec)
+            logger.info(
+                "filtering: применено фильтров %d, лишних %d, не хватает: статус=%s, период=%s",
+                len(chips), len(extra), need_status, need_period,
+            )
+            if not (extra or need_status or need_period):
+                logger.info("filtering: фильтры уже в нужном состоянии")
+                return True
+            ok = _remove_extra_filters(driver, spec, cfg, stop_check)
+            if not ok:
+                # снять выборочно не вышло — полный сброс
+                need_status = need_period = True
+                ok = clear_all_filters(driver, cfg, stop_check)
+        else:
+            ok = clear_all_filters(driver, cfg, stop_check)
         if not ok:
             logger.error("filtering: не удалось очистить фильтры")
             return False
 
-        ok = set_status_filter(driver, cfg, stop_check)
-        if not ok:
-            logger.error("filtering: не удалось установить фильтр статуса документа")
-            return False
+        if need_status:
+            ok = set_status_filter(driver, cfg, stop_check, spec.status)
+            if not ok:
+                logger.error("filtering: не удалось установить фильтр статуса документа")
+                return False
 
-        _restore_table_context(driver, cfg)
+            _restore_table_context(driver, cfg)
 
-        ok = set_period_to_filter(driver, "31.12.2025", cfg, stop_check)
-        if not ok:
-            logger.error("filtering: не удалось установить фильтр 'Период по'")
-            return False
+        if need_period:
+            ok = set_period_to_filter(driver, spec.period_to, cfg, stop_check)
+            if not ok:
+                logger.error("filtering: не удалось установить фильтр 'Период по'")
+                return False
 
         logger.info("filtering: фильтрация успешно завершена")
         return True
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Супервизор флота: N независимых браузеров выгружают непересекающиеся диапазоны записей.
+У каждого рабочего процесса своя копия профиля, папка загрузок и промежуточная папка TXT
+(fleet/worker<K>). По завершении рабочего процесса его TXT и GUID переносятся в общую
+папку TXT Outputs; упавший процесс перезапускается с последней подтверждённой записи.
+
+Запуск: python fleet.py --total 12000 [--workers 3] [--start 1] [--headless]
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from eb_robot import DEFAULT_USER_DATA_DIR, close_yandex_processes
+from txt_output import load_progress, save_progress, merge_staging_outputs
+
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+FLEET_DIR = os.path.join(PROJECT_ROOT, "fleet")
+WORKERS_ENV = "EB_FLEET_WORKERS"
+MAX_RESTARTS = 3
+# пауза между запусками браузеров — окна выбора сертификата не должны накладываться
+LAUNCH_STAGGER = 20
+
+# что не копировать из профиля браузера (кэши и блокировки)
+PROFILE_IGNORE = shutil.ignore_patterns(
+    "Cache", "Code Cache", "GPUCache", "ShaderCache", "GrShaderCache",
+    "Service Worker", "Crashpad", "Singleton*", "*.lock", "lockfile",
+)
+
+
+@dataclass
+class WorkerSpec:
+    number: int
+    first: int  # первая запись диапазона (1-based), после перезапуска — первая невыгруженная
+    last: int  # последняя запись (включительно)
+    root: str
+    origin: int = 0  # исходная первая запись диапазона
+    proc: Optional[subprocess.Popen] = None
+    restarts: int = 0
+    finished: bool = False
+    failed: bool = False
+
+    @property
+    def txt_dir(self) -> str:
+        return os.path.join(self.root, "TXT Outputs")
+
+
+def split_ranges(start: int, total: int, n: int) -> List[Tuple[int, int]]:
+    """Делит записи start..total на n непрерывных диапазонов."""
+    count = max(0, total - start + 1)
+    n = max(1, min(n, count)) if count else 1
+    size, extra = divmod(count, n)
+    out = []
+    a = start
+    for i in range(n):
+        b = a + size + (1 if i < extra else 0) - 1
+        if b >= a:
+            out.append((a, b))
+        a = b + 1
+    return out
+
+
+def _prepare_worker_dir(w: WorkerSpec, profile_src: str) -> None:
+    os.makedirs(os.path.join(w.root, "downloads"), exist_ok=True)
+    os.makedirs(w.txt_dir, exist_ok=True)
+    profile_dst = os.path.join(w.root, "profile")
+    if not os.path.isdir(profile_dst):
+        if os.path.isdir(profile_src):
+            logging.info("Рабочий %d: копирование профиля %s", w.number, profile_src)
+            shutil.copytree(profile_src, profile_dst, ignore=PROFILE_IGNORE, dirs_exist_ok=True)
+        else:
+            os.makedirs(profile_dst, exist_ok=True)
+    save_progress(w.txt_dir, w.first - 1)
+
+
+def _launch(w: WorkerSpec, extra_args: List[str]) -> None:
+    cmd = [
+        sys.executable, os.path.join(PROJECT_ROOT, "eb_robot.py"),
+        f"--worker={w.number}", f"--worker-dir={w.root}", f"--range={w.first}-{w.last}",
+    ] + extra_args
+    logging.info("Рабочий %d: запуск, записи %d-%d", w.number, w.first, w.last)
+    w.proc = subprocess.Popen(cmd, cwd=PROJECT_ROOT)
+
+
+def _handle_exit(w: WorkerSpec, txt_out_dir: str, extra_args: List[str]) -> None:
+    """Рабочий завершился: перенос результатов, затем завершение или перезапуск."""
+    rc = w.proc.returncode
+    moved = merge_staging_outputs(w.txt_dir, txt_out_dir)
+    last_done = load_progress(w.txt_dir)
+    logging.info("Рабочий %d: код %s, перенесено TXT %d, последняя запись %d", w.number, rc, moved, last_done)
+    if last_done >= w.last or rc == 0:
+        # rc == 0 раньше конца диапазона — остановка по Ctrl+X или список короче; не перезапускаем
+        w.finished = True
+        return
+    if w.restarts >= MAX_RESTARTS:
+        logging.error("Рабочий %d: превышено число перезапусков, диапазон %d-%d не завершён", w.number, last_done + 1, w.last)
+        w.failed = True
+        return
+    w.restarts += 1
+    w.first = max(w.first, last_done + 1)
+    _launch(w, extra_args)
+
+
+def _contiguous_progress(workers: List[WorkerSpec], start: int) -> int:
+    """Последняя запись, до которой включительно всё выгружено (по диапазонам рабочих)."""
+    last = start - 1
+    for w in sorted(workers, key=lambda x: x.last):
+        done = load_progress(w.txt_dir)
+        if done < w.last:
+            return max(last, done)
+        last = w.last
+    return last
+
+
+def main():
+    logs_dir = os.path.join(PROJECT_ROOT, "logs")
+    os.makedirs(logs_dir, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        filename=os.path.join(logs_dir, "fleet.log"),
+        encoding="utf-8",
+        format="%(asctime)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        force=True,
+    )
+
+    txt_out_dir = os.path.join(PROJECT_ROOT, "TXT Outputs")
+    parser = argparse.ArgumentParser(description="Флот рабочих процессов eb_robot")
+    parser.add_argument("--total", type=int, required=True, help="всего записей в отфильтрованном списке")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get(WORKERS_ENV, "2") or 2))
+    parser.add_argument("--start", type=int, default=load_progress(txt_out_dir) + 1)
+    parser.add_argument("--headless", action="store_true")
+    args = parser.parse_args()
+
+    extra_args = ["--headless"] if args.headless else []
+    profile_src = os.environ.get("YANDEX_USER_DATA", DEFAULT_USER_DATA_DIR)
+
+    # профиль копируется с закрытого браузера
+    close_yandex_processes()
+
+    workers = [
+        WorkerSpec(number=i + 1, first=a, last=b, root=os.path.join(FLEET_DIR, f"worker{i + 1}"), origin=a)
+        for i, (a, b) in enumerate(split_ranges(max(1, args.start), args.total, args.workers))
+    ]
+    t0 = time.time()
+    try:
+        for i, w in enumerate(workers):
+            _prepare_worker_dir(w, profile_src)
+            _launch(w, extra_args)
+            if i < len(workers) - 1:
+                time.sleep(LAUNCH_STAGGER)
+
+        while any(not (w.finished or w.failed) for w in workers):
+            for w in workers:
+                if w.finished or w.failed or w.proc is None or w.proc.poll() is None:
+                    continue
+                _handle_exit(w, txt_out_dir, extra_args)
+            time.sleep(2)
+    except KeyboardInterrupt:
+        logging.info("Флот: остановка, ожидание рабочих процессов")
+        for w in workers:
+            if w.proc is not None:
+                try:
+                    w.proc.wait(timeout=60)
+                except Exception:
+                    w.proc.terminate()
+            merge_staging_outputs(w.txt_dir, txt_out_dir)
+
+    last = _contiguous_progress(workers, max(1, args.start))
+    save_progress(txt_out_dir, last)
+    elapsed = max(0.001, time.time() - t0)
+    done = sum(max(0, load_progress(w.txt_dir) - (w.origin - 1)) for w in workers)
+    msg = (
+        f"Флот: рабочих {len(workers)}, выгружено {done} записей за {elapsed:.0f} с "
+        f"({done * 60.0 / elapsed:.1f} зап/мин). Последняя непрерывная запись: {last}"
+    )
+    logging.info(msg)
+    print(msg)
+
+
+if __name__ == "__main__":
+    main()
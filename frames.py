@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Общий поиск iframe с содержимым страницы (дерево навигации, таблица реестра).
+Каждый документ проверяется одним вызовом скрипта — все XPath сразу, без ожиданий по каждому.
+Найденный путь iframe (номера от верхнего документа) запоминается по вкладке и роли:
+следующие вызовы переключаются по нему и перепроверяют его одним скриптом, а не перебирают все iframe заново.
+"""
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+ROLE_NAV = "nav"
+ROLE_TABLE = "table"
+
+# глубина вложенности iframe при поиске
+MAX_DEPTH = 3
+
+# номер первого XPath, по которому в документе есть узел, или -1
+_JS_PROBE = """
+var xps = arguments[0];
+for (var i = 0; i < xps.length; i++) {
+    try {
+        if (document.evaluate(xps[i], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue) return i;
+    } catch (e) {}
+}
+return -1;
+"""
+
+FramePath = Tuple[int, ...]
+
+_cache: Dict[Tuple[str, str, str], FramePath] = {}
+_lock = threading.Lock()
+
+
+def _key(driver, role: str) -> Tuple[str, str, str]:
+    try:
+        handle = driver.current_window_handle
+    except Exception:
+        handle = ""
+    return str(getattr(driver, "session_id", "")), handle, role
+
+
+def switch_frame_path(driver, path: FramePath) -> bool:
+    """Переключение по пути iframe от верхнего документа (() — верхний документ)"""
+    try:
+        driver.switch_to.default_content()
+        for i in path:
+            driver.switch_to.frame(i)
+        return True
+    except Exception:
+        return False
+
+
+def _probe(driver, xpaths: List[str]) -> int:
+    try:
+        r = driver.execute_script(_JS_PROBE, xpaths)
+        return int(r) if r is not None else -1
+    except Exception:
+        return -1
+
+
+def _frame_count(driver) -> int:
+    try:
+        return int(driver.execute_script("return window.frames.length;") or 0)
+    except Exception:
+        return 0
+
+
+def _scan(driver, xpaths: List[str], path: FramePath = (), depth: int = 0) -> Optional[FramePath]:
+    """Обход документа и его iframe (в глубину до MAX_DEPTH); драйвер остаётся в найденном контексте"""
+    if not switch_frame_path(driver, path):
+        return None
+    if _probe(driver, xpaths) >= 0:
+        return path
+    if depth >= MAX_DEPTH:
+        return None
+    for i in range(_frame_count(driver)):
+        found = _scan(driver, xpaths, path + (i,), depth + 1)
+        if found is not None:
+            return found
+    return None
+
+
+def cached_frame_path(driver, role: str) -> Optional[FramePath]:
+    with _lock:
+        return _cache.get(_key(driver, role))
+
+
+def invalidate(driver, role: Optional[str] = None) -> None:
+    """Забыть путь роли (None — всех ролей) для текущей вкладки"""
+    sid, handle, _ = _key(driver, "")
+    with _lock:
+        for k in list(_cache):
+            if k[0] == sid and k[1] == handle and (role is None or k[2] == role):
+                del _cache[k]
+
+
+def switch_to_cached(driver, role: str) -> bool:
+    """Переключение в запомненный контекст роли без проверки; без запомненного — в верхний документ"""
+    return switch_frame_path(driver, cached_frame_path(driver, role) or ())
+
+
+def switch_to_content(
+    driver,
+    role: str,
+    xpaths: List[str],
+    timeout: float,
+    poll: float = 0.2,
+    stop_check: Optional[Callable[[], bool]] = None,
+) -> bool:
+    """
+    Переключает драйвер в документ, где есть узел по одному из xpaths.
+    Если путь роли запомнен — проверяется текущий документ, затем этот путь (один скрипт на проверку);
+    иначе или если путь устарел — обход всех iframe раундами до timeout.
+    Не найдено — драйвер в верхнем документе, False
+    """
+    key = _key(driver, role)
+    with _lock:
+        path = _cache.get(key)
+    if path is not None:
+        # уже в нужном документе — без переключений
+        if _probe(driver, xpaths) >= 0:
+            return True
+        if switch_frame_path(driver, path) and _probe(driver, xpaths) >= 0:
+            return True
+        logger.debug("frames: контекст '%s' %s устарел, поиск заново", role, path)
+        with _lock:
+            _cache.pop(key, None)
+
+    t0 = time.time()
+    deadline = t0 + timeout
+    while True:
+        found = _scan(driver, xpaths)
+        if found is not None:
+            with _lock:
+                _cache[key] = found
+            logger.info(
+                "frames: контекст '%s' — %s (%.2f с)",
+                role, "iframe " + "/".join(map(str, found)) if found else "основной документ", time.time() - t0,
+            )
+            return True
+        if time.time() >= deadline or (stop_check and stop_check()):
+            break
+        time.sleep(poll)
+    switch_frame_path(driver, ())
+    return False
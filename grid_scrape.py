@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Список записей без «Печати списка»: ячейки таблицы читаются постранично одним вызовом скрипта
+и дописываются в CSV или SQLite по мере обхода страниц (в том числе попутно с экспортом TXT).
+"""
+import os
+import csv
+import time
+import sqlite3
+import logging
+from typing import List, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# формат списка: csv (по умолчанию) или sqlite
+LIST_FORMAT_ENV = "EB_LIST_FORMAT"
+LIST_TABLE = "list_rows"
+
+
+def list_output_path(out_dir: str) -> str:
+    """Путь файла списка в out_dir: list_<дата_время>.csv или .sqlite (по EB_LIST_FORMAT)"""
+    fmt = os.environ.get(LIST_FORMAT_ENV, "").strip().lower()
+    ext = ".sqlite" if fmt in ("sqlite", "sqlite3", "db") else ".csv"
+    return os.path.join(out_dir, f"list_{time.strftime('%Y%m%d_%H%M%S')}{ext}")
+
+
+def _column_names(header: List[str], width: int) -> List[str]:
+    """Уникальные непустые имена столбцов; недостающие — colN"""
+    names, seen = [], set()
+    for i in range(width):
+        name = " ".join(str(header[i] if i < len(header) else "").split()) or f"col{i + 1}"
+        base, n = name, 2
+        while name.lower() in seen or name.lower() in ("idx", "guid"):
+            name = f"{base}_{n}"
+            n += 1
+        seen.add(name.lower())
+        names.append(name)
+    return names
+
+
+class ListScrapeWriter:
+    """
+    Построчная запись списка: (номер записи, GUID, ячейки).
+    Строка с уже записанным номером повторно не пишется (повторный обход страницы после сбоя).
+    """
+
+    def __init__(self, path: str, header: Optional[List[str]] = None):
+        self.path = path
+        self.header = list(header or [])
+        self.rows_written = 0
+        self._columns: List[str] = []
+        self._seen: Set[int] = set()
+        self._csv_file = None
+        self._csv = None
+        self._db: Optional[sqlite3.Connection] = None
+        self.is_sqlite = path.lower().endswith((".sqlite", ".sqlite3", ".db"))
+
+    def _open(self, width: int) -> None:
+        self._columns = _column_names(self.header, width)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if self.is_sqlite:
+            self._db = sqlite3.connect(self.path)
+            cols = ", ".join(f'"{c}" TEXT' for c in self._columns)
+            self._db.execute(f'CREATE TABLE IF NOT EXISTS {LIST_TABLE} (idx INTEGER PRIMARY KEY, guid TEXT, {cols})')
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {LIST_TABLE}_guid ON {LIST_TABLE}(guid)")
+            self._db.commit()
+        else:
+            # utf-8-sig и «;» — файл корректно открывается в Excel
+            self._csv_file = open(self.path, "w", encoding="utf-8-sig", newline="")
+            self._csv = csv.writer(self._csv_file, delimiter=";")
+            self._csv.writerow(["№", "GUID"] + self._columns)
+
+    def write_rows(self, rows: List[Tuple[int, str, List[str]]]) -> int:
+        """Дописывает строки страницы; возвращает число новых строк"""
+        rows = [r for r in rows if r[0] not in self._seen]
+        if not rows:
+            return 0
+        if not self._columns:
+            self._open(max(len(self.header), max(len(c) for _, _, c in rows)))
+        width = len(self._columns)
+        values = [
+            [idx, guid] + [str(c) for c in (list(cells) + [""] * width)[:width]]
+            for idx, guid, cells in rows
+        ]
+        if self._db is not None:
+            marks = ", ".join("?" for _ in range(width + 2))
+            self._db.executemany(f"INSERT OR REPLACE INTO {LIST_TABLE} VALUES ({marks})", values)
+            self._db.commit()
+        else:
+            self._csv.writerows(values)
+            self._csv_file.flush()
+        self._seen.update(r[0] for r in rows)
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+        logger.info("Список: записано %d строк в %s", self.rows_written, self.path)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Поиск первого готового элемента среди нескольких селекторов — все альтернативы сразу, в браузере.
+Один асинхронный скрипт на каждом кадре (requestAnimationFrame; в фоновой вкладке — setTimeout)
+проверяет все XPath/CSS и возвращает первый подходящий элемент и номер его селектора.
+Общий таймаут один на всю цепочку: альтернатива k не ждёт, пока истекут таймауты k-1 предыдущих.
+"""
+import time
+import logging
+from typing import List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+PRESENT = "present"
+VISIBLE = "visible"
+CLICKABLE = "clickable"
+
+# селектор, начинающийся с "/", "(" или "." — XPath, иначе CSS.
+# При нескольких подходящих за кадр побеждает меньший номер селектора. Результат: [номер, элемент, мс] или null
+_JS_RACE = """
+var sels = arguments[0], cond = arguments[1], timeoutMs = arguments[2], done = arguments[arguments.length - 1];
+var t0 = Date.now();
+var find = function (s) {
+    try {
+        if (/^[\\/(.]/.test(s)) {
+            var snap = document.evaluate(s, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null), out = [];
+            for (var i = 0; i < snap.snapshotLength; i++) out.push(snap.snapshotItem(i));
+            return out;
+        }
+        return Array.prototype.slice.call(document.querySelectorAll(s));
+    } catch (e) { return []; }
+};
+var visible = function (el) {
+    if (!el.getBoundingClientRect) return false;
+    var r = el.getBoundingClientRect();
+    if (r.width <= 0 || r.height <= 0) return false;
+    var st = window.getComputedStyle(el);
+    return st.visibility !== 'hidden' && st.display !== 'none';
+};
+var clickable = function (el) {
+    if (!visible(el) || el.disabled) return false;
+    var r = el.getBoundingClientRect(), x = r.left + r.width / 2, y = r.top + r.height / 2;
+    // вне экрана — перекрытие не проверить, Selenium прокрутит сам
+    if (x < 0 || y < 0 || x >= window.innerWidth || y >= window.innerHeight) return true;
+    var top = document.elementFromPoint(x, y);
+    return !top || top === el || el.contains(top) || top.contains(el);
+};
+var ok = cond === 'clickable' ? clickable : (cond === 'visible' ? visible : function () { return true; });
+var tick = function () {
+    for (var i = 0; i < sels.length; i++) {
+        var els = find(sels[i]);
+        for (var j = 0; j < els.length; j++) {
+            if (ok(els[j])) { done([i, els[j], Date.now() - t0]); return; }
+        }
+    }
+    if (Date.now() - t0 >= timeoutMs) { done(null); return; }
+    if (document.hidden) setTimeout(tick, 50); else window.requestAnimationFrame(tick);
+};
+tick();
+"""
+
+
+def race_locate(
+    driver,
+    selectors: List[str],
+    condition: str = PRESENT,
+    timeout: float = 5.0,
+) -> Optional[Tuple[int, object]]:
+    """
+    Ждёт (не дольше timeout) первый элемент, удовлетворяющий condition (present / visible / clickable),
+    по любому из selectors в текущем документе. Возвращает (номер селектора, WebElement) или None
+    """
+    if not selectors:
+        return None
+    try:
+        previous = driver.timeouts.script
+    except Exception:
+        previous = None
+    try:
+        driver.set_script_timeout(timeout + 5)
+    except Exception:
+        pass
+    t0 = time.time()
+    try:
+        res = driver.execute_async_script(_JS_RACE, list(selectors), condition, int(timeout * 1000))
+    except Exception as e:
+        logger.debug("race_locate: скрипт не выполнен: %s", e)
+        res = None
+    finally:
+        try:
+            if previous is not None:
+                driver.set_script_timeout(previous)
+        except Exception:
+            pass
+    if not res:
+        logger.debug("race_locate: ни один из %d селекторов не готов (%s) за %.1f с", len(selectors), condition, time.time() - t0)
+        return None
+    idx, el = int(res[0]), res[1]
+    logger.debug("race_locate: селектор %d/%d готов (%s) через %s мс", idx + 1, len(selectors), condition, res[2])
+    return idx, el
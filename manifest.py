@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Манифест записей из списка, сохранённого «Печатью списка» (xlsx) или снимком таблицы (csv).
+Книга читается потоково (openpyxl read_only) и складывается в индексированную SQLite-таблицу:
+номер записи, GUID и ключевые столбцы. По манифесту известны точное число записей,
+какие из них уже выгружены и оценка времени — до первого клика по строке.
+
+  python manifest.py build "Excel outputs/список.xlsx" --out "TXT Outputs/_manifest.sqlite"
+  python manifest.py plan --manifest "TXT Outputs/_manifest.sqlite" --txt-dir "TXT Outputs"
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from delta import load_done_guids, normalize_guid
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "_manifest.sqlite"
+# ключевые столбцы манифеста (заголовки через запятую); по умолчанию — все
+KEY_COLUMNS_ENV = "EB_MANIFEST_COLUMNS"
+# заголовок столбца GUID, если не определяется автоматически
+GUID_COLUMN_ENV = "EB_MANIFEST_GUID_COLUMN"
+
+GUID_RE = re.compile(r"^\{?[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}\}?$")
+# сколько первых строк просматривать при поиске заголовка и столбца GUID
+PROBE_ROWS = 200
+BATCH = 5000
+
+
+def _cell(v) -> str:
+    return "" if v is None else " ".join(str(v).split())
+
+
+def _iter_xlsx(path: str) -> Iterator[Sequence]:
+    try:
+        from openpyxl import load_workbook  # type: ignore[import-untyped]
+    except ImportError:
+        raise RuntimeError("openpyxl не установлен: манифест из xlsx не строится")
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def _iter_csv(path: str) -> Iterator[Sequence]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        head = f.readline()
+        f.seek(0)
+        delimiter = ";" if head.count(";") >= head.count(",") else ","
+        for row in csv.reader(f, delimiter=delimiter):
+            yield row
+
+
+def iter_source_rows(path: str) -> Iterator[Sequence]:
+    """Строки источника (xlsx или csv) как последовательности значений"""
+    if path.lower().endswith(".csv"):
+        return _iter_csv(path)
+    return _iter_xlsx(path)
+
+
+def _detect_layout(probe: List[Sequence]) -> Tuple[int, int]:
+    """
+    (номер строки заголовка в probe, номер столбца GUID).
+    Столбец GUID — тот, где больше всего значений вида GUID; заголовок — строка перед первым из них.
+    Если значений вида GUID нет — ищется заголовок с «GUID» (или EB_MANIFEST_GUID_COLUMN).
+    """
+    wanted = os.environ.get(GUID_COLUMN_ENV, "").strip().lower()
+    if wanted:
+        for r, row in enumerate(probe):
+            for c, v in enumerate(row):
+                if _cell(v).lower() == wanted:
+                    return r, c
+    hits = {}
+    first_hit = {}
+    for r, row in enumerate(probe):
+        for c, v in enumerate(row):
+            if GUID_RE.match(_cell(v)):
+                hits[c] = hits.get(c, 0) + 1
+                first_hit.setdefault(c, r)
+    if hits:
+        col = max(hits, key=lambda c: (hits[c], -c))
+        return first_hit[col] - 1, col
+    for r, row in enumerate(probe):
+        for c, v in enumerate(row):
+            if "guid" in _cell(v).lower():
+                return r, c
+    raise ValueError("Не найден столбец GUID (задайте EB_MANIFEST_GUID_COLUMN)")
+
+
+@dataclass
+class ManifestInfo:
+    path: str
+    total: int
+    unique: int
+    guid_column: str
+    columns: List[str]
+    elapsed_s: float
+
+
+def build_manifest(src_path: str, db_path: str, key_columns: Optional[List[str]] = None) -> ManifestInfo:
+    """
+    Потоково читает список и пересоздаёт манифест db_path.
+    key_columns — заголовки сохраняемых столбцов (по умолчанию EB_MANIFEST_COLUMNS или все)
+    """
+    t0 = time.time()
+    rows = iter_source_rows(src_path)
+    probe: List[Sequence] = []
+    for row in rows:
+        probe.append(row)
+        if len(probe) >= PROBE_ROWS:
+            break
+    header_row, guid_col = _detect_layout(probe)
+    header = [_cell(v) for v in probe[header_row]] if header_row >= 0 else []
+
+    if key_columns is None:
+        env_cols = [c.strip() for c in os.environ.get(KEY_COLUMNS_ENV, "").split(",") if c.strip()]
+        key_columns = env_cols or None
+    if key_columns:
+        low = [h.lower() for h in header]
+        keep = [low.index(k.lower()) for k in key_columns if k.lower() in low]
+    else:
+        keep = [i for i in range(len(header)) if i != guid_col]
+    columns = [header[i] or f"col{i + 1}" for i in keep]
+
+    tmp = db_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db = sqlite3.connect(tmp)
+    total = 0
+    try:
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        db.execute("CREATE TABLE manifest (idx INTEGER PRIMARY KEY, guid TEXT NOT NULL, data TEXT)")
+        batch = []
+
+        def _data_rows(seq: Iterable[Sequence]):
+            for row in seq:
+                guid = _cell(row[guid_col]) if guid_col < len(row) else ""
+                if not guid or guid.lower() == (header[guid_col].lower() if header else ""):
+                    continue
+                yield guid, [_cell(row[i]) if i < len(row) else "" for i in keep]
+
+        def _all_rows():
+            yield from probe[header_row + 1:]
+            yield from rows
+
+        for guid, values in _data_rows(_all_rows()):
+            total += 1
+            batch.append((total, normalize_guid(guid), json.dumps(values, ensure_ascii=False)))
+            if len(batch) >= BATCH:
+                db.executemany("INSERT INTO manifest VALUES (?, ?, ?)", batch)
+                batch = []
+        if batch:
+            db.executemany("INSERT INTO manifest VALUES (?, ?, ?)", batch)
+        db.execute("CREATE INDEX manifest_guid ON manifest(guid)")
+        meta = {
+            "source": os.path.abspath(src_path),
+            "built": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "guid_column": header[guid_col] if header else f"col{guid_col + 1}",
+            "columns": json.dumps(columns, ensure_ascii=False),
+        }
+        db.executemany("INSERT INTO meta VALUES (?, ?)", list(meta.items()))
+        unique = db.execute("SELECT COUNT(DISTINCT guid) FROM manifest").fetchone()[0]
+        db.commit()
+    finally:
+        db.close()
+    os.replace(tmp, db_path)
+    info = ManifestInfo(db_path, total, unique, meta["guid_column"], columns, round(time.time() - t0, 1))
+    logger.info(
+        "Манифест: %d записей (уникальных GUID %d) из %s за %.1f с",
+        info.total, info.unique, os.path.basename(src_path), info.elapsed_s,
+    )
+    return info
+
+
+@dataclass
+class ManifestPlan:
+    total: int  # записей в выбранном диапазоне
+    done: int  # уже выгружено
+    todo: int  # к выгрузке
+    per_min: Optional[float]  # темп по прошлым запускам
+    eta_s: Optional[float]
+
+    def describe(self) -> str:
+        eta = "неизвестно"
+        if self.eta_s is not None:
+            h, rem = divmod(int(self.eta_s), 3600)
+            eta = f"{h} ч {rem // 60} мин"
+        return f"записей {self.total}, уже выгружено {self.done}, к выгрузке {self.todo}, оценка времени {eta}"
+
+
+class Manifest:
+    """Чтение манифеста: число записей, GUID по номеру и номер по GUID, план выгрузки. GUID — в виде normalize_guid."""
+
+    def __init__(self, db_path: str):
+        self.path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+
+    def close(self) -> None:
+        self._db.close()
+
+    @property
+    def total(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM manifest").fetchone()[0]
+
+    def guid_at(self, index: int) -> Optional[str]:
+        row = self._db.execute("SELECT guid FROM manifest WHERE idx = ?", (index,)).fetchone()
+        return row[0] if row else None
+
+    def index_of(self, guid: str) -> Optional[int]:
+        row = self._db.execute("SELECT MIN(idx) FROM manifest WHERE guid = ?", (normalize_guid(guid),)).fetchone()
+        return row[0] if row else None
+
+    def iter_guids(self, start_index: int = 1, end_index: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        q = "SELECT idx, guid FROM manifest WHERE idx >= ?"
+        args: list = [start_index]
+        if end_index:
+            q += " AND idx <= ?"
+            args.append(end_index)
+        yield from self._db.execute(q + " ORDER BY idx", args)
+
+    def plan(self, done_guids: Set[str], start_index: int = 1, end_index: Optional[int] = None,
+             per_min: Optional[float] = None) -> ManifestPlan:
+        total = done = 0
+        for _, guid in self.iter_guids(start_index, end_index):
+            total += 1
+            if guid in done_guids:
+                done += 1
+        todo = total - done
+        eta = (todo / per_min * 60.0) if per_min else None
+        return ManifestPlan(total, done, todo, per_min, eta)
+
+
+def recent_rate(txt_out_dir: str) -> Optional[float]:
+    """Темп выгрузки (записей в минуту) по последнему запуску из _window_stats.jsonl"""
+    path = os.path.join(txt_out_dir, "_window_stats.jsonl")
+    rate = None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("done", 0) > 0 and rec.get("per_min"):
+                    rate = float(rec["per_min"])
+    except FileNotFoundError:
+        return None
+    except Exception:
+        return rate
+    return rate
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Манифест записей из списка (xlsx/csv)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build")
+    p_build.add_argument("source")
+    p_build.add_argument("--out", default=MANIFEST_FILENAME)
+    p_plan = sub.add_parser("plan")
+    p_plan.add_argument("--manifest", required=True)
+    p_plan.add_argument("--txt-dir", required=True)
+    p_plan.add_argument("--start", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        info = build_manifest(args.source, args.out)
+        print(f"Записей: {info.total}, уникальных GUID: {info.unique}, столбец GUID: {info.guid_column}")
+    elif args.cmd == "plan":
+        m = Manifest(args.manifest)
+        try:
+            done = load_done_guids(args.txt_dir, os.path.join(args.txt_dir, "processed_guids.xlsx"))
+            print(m.plan(done, args.start, per_min=recent_rate(args.txt_dir)).describe())
+        finally:
+            m.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
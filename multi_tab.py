@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Экспорт несколькими вкладками одного авторизованного браузера.
+Авторизация по сертификату оплачивается один раз; в каждой новой вкладке выполняются
+навигация и фильтрация, затем вкладки выгружают непересекающиеся диапазоны страниц.
+WebDriver выполняет команды последовательно, поэтому вкладки обслуживаются по очереди,
+а параллельно идут серверная подготовка и скачивание архивов.
+"""
+import os
+import time
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from authorization import cert_dialog_visible, run_authorization
+from navigation import run_navigation
+from table_export2 import (
+    BROWSER_DOWNLOADS_DIR,
+    X_TH9_CONTEXT,
+    WaitCfg,
+    prepare_table,
+    print_list_to_outputs,
+)
+from filtering import apply_settings_hide_always, run_filtering
+from frames import ROLE_TABLE, cached_frame_path, switch_frame_path, switch_to_content
+from txt_output import TabShard, export_sharded_tabs
+
+
+logger = logging.getLogger(__name__)
+
+TABS_ENV = "EB_TABS"
+MAX_TABS = 8
+
+# сколько ждать загрузки страницы в новой вкладке (и появления окна выбора сертификата)
+TAB_LOAD_TIMEOUT = 30
+
+
+def get_tab_count() -> int:
+    """Число вкладок из EB_TABS (1..MAX_TABS), по умолчанию 1."""
+    try:
+        n = int(os.environ.get(TABS_ENV, "").strip() or 1)
+    except ValueError:
+        n = 1
+    return max(1, min(MAX_TABS, n))
+
+
+def _table_frame_path(driver) -> Tuple[int, ...]:
+    """Путь iframe, в котором находится таблица (() — таблица в default content)."""
+    switch_to_content(driver, ROLE_TABLE, [X_TH9_CONTEXT], 0)
+    return cached_frame_path(driver, ROLE_TABLE) or ()
+
+
+def _activate(driver, shard: TabShard) -> None:
+    """Переключает драйвер на вкладку и её iframe с таблицей."""
+    driver.switch_to.window(shard.handle)
+    switch_frame_path(driver, shard.frame_path)
+
+
+def _open_session_page(driver, base_url: str, stop_check) -> bool:
+    """
+    Открывает страницу в новой вкладке без повторной авторизации: cookie сессии общие для вкладок браузера.
+    Переход запускается скриптом, без ожидания загрузки (окно выбора сертификата заблокировало бы driver.get);
+    run_authorization — только если это окно появилось. False — страница не загрузилась за TAB_LOAD_TIMEOUT
+    """
+    if not (base_url and base_url.strip()):
+        logger.error("BASE_URL пустой, страница не открыта")
+        return False
+    driver.execute_script("window.location.href = arguments[0];", base_url)
+    deadline = time.time() + TAB_LOAD_TIMEOUT
+    while time.time() < deadline:
+        if stop_check and stop_check():
+            return False
+        if cert_dialog_visible():
+            logger.info("Запрошен сертификат — авторизация во вкладке")
+            run_authorization(driver, base_url, stop_check, skip_navigate=True)
+            return True
+        try:
+            if driver.current_url.startswith("http") and \
+                    driver.execute_script("return document.readyState") == "complete":
+                return True
+        except Exception:
+            pass
+        time.sleep(0.3)
+    return False
+
+
+def _open_prepared_tab(driver, number: int, base_url: str, wait_cfg: WaitCfg, stop_check, do_click) -> Optional[TabShard]:
+    """Новая вкладка: открыть страницу, навигация, подготовка таблицы. None — вкладку подготовить не удалось"""
+    try:
+        driver.switch_to.new_window("tab")
+    except Exception as e:
+        logger.warning("Вкладка %d: не удалось открыть: %s", number, e)
+        return None
+    handle = driver.current_window_handle
+    try:
+        if not _open_session_page(driver, base_url, stop_check):
+            raise RuntimeError("страница не загрузилась")
+        if stop_check and stop_check():
+            return None
+        if not run_navigation(driver, stop_check, do_click):
+            raise RuntimeError("навигация не выполнена")
+        driver.implicitly_wait(0)
+        if not prepare_table(driver, wait_cfg, stop_check):
+            return None
+        return TabShard(number=number, handle=handle, frame_path=_table_frame_path(driver))
+    except Exception as e:
+        logger.warning("Вкладка %d: подготовка не выполнена (%s), вкладка закрыта", number, e)
+        try:
+            driver.close()
+        except Exception:
+            pass
+        return None
+
+
+def run_multi_tab_export(
+    driver,
+    tabs: int,
+    base_url: str,
+    download_dir: Optional[str] = None,
+    stop_check: Optional[Callable[[], bool]] = None,
+    do_click: Optional[Callable] = None,
+    start_index: int = 1,
+    end_index: Optional[int] = None,
+):
+    """
+    Вкладка 1 (уже после навигации): подготовка таблицы и печать списка в Excel.
+    Вкладки 2..N: открытие, навигация, подготовка. Затем экспорт TXT по диапазонам страниц
+    """
+    wait_cfg = WaitCfg()
+    download_dir = download_dir or BROWSER_DOWNLOADS_DIR
+
+    try:
+        original_implicit = driver.timeouts.implicit_wait
+    except Exception:
+        original_implicit = None
+
+    apply_settings_hide_always(driver, stop_check=stop_check)
+
+    try:
+        try:
+            driver.implicitly_wait(0)
+        except Exception:
+            pass
+
+        project_root = os.path.dirname(os.path.abspath(__file__))
+        excel_out_dir = os.path.join(project_root, "Excel outputs")
+        txt_out_dir = os.path.join(project_root, "TXT Outputs")
+        os.makedirs(excel_out_dir, exist_ok=True)
+        os.makedirs(txt_out_dir, exist_ok=True)
+
+        if not prepare_table(driver, wait_cfg, stop_check):
+            return
+        print_list_to_outputs(driver, wait_cfg, download_dir, excel_out_dir, stop_check)
+        if stop_check and stop_check():
+            return
+
+        shards: List[TabShard] = [
+            TabShard(number=1, handle=driver.current_window_handle, frame_path=_table_frame_path(driver))
+        ]
+        for number in range(2, tabs + 1):
+            if stop_check and stop_check():
+                return
+            shard = _open_prepared_tab(driver, number, base_url, wait_cfg, stop_check, do_click)
+            if shard is not None:
+                shards.append(shard)
+        logger.info("Экспорт вкладками: подготовлено %d из %d", len(shards), tabs)
+
+        export_sharded_tabs(
+            driver,
+            shards,
+            lambda s: _activate(driver, s),
+            download_dir=download_dir,
+            txt_out_dir=txt_out_dir,
+            cfg=wait_cfg,
+            stop_check=stop_check,
+            start_index=start_index,
+            end_index=end_index,
+            rewind=lambda: run_filtering(driver, cfg=wait_cfg, stop_check=stop_check, force=True),
+        )
+
+    finally:
+        try:
+            if original_implicit is not None:
+                driver.implicitly_wait(int(original_implicit))
+            else:
+                driver.implicitly_wait(5)
+        except Exception:
+            pass
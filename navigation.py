@@ -2,9 +2,10 @@
 import logging
 import time
 
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from frames import ROLE_NAV, invalidate, switch_to_cached, switch_to_content
+from locator import PRESENT, race_locate
+from preflight import prefer_resolved, preflight, register_selectors
+from selector_stats import ordered, record_success
 
 
 CLICK_DELAY = 0.7
@@ -15,7 +16,6 @@ POLL = 0.2
 DELAY_BETWEEN_ROUNDS = 1.0  # пауза между повторами
 WAIT_TREE_TIMEOUT = 2
 FRAME_TRY_TIMEOUT = 2
-TREE_XPATH_TIMEOUT = 0.8  # на каждый xpath при поиске дерева
 
 # селекторы готовности дерева
 TREE_READY_XPATHS = [
@@ -69,13 +69,11 @@ BUTTON_XPATHS = [
     ],
 ]
 
-
-# контекст: None = default, иначе iframe
-_nav_context_holder = [None]
-
-
-def _wait(driver, timeout: float):
-    return WebDriverWait(driver, timeout, poll_frequency=POLL)
+register_selectors(
+    ROLE_NAV,
+    {"дерево": TREE_READY_XPATHS, "шаг 1": FIRST_BUTTON_FALLBACK_XPATHS},
+    required=("дерево", "шаг 1"),
+)
 
 
 def _switch_default(driver):
@@ -86,65 +84,18 @@ def _switch_default(driver):
 
 
 def _switch_to_nav_context(driver):
-    # переключить в контекст дерева (default или iframe)
-    ctx = _nav_context_holder[0] if _nav_context_holder else None
-    if ctx is not None:
-        try:
-            driver.switch_to.frame(ctx)
-        except Exception:
-            pass
-    else:
-        _switch_default(driver)
+    # переключить в контекст дерева (default или iframe) — путь запомнен в frames
+    switch_to_cached(driver, ROLE_NAV)
 
 
-def _tree_found_in_current_context(driver, timeout: float = None):
-    t = timeout if timeout is not None else TREE_XPATH_TIMEOUT
-    for xpath in TREE_READY_XPATHS:
-        try:
-            _wait(driver, t).until(EC.presence_of_element_located((By.XPATH, xpath)))
-            return True
-        except Exception:
-            continue
-    return False
-
-
-def _find_nav_context(driver, stop_check):
+def _find_nav_context(driver, stop_check) -> bool:
     """
-    Определяет, в default content или в iframe находится дерево
-    Возвращает None (искать в default) или WebElement iframe
+    Определяет, в default content или в iframe находится дерево (один скрипт на документ за раунд),
+    и запоминает контекст для _switch_to_nav_context
     """
-    _switch_default(driver)
-    deadline = time.time() + WAIT_TREE_TIMEOUT
-    while time.time() < deadline:
-        if stop_check and stop_check():
-            return None
-        if _tree_found_in_current_context(driver):
-            return None
-        time.sleep(POLL)
-    try:
-        frames = driver.find_elements(By.TAG_NAME, "iframe")
-    except Exception:
-        frames = []
-    for i, frame_el in enumerate(frames):
-        if stop_check and stop_check():
-            return None
-        try:
-            _switch_default(driver)
-            driver.switch_to.frame(frame_el)
-            if _tree_found_in_current_context(driver, timeout=FRAME_TRY_TIMEOUT):
-                return frame_el
-        except Exception:
-            pass
-        _switch_default(driver)
-    return None
-
-
-def _get(driver, xpath: str, timeout: float):
-    _switch_to_nav_context(driver)
-    try:
-        return _wait(driver, timeout).until(EC.presence_of_element_located((By.XPATH, xpath)))
-    except Exception:
-        return None
+    return switch_to_content(
+        driver, ROLE_NAV, TREE_READY_XPATHS, WAIT_TREE_TIMEOUT + FRAME_TRY_TIMEOUT, POLL, stop_check
+    )
 
 
 def _click_el(driver, el, do_click) -> bool:
@@ -154,43 +105,43 @@ def _click_el(driver, el, do_click) -> bool:
         return False
 
 
-def _click_xpath(driver, xpath: str, do_click, stop_check, label: str, timeout: float = 1.5) -> bool:
+def _click_step_xpaths(driver, xpath_list, do_click, stop_check, label: str, timeout: float = 1,
+                       chain: str = None, group: str = None) -> bool:
+    # все альтернативы ждутся одновременно; timeout — на каждую альтернативу, как при переборе по одной:
+    # общий таймаут цепочки timeout × число альтернатив, чтобы медленный узел дерева успевал появиться;
+    # chain — имя цепочки в selector_stats: при одновременном появлении побеждает сработавшая последней;
+    # group — группа preflight экрана навигации: найденные проверкой альтернативы идут первыми
+    order = prefer_resolved(ROLE_NAV, group, ordered(chain, xpath_list))
+    chain_timeout = timeout * max(1, len(order))
     for attempt in range(1, RETRY_CLICK + 1):
         if stop_check and stop_check():
             return False
 
-        el = _get(driver, xpath, timeout=timeout)
-        if not el:
+        _switch_to_nav_context(driver)
+        hit = race_locate(driver, order, PRESENT, chain_timeout)
+        if not hit:
             time.sleep(0.35)
             continue
 
+        idx, el = hit
         if _click_el(driver, el, do_click):
+            logging.debug("Навигация: %s — вариант %d/%d", label, idx + 1, len(order))
             time.sleep(CLICK_DELAY)
+            record_success(chain, order[idx], order[:idx])
             return True
         time.sleep(0.35)
 
     return False
 
 
-def _click_step_xpaths(driver, xpath_list, do_click, stop_check, label: str, timeout: float = 1) -> bool:
-    for i, xp in enumerate(xpath_list, start=1):
-        if stop_check and stop_check():
-            return False
-        sub = f"{label} (вариант {i}/{len(xpath_list)})"
-        if _click_xpath(driver, xp, do_click, stop_check, sub, timeout=timeout):
-            return True
-    return False
-
-
 def _step1(driver, do_click, stop_check) -> bool:
     for round_idx in range(1, RETRY_CLICK + 1):
         if stop_check and stop_check():
             return False
 
-        for i, xp in enumerate(FIRST_BUTTON_FALLBACK_XPATHS, start=1):
-            label = f"шаг 1 (fallback {i}/{len(FIRST_BUTTON_FALLBACK_XPATHS)})"
-            if _click_xpath(driver, xp, do_click, stop_check, label, timeout=1):
-                return True
+        if _click_step_xpaths(driver, FIRST_BUTTON_FALLBACK_XPATHS, do_click, stop_check, "шаг 1",
+                              timeout=1, chain="nav.step1", group="шаг 1"):
+            return True
         time.sleep(0.6)
 
     return False
@@ -209,7 +160,9 @@ def run_navigation(driver, stop_check, do_click):
         except Exception:
             pass
 
-        _nav_context_holder[0] = _find_nav_context(driver, stop_check)
+        if not _find_nav_context(driver, stop_check):
+            logging.warning("Навигация: дерево не найдено ни в одном документе, ищем в основном")
+        preflight(driver, ROLE_NAV)
         if stop_check and stop_check():
             return False
 
@@ -231,7 +184,7 @@ def run_navigation(driver, stop_check, do_click):
             for round_num in range(1, RETRY_STEP_ROUNDS + 1):
                 if stop_check and stop_check():
                     return False
-                ok = _click_step_xpaths(driver, xpath_list, do_click, stop_check, label)
+                ok = _click_step_xpaths(driver, xpath_list, do_click, stop_check, label, chain=f"nav.step{idx + 2}")
                 if ok:
                     idx += 1
                     backtracks = 0
@@ -262,11 +215,7 @@ def run_navigation(driver, stop_check, do_click):
         return False
 
     finally:
-        try:
-            if _nav_context_holder:
-                _nav_context_holder[0] = None
-        except Exception:
-            pass
+        invalidate(driver, ROLE_NAV)
         try:
             if original_implicit is not None:
                 driver.implicitly_wait(int(original_implicit))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Всплывающие уведомления (gritter) без опроса по XPath.
+В страницу один раз внедряется MutationObserver: каждое уведомление (заголовок, текст, время)
+складывается во внутристраничный буфер, Python забирает буфер одним вызовом скрипта.
+После перезагрузки страницы слушатель ставится заново при первом же drain().
+"""
+import time
+import logging
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from pacing import report_error
+
+
+logger = logging.getLogger(__name__)
+
+# не больше стольких уведомлений в буфере страницы (старые отбрасываются)
+BUFFER_LIMIT = 200
+
+_JS_INSTALL = """
+var w = window, limit = arguments[0];
+if (w.__ebToasts) return false;
+w.__ebToasts = [];
+var text = function (el) { return el ? (el.textContent || '').replace(/\\s+/g, ' ').trim() : ''; };
+var grab = function (item) {
+    if (!item || item.__ebSeen) return;
+    var title = text(item.querySelector('.gritter-title'));
+    var ps = item.querySelectorAll('p'), body = [];
+    for (var i = 0; i < ps.length; i++) { var t = text(ps[i]); if (t) body.push(t); }
+    var msg = body.join('\\n') || text(item.querySelector('.gritter-with-image, .gritter-without-image'));
+    if (!title && !msg) return;
+    item.__ebSeen = true;
+    w.__ebToasts.push({title: title, text: msg, ts: Date.now()});
+    if (w.__ebToasts.length > limit) w.__ebToasts.splice(0, w.__ebToasts.length - limit);
+};
+var scan = function (node) {
+    if (!node || node.nodeType !== 1) return;
+    if (node.closest) grab(node.closest('.gritter-item'));
+    var items = node.querySelectorAll('.gritter-item');
+    for (var i = 0; i < items.length; i++) grab(items[i]);
+};
+scan(document.body);
+new MutationObserver(function (muts) {
+    for (var i = 0; i < muts.length; i++) {
+        var added = muts[i].addedNodes;
+        for (var j = 0; j < added.length; j++) scan(added[j].nodeType === 1 ? added[j] : added[j].parentElement);
+    }
+}).observe(document.body, {childList: true, subtree: true, characterData: true});
+return true;
+"""
+
+_JS_DRAIN = """
+var b = window.__ebToasts;
+if (!b) return null;
+window.__ebToasts = [];
+return b;
+"""
+
+
+@dataclass
+class Toast:
+    title: str
+    text: str
+    ts: float  # время появления (epoch, с)
+
+    @property
+    def is_error(self) -> bool:
+        low = f"{self.title} {self.text}".lower()
+        return "ошибк" in low or "не удалось" in low or "error" in low
+
+    def __str__(self) -> str:
+        return f"{self.title}: {self.text}" if self.text else self.title
+
+
+def install_toast_listener(driver) -> bool:
+    """Внедряет слушатель в текущий документ (повторный вызов ничего не делает)"""
+    try:
+        return bool(driver.execute_script(_JS_INSTALL, BUFFER_LIMIT))
+    except Exception as e:
+        logger.debug("слушатель уведомлений не установлен: %s", e)
+        return False
+
+
+def drain_toasts(driver) -> List[Toast]:
+    """Забирает накопленные уведомления; если слушателя нет (новая страница) — ставит его"""
+    try:
+        raw = driver.execute_script(_JS_DRAIN)
+    except Exception:
+        return []
+    if raw is None:
+        install_toast_listener(driver)
+        return []
+    toasts = []
+    for it in raw:
+        try:
+            toasts.append(Toast(str(it.get("title") or ""), str(it.get("text") or ""), float(it.get("ts") or 0) / 1000.0))
+        except Exception:
+            continue
+    for t in toasts:
+        logger.log(logging.WARNING if t.is_error else logging.INFO, "Уведомление: %s", t)
+    return toasts
+
+
+def wait_for_toast(
+    driver,
+    predicate: Callable[[Toast], bool],
+    timeout: float,
+    stop_check: Optional[Callable[[], bool]] = None,
+    poll: float = 0.2,
+) -> Optional[Toast]:
+    """
+    Ждёт уведомление, удовлетворяющее predicate (не дольше timeout); timeout=0 — только текущий буфер.
+    Остальные забранные из буфера уведомления уже в логе; ошибки среди них учитываются EB_AIMD.
+    """
+    deadline = time.time() + timeout
+    while True:
+        for t in drain_toasts(driver):
+            if predicate(t):
+                return t
+            if t.is_error:
+                report_error("уведомление об ошибке")
+        if time.time() >= deadline or (stop_check and stop_check()):
+            return None
+        time.sleep(poll)
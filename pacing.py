@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Адаптивное управление параллельностью (AIMD) по сигналам перегрузки сервера.
+Сигналы ошибок: окно ошибки печати (X_PRINT_ERROR_BTN), '?' в пагинации, таймаут скачивания ZIP.
+Пока ошибок нет и задержка в норме — лимит растёт на 1 за каждые limit успешных операций;
+при ошибке — уменьшается вдвое (не чаще раза в COOLDOWN секунд). Каждое решение пишется в лог
+вместе с входными данными.
+
+Включается EB_AIMD=1; верхняя граница — EB_TXT_WINDOW (экспорты «в полёте»; при вкладках — на все вкладки).
+Контроллер создаётся в начале запуска (start_pacing), поэтому ошибки печати списка и уведомления
+до первого окна экспорта тоже учитываются. Число вкладок и рабочих процессов fleet не регулируется.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+AIMD_ENV = "EB_AIMD"
+# целевая задержка скачивания ZIP, с: выше — лимит не растёт
+LATENCY_TARGET_ENV = "EB_AIMD_LATENCY"
+DEFAULT_LATENCY_TARGET = 10.0
+COOLDOWN = 5.0
+# пауза после ошибки: растёт вдвое на каждую ошибку, уменьшается на успехах
+MIN_PAUSE = 0.2
+MAX_PAUSE = 10.0
+
+
+def aimd_enabled() -> bool:
+    return os.environ.get(AIMD_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class AimdController:
+    """Лимит параллельности: аддитивный рост, мультипликативное снижение."""
+
+    def __init__(self, name: str, initial: int = 1, minimum: int = 1, maximum: int = 8,
+                 latency_target: Optional[float] = None, decrease: float = 0.5):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.decrease = decrease
+        if latency_target is None:
+            try:
+                latency_target = float(os.environ.get(LATENCY_TARGET_ENV, "") or DEFAULT_LATENCY_TARGET)
+            except ValueError:
+                latency_target = DEFAULT_LATENCY_TARGET
+        self.latency_target = latency_target
+        self.pause = MIN_PAUSE
+        self._streak = 0
+        self._last_decrease = 0.0
+        self._latencies = deque(maxlen=20)
+        self._errors = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def _inputs(self) -> str:
+        now = time.time()
+        errors_min = len([t for t, _ in self._errors if now - t <= 60])
+        avg = (sum(self._latencies) / len(self._latencies)) if self._latencies else 0.0
+        return f"успехов подряд {self._streak}, ошибок за 60 с {errors_min}, задержка ср. {avg:.1f} с"
+
+    def _set(self, new_limit: int, reason: str) -> None:
+        new_limit = min(self.maximum, max(self.minimum, new_limit))
+        if new_limit != self.limit:
+            logger.info("AIMD %s: %d → %d (%s; %s)", self.name, self.limit, new_limit, reason, self._inputs())
+            self.limit = new_limit
+
+    def on_success(self, latency: Optional[float] = None) -> None:
+        with self._lock:
+            self.pause = max(MIN_PAUSE, self.pause - 0.2)
+            if latency is not None:
+                self._latencies.append(latency)
+                if latency > self.latency_target:
+                    self._streak = 0
+                    logger.debug("AIMD %s: задержка %.1f с выше цели %.1f с", self.name, latency, self.latency_target)
+                    return
+            self._streak += 1
+            if self._streak >= self.limit:
+                self._set(self.limit + 1, "рост: операции без ошибок")
+                self._streak = 0
+
+    def on_error(self, kind: str) -> None:
+        with self._lock:
+            now = time.time()
+            self._errors.append((now, kind))
+            self.pause = min(MAX_PAUSE, self.pause * 2)
+            if now - self._last_decrease < COOLDOWN:
+                logger.debug("AIMD %s: ошибка %s в период охлаждения", self.name, kind)
+                self._streak = 0
+                return
+            self._last_decrease = now
+            if self.limit > self.minimum:
+                self._set(int(self.limit * self.decrease), f"снижение: {kind}")
+            else:
+                logger.info("AIMD %s: ошибка %s на минимальном лимите %d (%s)", self.name, kind, self.limit, self._inputs())
+            self._streak = 0
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "pause": round(self.pause, 2),
+                "errors": len(self._errors),
+            }
+
+
+_controllers: Dict[str, AimdController] = {}
+_registry_lock = threading.Lock()
+
+
+def get_controller(name: str, maximum: int = 8, initial: int = 1) -> AimdController:
+    """Общий контроллер по имени (сигналы из разных модулей попадают в один контроллер)."""
+    with _registry_lock:
+        c = _controllers.get(name)
+        if c is None:
+            c = AimdController(name, initial=initial, maximum=maximum)
+            _controllers[name] = c
+        elif maximum != c.maximum:
+            c.maximum = max(c.minimum, maximum)
+            c.limit = min(c.limit, c.maximum)
+        return c
+
+
+def start_pacing(maximum: int, name: str = "exports") -> Optional[AimdController]:
+    """При EB_AIMD=1 создаёт контроллер заранее (до первого окна экспорта); без EB_AIMD — None."""
+    if not aimd_enabled():
+        return None
+    c = get_controller(name, maximum=max(1, maximum))
+    logger.info("AIMD %s: включён, лимит %d из %d", name, c.limit, c.maximum)
+    return c
+
+
+def report_error(kind: str, name: str = "exports") -> None:
+    """Сигнал перегрузки сервера; без EB_AIMD или до создания контроллера игнорируется."""
+    c = _controllers.get(name)
+    if c is not None:
+        c.on_error(kind)
+
+
+def backoff_pause(default: float, name: str = "exports") -> float:
+    """Пауза после ошибки: при включённом AIMD — адаптивная, иначе default."""
+    c = _controllers.get(name)
+    return c.pause if c is not None else default
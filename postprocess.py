@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Фоновая постобработка скачанных архивов.
+Поток, управляющий браузером, только кладёт задания в ограниченную очередь;
+распаковку, переименование, запись GUID и прогресса выполняют рабочие потоки.
+Переполненная очередь приостанавливает обход (back-pressure), при остановке очередь дорабатывается.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# число рабочих потоков; 0 — обработка в потоке браузера (прежнее поведение)
+WORKERS_ENV = "EB_POSTPROCESS_WORKERS"
+# размер очереди заданий (при заполнении обход ждёт)
+QUEUE_SIZE_ENV = "EB_POSTPROCESS_QUEUE"
+# число процессов для распаковки; 0 — распаковка в рабочих потоках
+PROCESSES_ENV = "EB_POSTPROCESS_PROCESSES"
+
+DEFAULT_QUEUE_SIZE = 8
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.environ.get(name, "").strip() or default))
+    except ValueError:
+        return default
+
+
+@dataclass
+class PostJob:
+    zip_path: str
+    guid: str
+    index: int  # глобальный номер записи (1-based)
+
+
+class PostProcessPool:
+    """
+    Пул постобработки. handler(job) выполняет всю работу по одному архиву и бросает исключение при ошибке.
+    При workers=0 submit() выполняет handler сразу и пробрасывает ошибку вызывающему.
+    """
+
+    def __init__(self, handler: Callable[[PostJob], None], workers: int = 0,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, processes: int = 0):
+        self.handler = handler
+        self.workers = max(0, workers)
+        self.failed: List[Tuple[PostJob, Exception]] = []
+        self.done = 0
+        self.blocked_s = 0.0
+        self.process_executor = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))  # PostJob; None — остановка потока
+        self._threads: List[threading.Thread] = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"postprocess-{i + 1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    @classmethod
+    def from_env(cls, handler: Callable[[PostJob], None]) -> "PostProcessPool":
+        return cls(
+            handler,
+            workers=_env_int(WORKERS_ENV, 0),
+            queue_size=_env_int(QUEUE_SIZE_ENV, DEFAULT_QUEUE_SIZE) or DEFAULT_QUEUE_SIZE,
+            processes=_env_int(PROCESSES_ENV, 0),
+        )
+
+    def _run(self, job: PostJob) -> None:
+        self.handler(job)
+        with self._lock:
+            self.done += 1
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                try:
+                    self._run(job)
+                except Exception as e:
+                    logger.warning("постобработка: запись #%s (%s): %s", job.index, job.guid, e)
+                    with self._lock:
+                        self.failed.append((job, e))
+            finally:
+                self._queue.task_done()
+
+    def submit(self, job: PostJob) -> None:
+        """Ставит задание в очередь; если очередь заполнена — ждёт освобождения места."""
+        if not self._threads:
+            self._run(job)
+            return
+        t0 = time.time()
+        self._queue.put(job)
+        waited = time.time() - t0
+        if waited > 0.5:
+            self.blocked_s += waited
+            logger.debug("постобработка: очередь заполнена, обход ждал %.1f с", waited)
+
+    def drain(self) -> None:
+        """Дожидается обработки всех поставленных заданий."""
+        if self._threads:
+            self._queue.join()
+
+    def close(self) -> None:
+        """Дорабатывает очередь и останавливает рабочие потоки (в т.ч. при Ctrl+X)."""
+        self.drain()
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        if self.process_executor is not None:
+            self.process_executor.shutdown(wait=True)
+            self.process_executor = None
+        if self.workers:
+            logger.info(
+                "постобработка: обработано %d, ошибок %d, ожидание очереди %.1f с",
+                self.done, len(self.failed), self.blocked_s,
+            )
+
+    def take_failed(self) -> List[PostJob]:
+        with self._lock:
+            jobs = [j for j, _ in self.failed]
+            self.failed = []
+        return jobs
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Предварительная проверка селекторов экрана одним вызовом скрипта.
+Модули регистрируют свои XPath по экранам (nav — дерево навигации, table — реестр) группами альтернатив;
+preflight() вычисляет все XPath экрана сразу и сообщает, сколько узлов нашёл каждый и сколько заняла проверка.
+Смещение вёрстки видно за миллисекунды, а не после таймаутов каждой альтернативы.
+При EB_PREFLIGHT_STRICT=1 ненайденная обязательная группа останавливает запуск.
+Последний отчёт по экрану запоминается: prefer_resolved() ставит найденные альтернативы группы
+первыми в цепочке поиска (поверх порядка selector_stats.ordered).
+"""
+import os
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+STRICT_ENV = "EB_PREFLIGHT_STRICT"
+
+# число узлов по каждому XPath (-1 — XPath с ошибкой) и время вычисления в браузере
+_JS_COUNT = """
+var xps = arguments[0], out = [], t0 = performance.now();
+for (var i = 0; i < xps.length; i++) {
+    try { out.push(document.evaluate(xps[i], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null).snapshotLength); }
+    catch (e) { out.push(-1); }
+}
+return {counts: out, ms: performance.now() - t0};
+"""
+
+
+@dataclass
+class SelectorGroup:
+    name: str
+    xpaths: List[str]
+    required: bool = False
+
+
+# экран -> группа -> альтернативы
+_registry: Dict[str, Dict[str, SelectorGroup]] = {}
+# экран -> последний отчёт preflight()
+_reports: Dict[str, "PreflightReport"] = {}
+
+
+def register_selectors(screen: str, groups: Dict[str, Sequence[str]], required: Sequence[str] = ()) -> None:
+    """Регистрирует группы альтернативных XPath экрана; required — группы, без которых работа невозможна"""
+    screen_groups = _registry.setdefault(screen, {})
+    for name, xpaths in groups.items():
+        screen_groups[name] = SelectorGroup(name, list(xpaths), name in required)
+
+
+def registered(screen: str) -> List[SelectorGroup]:
+    return list(_registry.get(screen, {}).values())
+
+
+@dataclass
+class PreflightReport:
+    screen: str
+    browser_ms: float = 0.0
+    counts: Dict[str, List[int]] = field(default_factory=dict)  # группа -> число узлов по каждой альтернативе
+    groups: Dict[str, SelectorGroup] = field(default_factory=dict)
+
+    def resolved(self, group: str) -> List[str]:
+        """Альтернативы группы, по которым найдены узлы (в порядке регистрации)"""
+        g = self.groups[group]
+        return [xp for xp, n in zip(g.xpaths, self.counts.get(group, [])) if n > 0]
+
+    @property
+    def missing(self) -> List[str]:
+        return [name for name in self.groups if not self.resolved(name)]
+
+    @property
+    def missing_required(self) -> List[str]:
+        return [name for name in self.missing if self.groups[name].required]
+
+    @property
+    def invalid(self) -> List[str]:
+        return [xp for name, g in self.groups.items() for xp, n in zip(g.xpaths, self.counts.get(name, [])) if n < 0]
+
+    def summary(self) -> str:
+        total = sum(len(g.xpaths) for g in self.groups.values())
+        found = len(self.groups) - len(self.missing)
+        text = f"экран '{self.screen}': {total} XPath за {self.browser_ms:.1f} мс, групп найдено {found}/{len(self.groups)}"
+        if self.missing:
+            text += "; не найдены: " + ", ".join(
+                f"{n}{' (обязательная)' if self.groups[n].required else ''}" for n in self.missing
+            )
+        if self.invalid:
+            text += f"; XPath с ошибкой: {len(self.invalid)}"
+        return text
+
+
+def preflight(driver, screen: str) -> Optional[PreflightReport]:
+    """
+    Проверяет все зарегистрированные XPath экрана в текущем документе одним вызовом скрипта.
+    None — экран не зарегистрирован или скрипт не выполнен. При EB_PREFLIGHT_STRICT=1 и ненайденной
+    обязательной группе — RuntimeError
+    """
+    groups = registered(screen)
+    if not groups:
+        return None
+    flat = [xp for g in groups for xp in g.xpaths]
+    try:
+        res = driver.execute_script(_JS_COUNT, flat) or {}
+    except Exception as e:
+        logger.warning("Проверка селекторов '%s' не выполнена: %s", screen, e)
+        return None
+    counts = [int(c) for c in res.get("counts") or []]
+    rep = PreflightReport(screen, float(res.get("ms") or 0.0), groups={g.name: g for g in groups})
+    pos = 0
+    for g in groups:
+        rep.counts[g.name] = counts[pos:pos + len(g.xpaths)]
+        pos += len(g.xpaths)
+        logger.debug("preflight %s/%s: %s", screen, g.name, rep.counts[g.name])
+
+    _reports[screen] = rep
+    logger.log(logging.WARNING if rep.missing_required else logging.INFO, "Проверка селекторов: %s", rep.summary())
+    if rep.missing_required and os.environ.get(STRICT_ENV, "").strip() == "1":
+        raise RuntimeError(f"Не найдены обязательные элементы экрана '{screen}': {', '.join(rep.missing_required)}")
+    return rep
+
+
+def prefer_resolved(screen: str, group: Optional[str], xpaths: List[str]) -> List[str]:
+    """
+    Цепочка xpaths, в которой альтернативы, найденные последней проверкой экрана в группе group, идут первыми
+    (внутри найденных и ненайденных порядок сохраняется). Без отчёта или без найденных — порядок прежний
+    """
+    rep = _reports.get(screen)
+    if not group or rep is None or group not in rep.groups:
+        return list(xpaths)
+    found = set(rep.resolved(group))
+    if not found:
+        return list(xpaths)
+    result = [xp for xp in xpaths if xp in found] + [xp for xp in xpaths if xp not in found]
+    if result != list(xpaths):
+        logger.debug("preflight %s/%s: первой пробуется найденная альтернатива", screen, group)
+    return result
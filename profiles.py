@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Профили фильтров: какие статус и «Период по» выставлять, задаются в файле, а не в коде.
+Несколько профилей выгружаются подряд в одной сессии (python eb_robot.py --profiles),
+каждый — в свои папки TXT Outputs/<имя> и Excel outputs/<имя> со своим прогрессом.
+
+filter_profiles.json (или путь в EB_FILTER_PROFILES):
+  {"profiles": [
+      {"name": "agreed_2025", "status": "Согласовано получателем", "period_to": "31.12.2025"},
+      {"name": "agreed_2024", "status": "Согласовано получателем", "period_to": "31.12.2024"}
+  ]}
+"""
+import os
+import re
+import json
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+from filtering import FilterSpec
+
+
+logger = logging.getLogger(__name__)
+
+PROFILES_ENV = "EB_FILTER_PROFILES"
+PROFILES_FILENAME = "filter_profiles.json"
+
+_NAME_RE = re.compile(r"^[\w.-]+$")
+_DATE_RE = re.compile(r"^\d{2}\.\d{2}\.\d{4}$")
+
+
+@dataclass
+class FilterProfile:
+    name: str  # имя папки вывода
+    spec: FilterSpec
+
+
+def profiles_path(project_root: str) -> str:
+    return os.environ.get(PROFILES_ENV, "").strip() or os.path.join(project_root, PROFILES_FILENAME)
+
+
+def load_profiles(path: str) -> List[FilterProfile]:
+    """Профили из файла; ошибки описания — ValueError с именем профиля"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    items = data.get("profiles", []) if isinstance(data, dict) else data
+    defaults = FilterSpec()
+    out: List[FilterProfile] = []
+    names = set()
+    for i, it in enumerate(items, 1):
+        name = str(it.get("name") or "").strip()
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Профиль #{i}: имя '{name}' должно состоять из букв, цифр, '_', '-', '.'")
+        if name in names:
+            raise ValueError(f"Профиль '{name}' описан дважды")
+        names.add(name)
+        spec = FilterSpec(
+            status=str(it.get("status") or defaults.status).strip(),
+            period_to=str(it.get("period_to") or defaults.period_to).strip(),
+        )
+        if not _DATE_RE.match(spec.period_to):
+            raise ValueError(f"Профиль '{name}': period_to '{spec.period_to}' не в формате ДД.ММ.ГГГГ")
+        out.append(FilterProfile(name, spec))
+    if not out:
+        raise ValueError(f"В {path} нет профилей")
+    return out
+
+
+def select_profiles(profiles: List[FilterProfile], names: Optional[List[str]]) -> List[FilterProfile]:
+    """Профили по именам в заданном порядке (None — все); неизвестное имя — ValueError"""
+    if not names:
+        return profiles
+    by_name = {p.name: p for p in profiles}
+    missing = [n for n in names if n not in by_name]
+    if missing:
+        raise ValueError(f"Нет профилей: {', '.join(missing)} (есть: {', '.join(by_name)})")
+    return [by_name[n] for n in names]
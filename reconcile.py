@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Сверка выгрузки по трём источникам: манифест списка (xlsx/csv или готовый _manifest.sqlite),
+журнал processed_guids.xlsx и файлы в TXT Outputs. Всё — на множествах GUID, за один проход по каждому источнику.
+
+Результат: отсутствующие (есть в списке, нет TXT), дубликаты (<GUID>__N.txt), лишние
+(TXT, которого нет в списке), расхождения журнала. Отсутствующие пишутся в _requeue.json —
+их выгружает `python eb_robot.py --requeue`.
+
+  python reconcile.py --txt-dir "TXT Outputs" [--list "Excel outputs/список.xlsx"]
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from delta import guids_from_ledger, normalize_guid
+from manifest import MANIFEST_FILENAME, Manifest, build_manifest
+from txt_output import GUIDS_EXCEL_FILENAME, REQUEUE_FILENAME, save_requeue
+
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILENAME = "_reconcile.json"
+
+_TXT_NAME_RE = re.compile(r"^(?P<guid>.+?)(?:__(?P<n>\d+))?\.txt$", re.IGNORECASE)
+
+
+def scan_txt_outputs(txt_out_dir: str) -> Dict[str, List[str]]:
+    """GUID (normalize_guid) -> имена файлов (<GUID>.txt, <GUID>__N.txt); служебные файлы (_*) пропускаются"""
+    out: Dict[str, List[str]] = {}
+    try:
+        names = os.listdir(txt_out_dir)
+    except Exception:
+        return out
+    for n in names:
+        if n.startswith("_"):
+            continue
+        m = _TXT_NAME_RE.match(n)
+        if m:
+            out.setdefault(normalize_guid(m.group("guid")), []).append(n)
+    return out
+
+
+@dataclass
+class ReconcileReport:
+    listed: int = 0
+    files: int = 0
+    ledger: int = 0
+    missing: List[Tuple[int, str]] = field(default_factory=list)  # в списке, нет TXT
+    duplicates: Dict[str, List[str]] = field(default_factory=dict)  # GUID -> файлы
+    orphaned: List[str] = field(default_factory=list)  # TXT, которого нет в списке
+    ledger_without_file: List[str] = field(default_factory=list)
+    file_without_ledger: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (
+            f"В списке {self.listed}, TXT {self.files}, в журнале {self.ledger}. "
+            f"Отсутствуют {len(self.missing)}, дубликаты {len(self.duplicates)}, лишние {len(self.orphaned)}, "
+            f"в журнале без файла {len(self.ledger_without_file)}, файлы вне журнала {len(self.file_without_ledger)}"
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "listed": self.listed,
+            "files": self.files,
+            "ledger": self.ledger,
+            "missing": [{"index": i, "guid": g} for i, g in self.missing],
+            "duplicates": self.duplicates,
+            "orphaned": self.orphaned,
+            "ledger_without_file": self.ledger_without_file,
+            "file_without_ledger": self.file_without_ledger,
+        }
+
+
+def reconcile(txt_out_dir: str, list_path: Optional[str] = None, write_requeue: bool = True) -> ReconcileReport:
+    """
+    Сверка. list_path — список (xlsx/csv), по нему манифест перестраивается; иначе берётся
+    TXT Outputs/_manifest.sqlite. Без манифеста сверяются только журнал и файлы.
+    Отчёт пишется в _reconcile.json, отсутствующие — в _requeue.json (write_requeue)
+    """
+    manifest_path = os.path.join(txt_out_dir, MANIFEST_FILENAME)
+    if list_path:
+        build_manifest(list_path, manifest_path)
+
+    files = scan_txt_outputs(txt_out_dir)
+    ledger = guids_from_ledger(os.path.join(txt_out_dir, GUIDS_EXCEL_FILENAME))
+    rep = ReconcileReport(files=sum(len(v) for v in files.values()), ledger=len(ledger))
+    rep.duplicates = {g: sorted(v) for g, v in files.items() if len(v) > 1}
+
+    listed: Set[str] = set()
+    if os.path.isfile(manifest_path):
+        m = Manifest(manifest_path)
+        try:
+            for idx, guid in m.iter_guids():
+                rep.listed += 1
+                if guid in listed:
+                    continue
+                listed.add(guid)
+                if guid not in files:
+                    rep.missing.append((idx, guid))
+        finally:
+            m.close()
+        rep.orphaned = sorted(g for g in files if g not in listed)
+    else:
+        logger.warning("Манифест %s не найден: сверяются только журнал и файлы", manifest_path)
+
+    rep.ledger_without_file = sorted(g for g in ledger if g not in files)
+    rep.file_without_ledger = sorted(g for g in files if g not in ledger)
+
+    try:
+        with open(os.path.join(txt_out_dir, REPORT_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(rep.as_dict(), f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.warning("Не удалось записать %s: %s", REPORT_FILENAME, e)
+    if write_requeue and rep.listed:
+        save_requeue(txt_out_dir, rep.missing)
+    logger.info("Сверка: %s", rep.summary())
+    return rep
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Сверка списка, журнала GUID и файлов TXT")
+    parser.add_argument("--txt-dir", required=True)
+    parser.add_argument("--list", default=None, help="список (xlsx/csv); по умолчанию — готовый манифест")
+    parser.add_argument("--no-requeue", action="store_true", help=f"не перезаписывать {REQUEUE_FILENAME}")
+    args = parser.parse_args(argv)
+
+    rep = reconcile(args.txt_dir, args.list, write_requeue=not args.no_requeue)
+    print(rep.summary())
+    for idx, guid in rep.missing[:20]:
+        print(f"  нет TXT: #{idx} {guid}")
+    for guid, names in list(rep.duplicates.items())[:20]:
+        print(f"  дубликаты: {', '.join(names)}")
+    for guid in rep.orphaned[:20]:
+        print(f"  нет в списке: {guid}")
+    if rep.missing and not args.no_requeue:
+        print(f"На повтор: {len(rep.missing)} записей в {REQUEUE_FILENAME} (python eb_robot.py --requeue)")
+    return 0 if not rep.missing else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
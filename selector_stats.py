@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Порядок альтернатив в цепочках XPath по прошлым запускам.
+Для каждой цепочки (шаги навигации, раскрытие статуса, поле «Период по», строки диалога колонок)
+запоминается, какая альтернатива сработала: число попаданий, промахов перед ней и время последнего успеха.
+Следующий запуск пробует первой последнюю сработавшую альтернативу, а не платит таймауты заведомо мёртвых.
+Параллельные процессы дописывают в файл свои приращения, а не перезаписывают его своей копией.
+Статистика — в _selector_stats.json рядом со скриптом:
+
+  python selector_stats.py            — просмотр
+  python selector_stats.py --reset    — сброс
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+STATS_FILENAME = "_selector_stats.json"
+
+_lock = threading.Lock()
+_stats: Optional[Dict[str, Dict[str, dict]]] = None  # цепочка -> XPath -> {hits, misses, last_ok}
+# приращения этого процесса, ещё не записанные в файл (та же структура)
+_pending: Dict[str, Dict[str, dict]] = {}
+
+
+def stats_path() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), STATS_FILENAME)
+
+
+def _read_file() -> Dict[str, Dict[str, dict]]:
+    try:
+        with open(stats_path(), "r", encoding="utf-8") as f:
+            return json.load(f).get("chains", {})
+    except Exception:
+        return {}
+
+
+def _load() -> Dict[str, Dict[str, dict]]:
+    global _stats
+    if _stats is None:
+        _stats = _read_file()
+    return _stats
+
+
+def _add(target: Dict[str, Dict[str, dict]], chain: str, xpath: str, hits: int = 0, misses: int = 0,
+         last_ok: float = 0) -> None:
+    st = target.setdefault(chain, {}).setdefault(xpath, {"hits": 0, "misses": 0, "last_ok": 0})
+    st["hits"] = int(st.get("hits", 0)) + hits
+    st["misses"] = int(st.get("misses", 0)) + misses
+    st["last_ok"] = max(float(st.get("last_ok", 0)), last_ok)
+
+
+def _save() -> None:
+    """
+    Дописывает приращения процесса к статистике на диске: файл перечитывается перед заменой,
+    так параллельные рабочие (fleet) не затирают чужие попадания своей копией
+    """
+    global _stats
+    path = stats_path()
+    merged = _read_file()
+    for chain, entries in _pending.items():
+        for xp, d in entries.items():
+            _add(merged, chain, xp, d["hits"], d["misses"], d["last_ok"])
+    # свой временный файл у каждого процесса: параллельные рабочие не обрезают чужой перед os.replace
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(prefix=STATS_FILENAME + ".", suffix=".tmp", dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"chains": merged}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        _stats = merged
+        _pending.clear()
+    except Exception as e:
+        logger.warning("Не удалось сохранить %s: %s", STATS_FILENAME, e)
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def ordered(chain: Optional[str], xpaths: List[str]) -> List[str]:
+    """
+    Альтернативы цепочки в порядке попыток: сначала сработавшие (последний успех — раньше,
+    при равенстве — больше попаданий), затем остальные в исходном порядке
+    """
+    if not chain:
+        return list(xpaths)
+    with _lock:
+        known = dict(_load().get(chain, {}))
+
+    def key(item):
+        i, xp = item
+        st = known.get(xp)
+        if not st or not st.get("hits"):
+            return (1, 0.0, 0, i)
+        return (0, -float(st.get("last_ok", 0)), -int(st["hits"]), i)
+
+    result = [xp for _, xp in sorted(enumerate(xpaths), key=key)]
+    if result != list(xpaths):
+        logger.debug("selector_stats: %s — первой пробуется альтернатива %d", chain, xpaths.index(result[0]) + 1)
+    return result
+
+
+def record_success(chain: Optional[str], xpath: str, missed: List[str] = ()) -> None:
+    """Отмечает сработавшую альтернативу и те, что перед ней не сработали"""
+    if not chain:
+        return
+    now = round(time.time(), 1)
+    with _lock:
+        stats = _load()
+        for target in (stats, _pending):
+            for xp in missed:
+                _add(target, chain, xp, misses=1)
+            _add(target, chain, xpath, hits=1, last_ok=now)
+        _save()
+
+
+def snapshot() -> Dict[str, Dict[str, dict]]:
+    with _lock:
+        return json.loads(json.dumps(_load()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Статистика альтернатив XPath")
+    parser.add_argument("--reset", action="store_true", help="удалить статистику")
+    args = parser.parse_args(argv)
+    if args.reset:
+        try:
+            os.remove(stats_path())
+        except FileNotFoundError:
+            pass
+        print("Статистика сброшена")
+        return 0
+    chains = snapshot()
+    if not chains:
+        print("Статистики нет")
+    for chain, entries in sorted(chains.items()):
+        print(chain)
+        for xp, st in sorted(entries.items(), key=lambda kv: -float(kv[1].get("last_ok", 0))):
+            last = time.strftime("%Y-%m-%d %H:%M", time.localtime(st["last_ok"])) if st.get("last_ok") else "—"
+            print(f"  попаданий {st.get('hits', 0):>4}  промахов {st.get('misses', 0):>4}  успех {last}  {xp}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,10 @@
 import os
+import json
 import time
 import shutil
 import zipfile
 import logging
+import threading
 from dataclasses import dataclass
 from typing import Callable, Optional, Sequence, Tuple, List
 
@@ -18,8 +20,24 @@ from selenium.common.exceptions import (
     WebDriverException,
 )
 
-from filtering import run_filtering, apply_settings_hide_always
-from txt_output import export_all_rows_to_txt
+from filtering import FilterSpec, run_filtering, apply_settings_hide_always
+from txt_output import (
+    GUIDS_EXCEL_FILENAME, WaitCfg as TxtWaitCfg, export_all_rows_to_txt, export_fire_then_collect, export_from_queue,
+    export_requeued, load_progress, read_grid_header, scrape_grid_list,
+)
+from grid_scrape import ListScrapeWriter, list_output_path
+from manifest import MANIFEST_FILENAME, Manifest, ManifestPlan, build_manifest, recent_rate
+from delta import load_done_guids
+from reconcile import reconcile
+from work_queue import open_work_queue
+from notifications import Toast, install_toast_listener, wait_for_toast
+from pacing import backoff_pause, report_error
+from task_manager import CollectedJobs, request_print_list_download
+from profiles import FilterProfile
+from frames import ROLE_TABLE, switch_to_content
+from locator import PRESENT, race_locate
+from preflight import preflight, register_selectors
+from selector_stats import ordered, record_success
 
 
 BROWSER_DOWNLOADS_DIR = os.environ.get(
@@ -38,8 +56,6 @@ X_CTX_MENU_LI3 = "/html/body/div[4]/ul/li[3]/a"
 X_PRINT_TABLE_FIRST_ROW = "/html/body/div[5]/div[2]/div/div[2]/div/div/div/div[2]/div/div/div/div[2]/table/tbody[1]/tr[1]/td"
 X_PRINT_OK_BTN = "/html/body/div[5]/div[2]/div/div[1]/div[1]/div/div/div[1]/button[1]"
 
-X_GRITTER_TITLE_SPAN = "/html/body/div[4]/div/div[2]/div[1]/span"
-
 
 X_SINGLE_CHECKBOX_SPAN = "/html/body/div[1]/div[1]/div[2]/div[3]/div[2]/div/div/div/div/div[2]/div[2]/div/div/table/tbody/tr/td/table/tbody/tr/td/div[1]/div[1]/div/div/div/div[1]/div/div/div/div[2]/table/tbody[1]/tr[1]/td[1]/div/span"
 
@@ -61,6 +77,48 @@ SELECTED_ROW_BG_RGB = "rgb(144, 182, 228)"
 
 X_PRINT_ERROR_BTN = "/html/body/div[5]/div[2]/table[2]/tbody/tr/td/table/tbody/tr/td/button"
 
+register_selectors(ROLE_TABLE, {
+    "заголовок th[9]": [X_TH9_CONTEXT],
+    "переключатель фильтров": [X_FILTER_TOGGLE_IMG],
+    "печать списка": [X_BTN_PRINT_LIST],
+    "экспорт TXT": [X_BTN_EXPORT_TXT],
+    "чекбокс первой строки": [X_SINGLE_CHECKBOX_SPAN],
+}, required=("заголовок th[9]", "печать списка", "экспорт TXT"))
+
+# сколько секунд ждать Excel «Печати списка» перед экспортом TXT, чтобы манифест (рабочий список) был готов
+# до первого клика; по умолчанию 0 — экспорт начинается сразу, план строится, только если Excel уже пришёл.
+# Иначе Excel принимается в фоне, манифест и сверка — после выгрузки
+PRINT_LIST_WAIT_ENV = "EB_PRINT_LIST_WAIT"
+DEFAULT_PRINT_LIST_WAIT = 0
+
+# сколько ждать уведомление «Печать списка … Успешно завершена»: как прежний опрос по XPath — задание
+# на сервере завершается за несколько секунд после ОК, а уведомление приходит только по его окончании
+PRINT_TOAST_TIMEOUT = 12
+
+# заголовки таблицы после последнего «выбрать все колонки»: совпадают — диалог колонок не открывается
+COLUMNS_STATE_FILENAME = "_grid_columns.json"
+
+# флаги z-listitem-selected всех строк диалога колонок одним вызовом
+_JS_COLUMN_FLAGS = """
+var snap = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var out = [];
+for (var i = 0; i < snap.snapshotLength; i++) out.push(/z-listitem-selected/.test(snap.snapshotItem(i).className || ''));
+return out;
+"""
+
+# клик по всем невыделенным строкам диалога колонок за один проход; возвращает число кликов
+_JS_SELECT_COLUMNS = """
+var snap = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var n = 0;
+for (var i = 0; i < snap.snapshotLength; i++) {
+    var tr = snap.snapshotItem(i);
+    if (/z-listitem-selected/.test(tr.className || '')) continue;
+    tr.click();
+    n++;
+}
+return n;
+"""
+
 @dataclass
 class WaitCfg:
     short: int = 5
@@ -195,47 +253,9 @@ def _exists(driver, by, selector, timeout: int, poll: float = 0.2) -> bool:
         return False
 
 
-def _switch_default(driver):
-    try:
-        driver.switch_to.default_content()
-    except Exception:
-        pass
-
-
 def _ensure_table_context(driver, wait_cfg: WaitCfg, stop_check=None) -> bool:
-    try:
-        _wait(driver, 3, wait_cfg.poll).until(
-            EC.presence_of_element_located((By.XPATH, X_TH9_CONTEXT))
-        )
-        return True
-    except TimeoutException:
-        pass
-    _switch_default(driver)
-    try:
-        _wait(driver, min(10, wait_cfg.medium), wait_cfg.poll).until(
-            EC.presence_of_element_located((By.XPATH, X_TH9_CONTEXT))
-        )
-        return True
-    except TimeoutException:
-        pass
-    try:
-        frames = driver.find_elements(By.TAG_NAME, "iframe")
-    except Exception:
-        frames = []
-    for i, frame_el in enumerate(frames):
-        if stop_check and stop_check():
-            return False
-        try:
-            _switch_default(driver)
-            driver.switch_to.frame(frame_el)
-            _wait(driver, 6, wait_cfg.poll).until(
-                EC.presence_of_element_located((By.XPATH, X_TH9_CONTEXT))
-            )
-            return True
-        except TimeoutException:
-            pass
-    _switch_default(driver)
-    return False
+    """Переключение в документ с таблицей (путь iframe запоминается в frames и перепроверяется одним скриптом)"""
+    return switch_to_content(driver, ROLE_TABLE, [X_TH9_CONTEXT], wait_cfg.medium, wait_cfg.poll, stop_check)
 
 
 def _scroll_into_view(driver, el):
@@ -311,14 +331,6 @@ def _is_checkbox_checked(span_el) -> bool:
     return False
 
 
-def _tr_is_selected(tr_el) -> bool:
-    try:
-        cls = (tr_el.get_attribute("class") or "").lower()
-        return "z-listitem-selected" in cls
-    except Exception:
-        return False
-
-
 def _element_has_selected_background(driver, el) -> bool:
     """Проверяет, что у элемента (или у родительского tr) фон выделения background: #90B6E4"""
     def _check_bg(e):
@@ -416,34 +428,86 @@ def _ensure_filters_on(driver, wait_cfg: WaitCfg, stop_check=None) -> bool:
     return "filter_off" in src or src.endswith("filter_off.png")
 
 
-def _catch_print_success_toast(driver, wait_cfg: WaitCfg) -> bool:
-    deadline = _now() + 12
-    poll = 0.08
-    while _now() < deadline:
+def _is_print_success_toast(t: Toast) -> bool:
+    return "Печать списка" in t.title and "Успешно завершена" in t.text
+
+
+def _catch_print_success_toast(driver, wait_cfg: WaitCfg, timeout: float = PRINT_TOAST_TIMEOUT) -> bool:
+    """Уведомление об успешной печати из буфера слушателя (не дольше timeout, без опроса по XPath)"""
+    if wait_for_toast(driver, _is_print_success_toast, timeout) is not None:
+        print("Печать списка успешно завершена")
+        return True
+    return False
+
+
+def _columns_state_path() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), COLUMNS_STATE_FILENAME)
+
+
+def _load_columns_header() -> List[str]:
+    try:
+        with open(_columns_state_path(), "r", encoding="utf-8") as f:
+            return list(json.load(f).get("header") or [])
+    except Exception:
+        return []
+
+
+def _save_columns_header(header: List[str]) -> None:
+    try:
+        with open(_columns_state_path(), "w", encoding="utf-8") as f:
+            json.dump({"ts": time.strftime("%Y-%m-%d %H:%M:%S"), "header": header}, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logging.warning("Не удалось сохранить %s: %s", COLUMNS_STATE_FILENAME, e)
+
+
+def _column_flags(driver, rows_xpath: str) -> List[bool]:
+    try:
+        return [bool(f) for f in (driver.execute_script(_JS_COLUMN_FLAGS, rows_xpath) or [])]
+    except Exception:
+        return []
+
+
+def _select_all_columns(driver, rows_xpath: str, wait_cfg: WaitCfg, stop_check=None) -> bool:
+    """Выделяет все строки диалога колонок: один проход скрипта, затем проверка флагов (до 3 проходов)"""
+    for attempt in range(1, 4):
+        if stop_check and stop_check():
+            return False
+        flags = _column_flags(driver, rows_xpath)
+        if flags and all(flags):
+            return True
         try:
-            title_el = driver.find_element(By.XPATH, X_GRITTER_TITLE_SPAN)
-            title_txt = (title_el.text or "").strip()
-            if 'Операция "Печать списка"' in title_txt or "Печать списка" in title_txt:
-                container = title_el.find_element(By.XPATH, "./ancestor::div[contains(@class,'gritter-item')]")
-                ps = container.find_elements(By.XPATH, ".//p")
-                for p in ps:
-                    txt = (p.text or "").strip()
-                    if "Успешно завершена" in txt and "Диспетчере задач" in txt:
-                        print("Печать списка успешно завершена")
-                        return True
-        except Exception:
-            pass
-        time.sleep(poll)
+            clicked = driver.execute_script(_JS_SELECT_COLUMNS, rows_xpath)
+        except Exception as e:
+            logging.debug("Выбор колонок скриптом не выполнен: %s", e)
+            clicked = 0
+        logging.info("Колонки: выбрано %s из %d недостающих (проход %d)", clicked, flags.count(False), attempt)
+        deadline = _now() + wait_cfg.short
+        while _now() < deadline:
+            if stop_check and stop_check():
+                return False
+            flags = _column_flags(driver, rows_xpath)
+            if flags and all(flags):
+                return True
+            time.sleep(wait_cfg.poll)
     return False
 
 
 def _open_columns_menu_and_check_all(driver, wait_cfg: WaitCfg, stop_check=None) -> bool:
     """
+      - если заголовки таблицы совпадают с сохранёнными после прошлого выбора всех колонок — ничего не делаем
       - ПКМ по th[9]
       - выбор меню li[1]/a
-      - пройтись по всем чекбоксам в появившейся таблице и поставить галки только где нет
+      - флаги всех строк появившейся таблицы читаются одним вызовом; если выбраны все — сразу Apply,
+        иначе все невыделенные выбираются за один проход скрипта
       - нажать Apply кнопку
     """
+    txt_cfg = TxtWaitCfg(short=wait_cfg.short, medium=wait_cfg.short, long=wait_cfg.medium, poll=wait_cfg.poll)
+    header_before = read_grid_header(driver, txt_cfg)
+    saved = _load_columns_header()
+    if header_before and header_before == saved:
+        logging.info("Колонки: заголовки совпадают с сохранёнными (%d), диалог не открывается", len(header_before))
+        return True
+
     try:
         th9 = _find(driver, By.XPATH, X_TH9_CONTEXT, wait_cfg.medium, wait_cfg.poll)
     except TimeoutException:
@@ -474,42 +538,23 @@ def _open_columns_menu_and_check_all(driver, wait_cfg: WaitCfg, stop_check=None)
         return False
 
     _safe_sleep(0.8, stop_check)
-    rows_xpath = None
-    for candidate in ROWS_TABLE_XPATHS:
-        try:
-            _wait(driver, 8, wait_cfg.poll).until(
-                lambda d, xp=candidate: len(d.find_elements(By.XPATH, xp)) > 0
-            )
-            rows_xpath = candidate
-            break
-        except TimeoutException:
-            continue
-    if not rows_xpath:
+    # все варианты строк диалога ждутся одновременно, 8 с на всю цепочку
+    order = ordered("columns.rows", ROWS_TABLE_XPATHS)
+    hit = race_locate(driver, order, PRESENT, 8)
+    if not hit:
         return False
-
-    # Проходим по tr: выделенная строка имеет класс z-listitem-selected; кликаем только по невыделенным
-    # Проверяем по свежему элементу по индексу, чтобы не снять выделение с уже выделенной строки (мигание последней строки).
-    max_passes = 50
-    for _ in range(max_passes):
-        if stop_check and stop_check():
-            return False
-        rows = driver.find_elements(By.XPATH, rows_xpath)
-        if not rows:
-            break
-        found_unselected = False
-        for idx in range(1, len(rows) + 1):
-            try:
-                tr = driver.find_element(By.XPATH, rows_xpath + f"[{idx}]")
-                if _tr_is_selected(tr):
-                    continue
-                found_unselected = True
-                _robust_click(driver, tr)
-                _safe_sleep(0.5, stop_check)
-                break
-            except (StaleElementReferenceException, Exception):
-                break
-        if not found_unselected:
-            break
+    rows_xpath = order[hit[0]]
+    record_success("columns.rows", rows_xpath, order[:hit[0]])
+
+    # выделенная строка имеет класс z-listitem-selected; кликаем только по невыделенным
+    flags = _column_flags(driver, rows_xpath)
+    all_selected = bool(flags) and all(flags)
+    if all_selected:
+        logging.info("Колонки: выбраны все (%d)", len(flags))
+    else:
+        all_selected = _select_all_columns(driver, rows_xpath, wait_cfg, stop_check)
+        if not all_selected:
+            logging.warning("Колонки: не все строки выбраны после 3 проходов")
 
     try:
         apply_btn = _find_visible(driver, By.XPATH, X_APPLY_COLUMNS_BTN, wait_cfg.medium, wait_cfg.poll)
@@ -519,6 +564,15 @@ def _open_columns_menu_and_check_all(driver, wait_cfg: WaitCfg, stop_check=None)
         return False
 
     _safe_sleep(0.6, stop_check)
+    # заголовки после применения — до перерисовки таблицы могут остаться прежними
+    deadline = _now() + wait_cfg.short
+    header = read_grid_header(driver, txt_cfg)
+    while flags and not all(flags) and header == header_before and _now() < deadline:
+        time.sleep(wait_cfg.poll)
+        header = read_grid_header(driver, txt_cfg)
+    # неполный набор не сохраняется: иначе следующие запуски пропустят диалог и останутся без колонок
+    if header and all_selected:
+        _save_columns_header(header)
     return True
 
 
@@ -583,7 +637,10 @@ def _open_print_dialog_and_click_ok(driver, wait_cfg: WaitCfg, stop_check=None)
             ok = _find_visible(driver, By.XPATH, X_PRINT_OK_BTN, wait_cfg.medium, wait_cfg.poll)
         except TimeoutException:
             continue
-            
+
+        # слушатель уведомлений — до клика, чтобы не пропустить быстрое уведомление
+        install_toast_listener(driver)
+
         if not _robust_click(driver, ok):
             continue
 
@@ -594,8 +651,9 @@ def _open_print_dialog_and_click_ok(driver, wait_cfg: WaitCfg, stop_check=None)
             error_btn = _find_visible(driver, By.XPATH, X_PRINT_ERROR_BTN, 2, wait_cfg.poll)
             if error_btn:
                 logging.info("Обнаружено окно ошибки при экспорте Excel, повторяем процесс")
+                report_error("ошибка печати")
                 _robust_click(driver, error_btn)
-                _safe_sleep(0.5, stop_check)
+                _safe_sleep(backoff_pause(0.5), stop_check)
                 error_detected = True
         except TimeoutException:
             # Окно ошибки не появилось - это хорошо
@@ -719,16 +777,287 @@ def _move_to_outputs(src_path: str, dst_dir: str) -> str:
     return dst_path
 
 
+def _fetch_from_task_manager(driver, wait_cfg: WaitCfg, download_dir: str, excel_out_dir: str,
+                             since_ts: float, stop_check=None) -> Optional[str]:
+    """
+    Excel «Печати списка», который не скачался сам: забираем готовое задание из «Диспетчера задач»
+    вместо повторной печати. Возвращает путь файла в excel_out_dir или None
+    """
+    if stop_check and stop_check():
+        return None
+    collected = CollectedJobs(excel_out_dir)
+    click_ts = _now()
+    try:
+        job = request_print_list_download(driver, _robust_click, since_ts, collected, wait_cfg.medium, stop_check)
+    except Exception as e:
+        logging.warning("Диспетчер задач недоступен: %s", e)
+        job = None
+    finally:
+        _ensure_table_context(driver, wait_cfg, stop_check)
+    if job is None:
+        return None
+    xlsx = _wait_for_new_download(
+        download_dir=download_dir,
+        exts=[".xlsx", ".xls"],
+        since_ts=click_ts,
+        timeout=wait_cfg.long,
+        stop_check=stop_check,
+    )
+    if not xlsx or not os.path.exists(xlsx):
+        logging.warning("Диспетчер задач: файл задания «%s» не скачался", job.text)
+        return None
+    collected.add(job.key)
+    path = _move_to_outputs(xlsx, excel_out_dir)
+    logging.info("Excel списка получен из диспетчера задач: %s", path)
+    return path
+
+
+def prepare_table(driver, wait_cfg: WaitCfg, stop_check=None, filter_spec: Optional[FilterSpec] = None,
+                  setup: bool = True) -> bool:
+    """
+    Подготовка таблицы в текущей вкладке: контекст (iframe), все колонки, фильтры ON, фильтрация по filter_spec.
+    setup=False — колонки и фильтры ON уже настроены в этой сессии, выполняется только фильтрация.
+    Возвращает False при остановке; при сбое шага — RuntimeError
+    """
+    _ensure_table_context(driver, wait_cfg, stop_check)
+    if stop_check and stop_check():
+        return False
+    preflight(driver, ROLE_TABLE)
+    if not setup:
+        # таблица может стоять не на первой странице — полный сброс
+        if not run_filtering(driver, cfg=wait_cfg, stop_check=stop_check, spec=filter_spec, force=True):
+            raise RuntimeError("Фильтрация не выполнена")
+        return True
+
+    for attempt in range(1, 4):
+        if stop_check and stop_check():
+            return False
+        ok = _open_columns_menu_and_check_all(driver, wait_cfg, stop_check)
+        if ok:
+            break
+        _safe_sleep(0.8, stop_check)
+    else:
+        raise RuntimeError("Шаги 1-3 не выполнены после 3 попыток")
+
+    # -----------------
+    # фильтры
+    # -----------------
+    for attempt in range(1, 4):
+        if stop_check and stop_check():
+            return False
+        ok = _ensure_filters_on(driver, wait_cfg, stop_check)
+        if ok:
+            break
+        _safe_sleep(0.8, stop_check)
+    else:
+        raise RuntimeError("Фильтры не удалось привести в состояние ON")
+
+    _safe_sleep(2.5, stop_check)
+
+    # Фильтрация перед печатью списка
+    ok = run_filtering(driver, cfg=wait_cfg, stop_check=stop_check, spec=filter_spec)
+    if not ok:
+        raise RuntimeError("Фильтрация не выполнена")
+    return True
+
+
+def print_list_to_outputs(driver, wait_cfg: WaitCfg, download_dir: str, excel_out_dir: str, stop_check=None) -> Optional[str]:
+    """
+    Excel: текущий шаг — дождаться скачивания; прошлый шаг — открыть диалог и нажать ОК.
+    Если текущий шаг после всех ретраев не выполнен — сначала ищем готовое задание в «Диспетчере задач»,
+    затем повторяем прошлый шаг и снова пробуем текущий.
+    Возвращает путь сохранённого файла в excel_out_dir (None при остановке)
+    """
+    xlsx_path = None
+    first_print_ts = None
+    for outer in range(1, 4):
+        if stop_check and stop_check():
+            return None
+
+        # Пытаемся открыть диалог и нажать OK
+        print_ts = _now()
+        if not _open_print_dialog_and_click_ok(driver, wait_cfg, stop_check):
+            _ensure_filters_on(driver, wait_cfg, stop_check)
+            _safe_sleep(backoff_pause(1.0), stop_check)
+            continue
+        if first_print_ts is None:
+            first_print_ts = print_ts
+
+        # Ожидаем появления файла
+        since_ts = _now()
+        xlsx_path = _wait_for_new_download(
+            download_dir=download_dir,
+            exts=[".xlsx", ".xls"],
+            since_ts=since_ts,
+            timeout=wait_cfg.long,
+            stop_check=stop_check,
+        )
+
+        if xlsx_path and os.path.exists(xlsx_path):
+            break
+
+        # Отчёт мог сформироваться на сервере без скачивания — забираем его, а не печатаем заново
+        saved = _fetch_from_task_manager(driver, wait_cfg, download_dir, excel_out_dir, first_print_ts, stop_check)
+        if saved:
+            return saved
+
+        # Если файл не появился, пробуем еще раз
+        _safe_sleep(backoff_pause(1.0), stop_check)
+
+    if not xlsx_path or not os.path.exists(xlsx_path):
+        raise RuntimeError("Не удалось дождаться скачивания Excel")
+
+    return _move_to_outputs(xlsx_path, excel_out_dir)
+
+
+class PrintListJob:
+    """
+    Фоновое получение Excel «Печати списка»: задание уже запущено на сервере (диалог, ОК),
+    файл ждёт отдельный поток (только папка загрузок, без браузера), пока идёт экспорт TXT.
+    Пришедший файл сразу переносится в excel_out_dir.
+    """
+
+    def __init__(self, download_dir: str, excel_out_dir: str, since_ts: float,
+                 stop_check: Optional[Callable[[], bool]] = None):
+        self.download_dir = download_dir
+        self.excel_out_dir = excel_out_dir
+        self.since_ts = since_ts
+        self.path: Optional[str] = None
+        self._user_stop = stop_check
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="print-list", daemon=True)
+        self._thread.start()
+
+    def _stopped(self) -> bool:
+        return self._stop.is_set() or bool(self._user_stop and self._user_stop())
+
+    def _run(self):
+        while not self._stopped():
+            xlsx = _wait_for_new_download(
+                download_dir=self.download_dir,
+                exts=[".xlsx", ".xls"],
+                since_ts=self.since_ts,
+                timeout=5,
+                stop_check=self._stopped,
+            )
+            if xlsx and os.path.exists(xlsx):
+                try:
+                    self.path = _move_to_outputs(xlsx, self.excel_out_dir)
+                    logging.info("Excel списка сохранён: %s (через %.0f с после запуска)",
+                                 self.path, _now() - self.since_ts)
+                except Exception as e:
+                    logging.warning("Не удалось сохранить Excel списка: %s", e)
+                return
+
+    def ready(self) -> Optional[str]:
+        """Путь сохранённого Excel, если уже пришёл (не ждёт)"""
+        return self.path
+
+    def wait(self, timeout: float) -> Optional[str]:
+        """Ждёт файл не дольше timeout, поток не останавливает (файл может прийти и позже)"""
+        deadline = _now() + timeout
+        while self.path is None and self._thread.is_alive() and _now() < deadline and not self._stopped():
+            self._thread.join(0.5)
+        return self.path
+
+    def finish(self, timeout: float) -> Optional[str]:
+        """Ждёт файл не дольше timeout и останавливает поток"""
+        self._thread.join(timeout)
+        self._stop.set()
+        self._thread.join()
+        return self.path
+
+
+def _print_list_wait() -> float:
+    try:
+        return max(0.0, float(os.environ.get(PRINT_LIST_WAIT_ENV, "").strip() or DEFAULT_PRINT_LIST_WAIT))
+    except ValueError:
+        return float(DEFAULT_PRINT_LIST_WAIT)
+
+
+def start_print_list(driver, wait_cfg: WaitCfg, download_dir: str, excel_out_dir: str,
+                     stop_check=None) -> Optional[PrintListJob]:
+    """Запускает «Печать списка» (до 3 попыток диалога) и возвращает фоновое ожидание Excel"""
+    for outer in range(1, 4):
+        if stop_check and stop_check():
+            return None
+        since_ts = _now()
+        if _open_print_dialog_and_click_ok(driver, wait_cfg, stop_check):
+            return PrintListJob(download_dir, excel_out_dir, since_ts, stop_check)
+        _ensure_filters_on(driver, wait_cfg, stop_check)
+        _safe_sleep(backoff_pause(1.0), stop_check)
+    logging.warning("Печать списка не запущена после 3 попыток, экспорт TXT продолжается без Excel")
+    return None
+
+
+def _plan_from_list(
+    list_path: str, txt_out_dir: str, start_index: int, end_index: Optional[int], skip_done: bool,
+) -> Tuple[int, Optional[ManifestPlan]]:
+    """
+    Манифест из сохранённого списка (xlsx/csv) и план выгрузки до первого клика по строке
+    Возвращает (число записей, план); при ошибке чтения списка — (0, None)
+    """
+    try:
+        info = build_manifest(list_path, os.path.join(txt_out_dir, MANIFEST_FILENAME))
+        done = set()
+        if skip_done:
+            done = load_done_guids(txt_out_dir, os.path.join(txt_out_dir, GUIDS_EXCEL_FILENAME))
+        m = Manifest(info.path)
+        try:
+            plan = m.plan(done, start_index, end_index, per_min=recent_rate(txt_out_dir))
+        finally:
+            m.close()
+    except Exception as e:
+        logging.warning("Манифест по списку %s не построен: %s", list_path, e)
+        return 0, None
+    logging.info("План выгрузки: %s", plan.describe())
+    return info.total, plan
+
+
 def process_table_and_export(
     driver,
     download_dir: Optional[str] = None,
     stop_check: Optional[Callable[[], bool]] = None,
     do_click: Optional[Callable] = None,
     start_index: int = 1,
+    export_mode: str = "sequential",
+    end_index: Optional[int] = None,
+    txt_out_dir: Optional[str] = None,
+    print_list: bool = True,
+    work_queue_url: Optional[str] = None,
+    delta: bool = False,
+    changes: bool = False,
+    scrape_list: bool = False,
+    filter_spec: Optional[FilterSpec] = None,
+    excel_out_dir: Optional[str] = None,
+    setup: bool = True,
 ):
-    
+    """
+    export_mode: "sequential" — экспорт TXT по строкам (с окном EB_TXT_WINDOW),
+    "fire_collect" — сначала клики по всем записям, затем сбор скачанных ZIP,
+    "requeue" — только записи из TXT Outputs/_requeue.json (например, после python reconcile.py)
+    end_index — последняя запись диапазона; txt_out_dir — своя папка TXT (рабочий процесс флота);
+    print_list=False — без печати списка в Excel
+    work_queue_url — диапазоны записей берутся из общей очереди (sqlite:///путь), start_index не используется
+    delta=True — выгружаются только записи, GUID которых ещё нет в папке TXT и журнале
+    changes=True — дополнительно перевыгружаются записи, видимые ячейки которых изменились с прошлого запуска
+    scrape_list=True — вместо «Печати списка» ячейки таблицы пишутся в CSV/SQLite в «Excel outputs»
+    (при последовательном экспорте с первой записи до конца — попутно, из тех же снимков страниц)
+    filter_spec — статус и «Период по» (по умолчанию FilterSpec()); excel_out_dir — своя папка Excel;
+    setup=False — колонки и фильтры ON уже настроены (следующий профиль в той же сессии)
+    «Печать списка» запускается до экспорта TXT; Excel ждётся не дольше EB_PRINT_LIST_WAIT, чтобы манифест
+    был готов до первого клика, затем принимается в фоне; если он так и не скачался — забирается готовое
+    задание из «Диспетчера задач».
+    Список, полученный до экспорта (xlsx или csv), читается в манифест TXT Outputs/_manifest.sqlite:
+    точное число записей, уже выгруженные и оценка времени; при последовательном экспорте манифест —
+    рабочий список: строки вне него пропускаются, не встреченные записи списка уходят на повтор
+    """
     wait_cfg = WaitCfg()
     download_dir = download_dir or BROWSER_DOWNLOADS_DIR
+    scrape = None
+    list_path = None
+    print_job = None
+    manifest = None
 
     try:
         original_implicit = driver.timeouts.implicit_wait
@@ -745,94 +1074,126 @@ def process_table_and_export(
             pass
 
         project_root = os.path.dirname(os.path.abspath(__file__))
-        excel_out_dir = _make_outputs_dir(project_root, "Excel outputs")
-        txt_out_dir = _make_outputs_dir(project_root, "TXT Outputs")
+        if excel_out_dir:
+            os.makedirs(excel_out_dir, exist_ok=True)
+        else:
+            excel_out_dir = _make_outputs_dir(project_root, "Excel outputs")
+        if txt_out_dir:
+            os.makedirs(txt_out_dir, exist_ok=True)
+        else:
+            txt_out_dir = _make_outputs_dir(project_root, "TXT Outputs")
 
-        _ensure_table_context(driver, wait_cfg, stop_check)
-        if stop_check and stop_check():
+        if not prepare_table(driver, wait_cfg, stop_check, filter_spec, setup):
             return
 
-        for attempt in range(1, 4):
-            if stop_check and stop_check():
-                return
-            ok = _open_columns_menu_and_check_all(driver, wait_cfg, stop_check)
-            if ok:
-                break
-            _safe_sleep(0.8, stop_check)
-        else:
-            raise RuntimeError("Шаги 1-3 не выполнены после 3 попыток")
+        def rewind():
+            # к первой странице: полный сброс и установка фильтров
+            run_filtering(driver, cfg=wait_cfg, stop_check=stop_check, spec=filter_spec, force=True)
 
-        # -----------------
-        # фильтры
-        # -----------------
-        for attempt in range(1, 4):
-            if stop_check and stop_check():
-                return
-            ok = _ensure_filters_on(driver, wait_cfg, stop_check)
-            if ok:
-                break
-            _safe_sleep(0.8, stop_check)
-        else:
-            raise RuntimeError("Фильтры не удалось привести в состояние ON")
+        if export_mode == "requeue":
+            n = export_requeued(
+                driver, download_dir, txt_out_dir, wait_cfg, stop_check, ledger_by_guid=delta or changes,
+                rewind=rewind,
+            )
+            print(f"Повторная выгрузка: скачано {n} записей.")
+            return
 
-        _safe_sleep(2.5, stop_check)
+        if scrape_list:
+            scrape = ListScrapeWriter(list_output_path(excel_out_dir), read_grid_header(driver, wait_cfg))
+            if work_queue_url or export_mode == "fire_collect" or start_index > 1 or end_index:
+                # эти режимы обходят строки иначе, а продолжение и диапазон прошли бы не все страницы:
+                # сначала отдельный проход всего списка, затем к первой странице
+                scrape_grid_list(driver, scrape, wait_cfg, stop_check)
+                scrape.close()
+                if not scrape.is_sqlite:
+                    list_path = scrape.path
+                scrape = None
+                if not (stop_check and stop_check()):
+                    rewind()
+        elif print_list:
+            print_job = start_print_list(driver, wait_cfg, download_dir, excel_out_dir, stop_check)
+        if stop_check and stop_check():
+            return
 
-        # Фильтрация перед печатью списка
-        ok = run_filtering(driver, cfg=wait_cfg, stop_check=stop_check)
-        if not ok:
-            raise RuntimeError("Фильтрация не выполнена")
+        manifest_total, plan = 0, None
+        if print_job is not None:
+            # экспорт TXT не ждёт Excel (если EB_PRINT_LIST_WAIT не задан): план — только по уже пришедшему
+            wait_s = _print_list_wait()
+            t0 = _now()
+            list_path = print_job.wait(wait_s) if wait_s > 0 else print_job.ready()
+            if list_path:
+                logging.info("Excel списка получен до экспорта TXT (ожидание %.0f с)", _now() - t0)
+            else:
+                logging.info(
+                    "Excel списка ещё не пришёл — экспорт TXT без плана, манифест и сверка после выгрузки"
+                )
+        if list_path:
+            manifest_total, plan = _plan_from_list(
+                list_path, txt_out_dir, start_index, end_index, skip_done=delta or changes,
+            )
+            if plan is not None:
+                # рабочий список выгрузки: какие строки выгружать, какие пропускать
+                manifest = Manifest(os.path.join(txt_out_dir, MANIFEST_FILENAME))
 
         # -----------------
-        # Excel: текущий шаг — дождаться скачивания; прошлый шаг — открыть диалог и нажать ОК.
-        # Если текущий шаг после всех ретраев не выполнен — повторяем прошлый шаг и снова пробуем текущий.
+        # TXT - экспорт всех строк всех страниц
         # -----------------
-        xlsx_path = None
-        for outer in range(1, 4):
-            if stop_check and stop_check():
-                return
-                
-            # Пытаемся открыть диалог и нажать OK
-            if not _open_print_dialog_and_click_ok(driver, wait_cfg, stop_check):
-                _ensure_filters_on(driver, wait_cfg, stop_check)
-                _safe_sleep(1.0, stop_check)
-                continue
-                
-            # Ожидаем появления файла
-            since_ts = _now()
-            xlsx_path = _wait_for_new_download(
+        if work_queue_url:
+            export_from_queue(
+                driver,
+                open_work_queue(work_queue_url),
                 download_dir=download_dir,
-                exts=[".xlsx", ".xls"],
-                since_ts=since_ts,
-                timeout=wait_cfg.long,
+                txt_out_dir=txt_out_dir,
+                cfg=wait_cfg,
                 stop_check=stop_check,
+                rewind=rewind,
             )
-            
-            if xlsx_path and os.path.exists(xlsx_path):
-                break
-                
-            # Если файл не появился, пробуем еще раз
-            _safe_sleep(1.0, stop_check)
-
-        if not xlsx_path or not os.path.exists(xlsx_path):
-            raise RuntimeError("Не удалось дождаться скачивания Excel")
-
-        saved_excel = _move_to_outputs(xlsx_path, excel_out_dir)
+            return
 
-        # -----------------
-        # TXT - экспорт всех строк всех страниц
-        # -----------------
-        export_all_rows_to_txt(
-            driver,
+        export_kwargs = dict(
             download_dir=download_dir,
             txt_out_dir=txt_out_dir,
             cfg=wait_cfg,
             stop_check=stop_check,
             start_index=start_index,
+            end_index=end_index,
+            delta=delta,
+            changes=changes,
+            rewind=rewind,
         )
+        if export_mode == "fire_collect":
+            export_fire_then_collect(driver, **export_kwargs)
+        else:
+            export_all_rows_to_txt(
+                driver, scrape=scrape, plan=plan, manifest_total=manifest_total, manifest=manifest, **export_kwargs
+            )
+
+        if print_job is not None and not list_path:
+            since_ts = print_job.since_ts
+            list_path = print_job.finish(wait_cfg.long)
+            print_job = None
+            if not list_path:
+                list_path = _fetch_from_task_manager(
+                    driver, wait_cfg, download_dir, excel_out_dir, since_ts, stop_check
+                )
+            if list_path:
+                _plan_from_list(list_path, txt_out_dir, start_index, end_index, skip_done=delta or changes)
+            else:
+                logging.warning("Excel «Печати списка» не получен; TXT выгружены без него")
+
+        if list_path and end_index is None and not (stop_check and stop_check()):
+            # итог по списку, журналу и файлам вместо арифметики пагинации; _requeue.json не трогаем
+            reconcile(txt_out_dir, write_requeue=False)
 
         _safe_sleep(5.0, stop_check)
 
     finally:
+        if scrape is not None:
+            scrape.close()
+        if manifest is not None:
+            manifest.close()
+        if print_job is not None:
+            print_job.finish(0)
         try:
             if original_implicit is not None:
                 driver.implicitly_wait(int(original_implicit))
@@ -840,3 +1201,52 @@ def process_table_and_export(
                 driver.implicitly_wait(5)
         except Exception:
             pass
+
+
+def process_profile_sweep(
+    driver,
+    profiles: List[FilterProfile],
+    download_dir: Optional[str] = None,
+    stop_check: Optional[Callable[[], bool]] = None,
+    do_click: Optional[Callable] = None,
+    **export_kwargs,
+) -> None:
+    """
+    Профили фильтров подряд в одной сессии: каждый — в TXT Outputs/<имя> и Excel outputs/<имя>,
+    с продолжения своего прогресса. Колонки и фильтры ON настраиваются один раз, дальше — только фильтрация.
+    Сбой профиля пишется в лог и не прерывает следующие
+    """
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    txt_root = _make_outputs_dir(project_root, "TXT Outputs")
+    excel_root = _make_outputs_dir(project_root, "Excel outputs")
+    setup = True
+    for n, profile in enumerate(profiles, 1):
+        if stop_check and stop_check():
+            return
+        txt_out_dir = os.path.join(txt_root, profile.name)
+        os.makedirs(txt_out_dir, exist_ok=True)
+        start_index = load_progress(txt_out_dir) + 1
+        logging.info(
+            "Профиль %d/%d «%s»: статус «%s», период по %s, с записи %d",
+            n, len(profiles), profile.name, profile.spec.status, profile.spec.period_to, start_index,
+        )
+        t0 = _now()
+        try:
+            process_table_and_export(
+                driver,
+                download_dir=download_dir,
+                stop_check=stop_check,
+                do_click=do_click,
+                start_index=start_index,
+                txt_out_dir=txt_out_dir,
+                excel_out_dir=os.path.join(excel_root, profile.name),
+                filter_spec=profile.spec,
+                setup=setup,
+                **export_kwargs,
+            )
+            setup = False
+            logging.info("Профиль «%s» завершён за %.0f с", profile.name, _now() - t0)
+        except Exception:
+            logging.exception("Профиль «%s» не выгружен", profile.name)
+            # после сбоя состояние таблицы неизвестно — следующий профиль настраивает её заново
+            setup = True
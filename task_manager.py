@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Получение результата «Печати списка» из «Диспетчера задач».
+Если Excel не скачался сам, готовый отчёт остаётся на сервере: открываем диспетчер,
+находим завершённое задание «Печать списка» этого запуска и нажимаем скачивание.
+Уже забранные задания запоминаются в Excel outputs/_collected_jobs.json.
+"""
+import os
+import re
+import json
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+
+logger = logging.getLogger(__name__)
+
+COLLECTED_JOBS_FILENAME = "_collected_jobs.json"
+
+# открыть диспетчер: ссылка из уведомления о печати, затем элементы интерфейса по тексту
+X_TASK_MANAGER_OPEN = [
+    "//div[contains(@class,'gritter-item')]//a[contains(normalize-space(.),'Диспетчер')]",
+    "//a[contains(normalize-space(.),'Диспетчер задач')]",
+    "//button[contains(normalize-space(.),'Диспетчер задач')]",
+    "//*[@title='Диспетчер задач']",
+    "//span[contains(normalize-space(.),'Диспетчер задач')]",
+]
+
+# строки заданий в окне диспетчера
+X_TASK_ROWS = (
+    "//div[contains(@class,'z-window')]//tr[contains(@class,'z-listitem') or contains(@class,'z-row')]"
+    "[contains(normalize-space(.),'Печать списка')]"
+)
+
+# элемент скачивания внутри строки задания (относительно строки)
+REL_TASK_DOWNLOAD = [
+    ".//a[contains(normalize-space(.),'Скачать') or contains(@title,'Скачать')]",
+    ".//button[contains(normalize-space(.),'Скачать') or contains(@title,'Скачать')]",
+    ".//*[contains(@title,'Скачать') or contains(@title,'Загрузить')]",
+    ".//a[contains(@href,'download') or contains(@href,'.xls')]",
+]
+
+# закрыть окно диспетчера
+X_TASK_MANAGER_CLOSE = [
+    "//div[contains(@class,'z-window')][.//tr[contains(normalize-space(.),'Печать списка')]]"
+    "//div[contains(@class,'z-window-close')]",
+    "//div[contains(@class,'z-window')]//button[contains(normalize-space(.),'Закрыть')]",
+]
+
+# только завершённые формы целиком: «выполняется», «завершается» — задание ещё идёт
+_DONE_RE = re.compile(r"\b(?:выполнен[оа]?|завершен[оа]?|успешно|готов[оа]?)\b")
+_RUNNING_WORDS = ("выполняется", "завершается", "в процессе", "в очереди", "ожидает")
+_FAIL_WORDS = ("ошибк", "отмен", "прерван")
+_DT_RE = re.compile(r"(\d{2})\.(\d{2})\.(\d{4})\s+(\d{1,2}):(\d{2})(?::(\d{2}))?")
+
+
+@dataclass
+class TaskJob:
+    key: str  # текст строки (имя, даты) — ключ кэша забранных заданий
+    text: str
+    started: Optional[float]  # время создания из строки (epoch), если распознано
+    finished: bool
+    row_index: int  # номер строки среди найденных (0-based)
+
+
+def _parse_ts(text: str) -> Optional[float]:
+    m = _DT_RE.search(text)
+    if not m:
+        return None
+    d, mo, y, h, mi, s = m.groups()
+    try:
+        return datetime(int(y), int(mo), int(d), int(h), int(mi), int(s or 0)).timestamp()
+    except ValueError:
+        return None
+
+
+def _job_from_text(text: str, row_index: int) -> TaskJob:
+    text = " ".join(text.split())
+    low = text.lower()
+    finished = (
+        bool(_DONE_RE.search(low))
+        and not any(w in low for w in _RUNNING_WORDS)
+        and not any(w in low for w in _FAIL_WORDS)
+    )
+    # проценты/длительность меняются, пока задание выполняется; в ключ — только даты и имя
+    dates = " ".join(m.group(0) for m in _DT_RE.finditer(text))
+    return TaskJob(key=f"Печать списка {dates}" if dates else text, text=text,
+                   started=_parse_ts(text), finished=finished, row_index=row_index)
+
+
+class CollectedJobs:
+    """Кэш забранных заданий (ключи TaskJob.key)."""
+
+    def __init__(self, excel_out_dir: str):
+        self.path = os.path.join(excel_out_dir, COLLECTED_JOBS_FILENAME)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.keys = set(json.load(f).get("collected", []))
+        except Exception:
+            self.keys = set()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def add(self, key: str) -> None:
+        self.keys.add(key)
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"collected": sorted(self.keys)}, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.warning("Не удалось сохранить %s: %s", self.path, e)
+
+
+def _first_visible(driver, xpaths: List[str], root=None):
+    for xp in xpaths:
+        try:
+            for el in (root or driver).find_elements(By.XPATH, xp):
+                if el.is_displayed():
+                    return el
+        except Exception:
+            continue
+    return None
+
+
+def _contexts(driver):
+    """Текущий контекст, затем основной документ и его iframe (переключение — при переборе)"""
+    yield "current"
+    try:
+        driver.switch_to.default_content()
+    except Exception:
+        return
+    yield "default"
+    try:
+        frames = driver.find_elements(By.TAG_NAME, "iframe")
+    except Exception:
+        frames = []
+    for i in range(len(frames)):
+        try:
+            driver.switch_to.default_content()
+            driver.switch_to.frame(driver.find_elements(By.TAG_NAME, "iframe")[i])
+        except Exception:
+            continue
+        yield f"iframe[{i}]"
+
+
+def open_task_manager(driver, click: Callable, timeout: float, stop_check=None) -> bool:
+    """Открывает «Диспетчер задач» и ждёт строки заданий печати (контекст остаётся тем, где окно открылось)"""
+    for ctx in _contexts(driver):
+        if stop_check and stop_check():
+            return False
+        el = _first_visible(driver, X_TASK_MANAGER_OPEN)
+        if el is None or not click(driver, el):
+            continue
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if stop_check and stop_check():
+                return False
+            if driver.find_elements(By.XPATH, X_TASK_ROWS):
+                logger.info("Диспетчер задач открыт (%s)", ctx)
+                return True
+            time.sleep(0.3)
+    return False
+
+
+def list_print_jobs(driver) -> List[TaskJob]:
+    jobs = []
+    try:
+        rows = driver.find_elements(By.XPATH, X_TASK_ROWS)
+    except Exception:
+        return jobs
+    for i, tr in enumerate(rows):
+        try:
+            jobs.append(_job_from_text(tr.text or tr.get_attribute("textContent") or "", i))
+        except Exception:
+            continue
+    return jobs
+
+
+def close_task_manager(driver, click: Callable) -> None:
+    el = _first_visible(driver, X_TASK_MANAGER_CLOSE)
+    if el is not None and click(driver, el):
+        return
+    try:
+        driver.find_element(By.TAG_NAME, "body").send_keys(Keys.ESCAPE)
+    except Exception:
+        pass
+
+
+def request_print_list_download(
+    driver,
+    click: Callable,
+    since_ts: float,
+    collected: CollectedJobs,
+    timeout: float,
+    stop_check=None,
+) -> Optional[TaskJob]:
+    """
+    Открывает диспетчер, выбирает самое свежее завершённое и ещё не забранное задание «Печать списка»,
+    созданное не раньше since_ts (если время распознано), и нажимает скачивание. Окно закрывается.
+    Возвращает задание, по которому нажато скачивание, или None
+    """
+    if not open_task_manager(driver, click, timeout, stop_check):
+        logger.warning("Диспетчер задач не открыт")
+        return None
+    try:
+        jobs = [j for j in list_print_jobs(driver) if j.finished and j.key not in collected]
+        # допуск на расхождение часов сервера и машины
+        jobs = [j for j in jobs if j.started is None or j.started >= since_ts - 120]
+        if not jobs:
+            logger.info("Диспетчер задач: готовых заданий «Печать списка» этого запуска нет")
+            return None
+        jobs.sort(key=lambda j: (j.started or 0, -j.row_index), reverse=True)
+        job = jobs[0]
+        tr = driver.find_elements(By.XPATH, X_TASK_ROWS)[job.row_index]
+        btn = _first_visible(driver, REL_TASK_DOWNLOAD, root=tr)
+        if btn is None or not click(driver, btn):
+            logger.warning("Диспетчер задач: не найдено скачивание для «%s»", job.text)
+            return None
+        logger.info("Диспетчер задач: скачивание «%s»", job.text)
+        return job
+    finally:
+        close_task_manager(driver, click)
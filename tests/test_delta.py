@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from delta import FINGERPRINT_COLUMNS_ENV, FingerprintStore  # noqa: E402
+
+
+GUID = "aaaaaaaa-0000-0000-0000-000000000001"
+HEADER = ["", "Номер", "Статус документа", "Дата", "Сумма", "Комментарий"]
+
+
+@pytest.fixture(autouse=True)
+def _default_columns(monkeypatch):
+    monkeypatch.delenv(FINGERPRINT_COLUMNS_ENV, raising=False)
+
+
+def _row(status="Согласовано", date="01.02.2026", amount="100,00", comment=""):
+    return ["", "1", status, date, amount, comment]
+
+
+def _first_run(tmp_path, cells, header=HEADER):
+    store = FingerprintStore(str(tmp_path), set(), header)
+    assert store.classify(GUID, store.fingerprint(cells)) == "new"
+    store.confirm(GUID)
+    store.save()
+
+
+def test_unchanged_row_is_skipped(tmp_path):
+    _first_run(tmp_path, _row())
+    store = FingerprintStore(str(tmp_path), {GUID}, HEADER)
+    # столбцы вне набора отпечатка не влияют
+    assert store.classify(GUID, store.fingerprint(_row(comment="новый комментарий"))) == "unchanged"
+    assert not store.is_replacing(GUID)
+
+
+def test_changed_row_is_exported_again(tmp_path):
+    _first_run(tmp_path, _row())
+    store = FingerprintStore(str(tmp_path), {GUID}, HEADER)
+    changed = store.fingerprint(_row(status="Отклонено"))
+    assert store.classify(GUID, changed) == "changed"
+    assert store.is_replacing(GUID)
+    store.confirm(GUID)
+    store.save()
+
+    again = FingerprintStore(str(tmp_path), {GUID}, HEADER)
+    assert again.classify(GUID, again.fingerprint(_row(status="Отклонено"))) == "unchanged"
+
+
+def test_store_resets_when_fingerprint_columns_change(tmp_path, monkeypatch):
+    _first_run(tmp_path, _row())
+    monkeypatch.setenv(FINGERPRINT_COLUMNS_ENV, "Статус документа,Комментарий")
+    store = FingerprintStore(str(tmp_path), {GUID}, HEADER)
+    # прошлые отпечатки сброшены: запись не перевыгружается, текущий отпечаток — новая база
+    assert store.classify(GUID, store.fingerprint(_row(status="Отклонено"))) == "unchanged"
+    store.save()
+
+    again = FingerprintStore(str(tmp_path), {GUID}, HEADER)
+    assert again.column_names == ["Статус документа", "Комментарий"]
+    assert again.classify(GUID, again.fingerprint(_row(status="Отклонено"))) == "unchanged"
+
+
+def test_store_resets_when_header_columns_change(tmp_path):
+    _first_run(tmp_path, _row())
+    header = ["", "Номер", "Статус документа", "Дата", "Сумма, руб.", "Комментарий"]
+    store = FingerprintStore(str(tmp_path), {GUID}, header)
+    assert store.column_names == ["Статус документа", "Дата", "Сумма, руб."]
+    assert store.classify(GUID, store.fingerprint(_row(status="Отклонено"))) == "unchanged"
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import export_window  # noqa: E402
+from export_window import ExportWindow  # noqa: E402
+
+
+GUID_A = "aaaaaaaa-0000-0000-0000-000000000001"
+GUID_B = "bbbbbbbb-0000-0000-0000-000000000002"
+GUID_C = "cccccccc-0000-0000-0000-000000000003"
+
+
+@pytest.fixture(autouse=True)
+def _instant_stable(monkeypatch):
+    # размер файла считается устоявшимся со второго прохода
+    monkeypatch.setattr(export_window, "STABLE_SECONDS", 0)
+    export_window._late.clear()
+    yield
+    export_window._late.clear()
+
+
+def _zip(dir_path, name, text="", member="doc.txt"):
+    path = os.path.join(str(dir_path), name)
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr(member, text)
+    return path
+
+
+def _poll(window):
+    window.poll()
+    return window.poll()
+
+
+def _window(dir_path, *guids):
+    w = ExportWindow(str(dir_path), 8)
+    for i, g in enumerate(guids, start=1):
+        w.add(g, i, click_ts=time.time() - 10 + i)
+    return w
+
+
+def test_out_of_order_downloads_are_matched_by_guid(tmp_path):
+    w = _window(tmp_path, GUID_A, GUID_B)
+    _zip(tmp_path, f"export_{GUID_B}.zip")
+    done = _poll(w)
+    assert [(c.pending.guid, c.matched_by) for c in done] == [(GUID_B, "filename")]
+
+    _zip(tmp_path, "export.zip", text=f"Документ {GUID_A}")
+    done = _poll(w)
+    assert [(c.pending.guid, c.matched_by) for c in done] == [(GUID_A, "content")]
+    assert not w.pending
+
+
+def test_unidentified_zip_is_not_matched_by_order_with_several_pending(tmp_path):
+    w = _window(tmp_path, GUID_A, GUID_B)
+    path = _zip(tmp_path, "export.zip", text="без идентификатора")
+    assert _poll(w) == []
+    assert w.unmatched == [path]
+    assert [p.guid for p in w.pending] == [GUID_A, GUID_B]
+    # тот же файл не разбирается повторно
+    assert w.poll() == []
+    assert w.stats.unmatched == 1
+
+
+def test_unidentified_zip_is_matched_by_order_with_single_pending(tmp_path):
+    w = _window(tmp_path, GUID_A)
+    _zip(tmp_path, "export.zip", text="без идентификатора")
+    done = _poll(w)
+    assert [(c.pending.guid, c.matched_by) for c in done] == [(GUID_A, "order")]
+
+
+def test_missing_download_expires_and_late_zip_is_not_claimed(tmp_path):
+    w = _window(tmp_path, GUID_A, GUID_B)
+    _zip(tmp_path, f"{GUID_B}.zip")
+    assert [c.pending.guid for c in _poll(w)] == [GUID_B]
+
+    expired = w.expire(timeout=0)
+    assert [p.guid for p in expired] == [GUID_A]
+    assert export_window.late_guids(str(tmp_path)) == {GUID_A}
+
+    # поздний ZIP записи A не достаётся единственной ожидающей записи C
+    w.add(GUID_C, 3)
+    late = _zip(tmp_path, "late.zip", text=f"Документ {GUID_A}")
+    assert _poll(w) == []
+    assert late in w.unmatched
+    assert [p.guid for p in w.pending] == [GUID_C]
+
+    # пока A может прийти, безымянный ZIP не сопоставляется по порядку
+    _zip(tmp_path, "export.zip", text="без идентификатора")
+    assert _poll(w) == []
+    assert [p.guid for p in w.pending] == [GUID_C]
+
+
+def test_retried_export_clears_late_guid(tmp_path):
+    w = _window(tmp_path, GUID_A)
+    w.expire(timeout=0)
+    assert export_window.late_guids(str(tmp_path)) == {GUID_A}
+
+    w.add(GUID_A, 1)
+    _zip(tmp_path, "export.zip", text=f"Документ {GUID_A}")
+    assert [c.pending.guid for c in _poll(w)] == [GUID_A]
+    assert export_window.late_guids(str(tmp_path)) == set()
+
+
+def test_collect_mode_never_matches_by_order(tmp_path):
+    w = ExportWindow(str(tmp_path), 8, by_order=False)
+    w.add(GUID_A, 1, click_ts=time.time() - 10)
+    path = _zip(tmp_path, "export.zip", text="без идентификатора")
+    assert _poll(w) == []
+    assert w.unmatched == [path]
+    assert [p.guid for p in w.pending] == [GUID_A]
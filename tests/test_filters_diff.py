@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filtering import FilterSpec, _chip_kind, _filters_diff  # noqa: E402
+
+
+SPEC = FilterSpec(status="Согласовано получателем", period_to="31.12.2025")
+STATUS = "Статус документа: Согласовано получателем"
+PERIOD = "Период по: 31.12.2025"
+
+
+@pytest.mark.parametrize("chip, kind", [
+    (STATUS, "status"),
+    ("согласовано получателем", "status"),
+    (PERIOD, "period"),
+    ("Период\n по: 31.12.2025", "period"),
+    ("Период с: 31.12.2025", None),
+    ("Статус документа: Черновик", None),
+])
+def test_chip_kind(chip, kind):
+    assert _chip_kind(chip, SPEC) == kind
+
+
+def test_equal_filters_are_a_no_op():
+    assert _filters_diff([STATUS, PERIOD], SPEC) == ([], False, False)
+    assert _filters_diff([PERIOD, STATUS], SPEC) == ([], False, False)
+
+
+def test_extra_chip_is_removed():
+    chips = [STATUS, "Контрагент: ООО Ромашка", PERIOD]
+    assert _filters_diff(chips, SPEC) == ([1], False, False)
+
+
+def test_duplicate_chip_is_removed():
+    assert _filters_diff([STATUS, STATUS, PERIOD], SPEC) == ([1], False, False)
+
+
+def test_missing_value_is_set():
+    assert _filters_diff([STATUS], SPEC) == ([], False, True)
+    assert _filters_diff([], SPEC) == ([], True, True)
+
+
+def test_changed_date_is_replaced():
+    chips = [STATUS, "Период по: 31.12.2024"]
+    assert _filters_diff(chips, SPEC) == ([1], False, True)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fleet import split_ranges  # noqa: E402
+
+
+def test_remainder_goes_to_first_ranges():
+    assert split_ranges(1, 10, 3) == [(1, 4), (5, 7), (8, 10)]
+    assert split_ranges(1, 9, 3) == [(1, 3), (4, 6), (7, 9)]
+
+
+def test_more_workers_than_records():
+    assert split_ranges(1, 2, 5) == [(1, 1), (2, 2)]
+    assert split_ranges(5, 5, 3) == [(5, 5)]
+
+
+def test_empty_range():
+    assert split_ranges(10, 9, 3) == []
+
+
+@pytest.mark.parametrize("start, total, n", [(1, 1000, 7), (101, 1000, 4), (1, 13, 13), (50, 60, 1)])
+def test_ranges_are_contiguous_and_cover_everything(start, total, n):
+    ranges = split_ranges(start, total, n)
+    assert len(ranges) == min(n, total - start + 1)
+    assert ranges[0][0] == start and ranges[-1][1] == total
+    for (_, b), (a, _) in zip(ranges, ranges[1:]):
+        assert a == b + 1
+    sizes = [b - a + 1 for a, b in ranges]
+    assert min(sizes) >= 1 and max(sizes) - min(sizes) <= 1
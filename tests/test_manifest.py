@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+openpyxl = pytest.importorskip("openpyxl")
+
+from manifest import GUID_COLUMN_ENV, KEY_COLUMNS_ENV, Manifest, _detect_layout, build_manifest  # noqa: E402
+
+
+GUIDS = [
+    "{AAAAAAAA-0000-0000-0000-000000000001}",
+    "aaaaaaaa-0000-0000-0000-000000000002",
+    "AAAAAAAA-0000-0000-0000-000000000003",
+    "{aaaaaaaa-0000-0000-0000-000000000001}",  # та же запись, что и первая
+]
+
+
+@pytest.fixture(autouse=True)
+def _default_env(monkeypatch):
+    monkeypatch.delenv(GUID_COLUMN_ENV, raising=False)
+    monkeypatch.delenv(KEY_COLUMNS_ENV, raising=False)
+
+
+def _rows():
+    # как в «Печати списка»: заголовок отчёта, пустая строка, шапка таблицы, данные
+    rows = [["Список документов"], [], ["Номер", "Статус", "Идентификатор"]]
+    for i, guid in enumerate(GUIDS, 1):
+        rows.append([str(i), "Согласовано", guid])
+    return rows
+
+
+def _xlsx(tmp_path):
+    wb = openpyxl.Workbook()
+    for row in _rows():
+        wb.active.append(row)
+    path = str(tmp_path / "список.xlsx")
+    wb.save(path)
+    return path
+
+
+def test_detect_layout_finds_guid_column_and_header():
+    assert _detect_layout(_rows()) == (2, 2)
+
+
+def test_detect_layout_uses_guid_column_env(monkeypatch):
+    monkeypatch.setenv(GUID_COLUMN_ENV, "Номер")
+    assert _detect_layout(_rows()) == (2, 0)
+
+
+def test_detect_layout_without_guids_needs_header():
+    with pytest.raises(ValueError):
+        _detect_layout([["Номер", "Статус"], ["1", "Согласовано"]])
+
+
+def test_build_manifest_normalizes_guids(tmp_path):
+    db = str(tmp_path / "_manifest.sqlite")
+    info = build_manifest(_xlsx(tmp_path), db)
+    assert (info.total, info.unique) == (4, 3)
+    assert info.guid_column == "Идентификатор"
+    assert info.columns == ["Номер", "Статус"]
+
+    m = Manifest(db)
+    try:
+        assert m.total == 4
+        assert m.guid_at(1) == "aaaaaaaa-0000-0000-0000-000000000001"
+        assert m.index_of("{AAAAAAAA-0000-0000-0000-000000000003}") == 3
+        plan = m.plan({"aaaaaaaa-0000-0000-0000-000000000002"})
+        assert (plan.total, plan.done, plan.todo) == (4, 1, 3)
+    finally:
+        m.close()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import preflight as pf  # noqa: E402
+
+
+SCREEN = "тест"
+XPATHS = ["//a[1]", "//a[2]", "//a[3]", "//a[4]"]
+
+
+class FakeDriver:
+    def __init__(self, counts):
+        self.counts = counts
+
+    def execute_script(self, script, xpaths):
+        assert len(xpaths) == len(self.counts)
+        return {"counts": self.counts, "ms": 1.0}
+
+
+@pytest.fixture(autouse=True)
+def _registry(monkeypatch):
+    monkeypatch.setattr(pf, "_registry", {})
+    monkeypatch.setattr(pf, "_reports", {})
+    monkeypatch.delenv(pf.STRICT_ENV, raising=False)
+    pf.register_selectors(SCREEN, {"шаг 1": XPATHS, "прочее": ["//b"]}, required=["шаг 1"])
+
+
+def test_resolved_go_first_in_stable_order():
+    pf.preflight(FakeDriver([0, 2, 0, 1, 1]), SCREEN)
+    assert pf.prefer_resolved(SCREEN, "шаг 1", XPATHS) == ["//a[2]", "//a[4]", "//a[1]", "//a[3]"]
+    # порядок вызывающего (например, по selector_stats) сохраняется внутри найденных и ненайденных
+    assert pf.prefer_resolved(SCREEN, "шаг 1", XPATHS[::-1]) == ["//a[4]", "//a[2]", "//a[3]", "//a[1]"]
+
+
+def test_order_unchanged_without_report_group_or_hits():
+    assert pf.prefer_resolved(SCREEN, "шаг 1", XPATHS) == XPATHS
+    pf.preflight(FakeDriver([0, 0, 0, 0, 1]), SCREEN)
+    assert pf.prefer_resolved(SCREEN, "шаг 1", XPATHS) == XPATHS
+    assert pf.prefer_resolved(SCREEN, None, XPATHS) == XPATHS
+    assert pf.prefer_resolved(SCREEN, "нет такой", XPATHS) == XPATHS
+    assert pf.prefer_resolved("другой экран", "шаг 1", XPATHS) == XPATHS
+
+
+def test_invalid_xpath_is_not_resolved():
+    pf.preflight(FakeDriver([-1, 0, 3, 0, 1]), SCREEN)
+    assert pf.prefer_resolved(SCREEN, "шаг 1", XPATHS)[0] == "//a[3]"
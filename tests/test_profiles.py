@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from filtering import FilterSpec  # noqa: E402
+from profiles import load_profiles, select_profiles  # noqa: E402
+
+
+def _write(tmp_path, profiles):
+    path = tmp_path / "filter_profiles.json"
+    path.write_text(json.dumps({"profiles": profiles}, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_example_profiles_load():
+    profiles = load_profiles(os.path.join(ROOT, "filter_profiles.example.json"))
+    assert [p.name for p in profiles] == ["agreed_2025", "agreed_2024"]
+    assert profiles[0].spec == FilterSpec("Согласовано получателем", "31.12.2025")
+    assert profiles[1].spec == FilterSpec("Согласовано получателем", "31.12.2024")
+    assert select_profiles(profiles, ["agreed_2024"]) == [profiles[1]]
+
+
+def test_missing_fields_fall_back_to_defaults(tmp_path):
+    profiles = load_profiles(_write(tmp_path, [{"name": "default"}]))
+    assert profiles[0].spec == FilterSpec()
+
+
+@pytest.mark.parametrize("items", [
+    [{"name": "a/b"}],
+    [{"name": "a"}, {"name": "a"}],
+    [{"name": "a", "period_to": "2025-12-31"}],
+    [],
+])
+def test_invalid_profiles_are_rejected(tmp_path, items):
+    with pytest.raises(ValueError):
+        load_profiles(_write(tmp_path, items))
+
+
+def test_unknown_profile_name_is_rejected():
+    profiles = load_profiles(os.path.join(ROOT, "filter_profiles.example.json"))
+    with pytest.raises(ValueError):
+        select_profiles(profiles, ["agreed_2023"])
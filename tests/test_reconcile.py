@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+openpyxl = pytest.importorskip("openpyxl")
+
+from manifest import GUID_COLUMN_ENV, KEY_COLUMNS_ENV  # noqa: E402
+from reconcile import REPORT_FILENAME, reconcile  # noqa: E402
+from txt_output import GUIDS_EXCEL_FILENAME, REQUEUE_FILENAME, load_requeue  # noqa: E402
+
+
+def _g(n):
+    return f"aaaaaaaa-0000-0000-0000-{n:012d}"
+
+
+@pytest.fixture(autouse=True)
+def _default_env(monkeypatch):
+    monkeypatch.delenv(GUID_COLUMN_ENV, raising=False)
+    monkeypatch.delenv(KEY_COLUMNS_ENV, raising=False)
+
+
+def _setup(tmp_path):
+    txt_dir = tmp_path / "TXT Outputs"
+    txt_dir.mkdir()
+    # список: записи 1..4, запись 2 — в фигурных скобках и верхнем регистре
+    list_path = tmp_path / "список.csv"
+    rows = ["Номер;GUID"] + [f"{i};{g}" for i, g in enumerate([_g(1), "{" + _g(2).upper() + "}", _g(3), _g(4)], 1)]
+    list_path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+    # TXT: 1 — есть, 2 — есть под другим написанием, 3 — дубликат, 4 — нет, 9 — вне списка
+    for name in (_g(1), _g(2), _g(3), _g(3) + "__1", _g(9)):
+        (txt_dir / f"{name}.txt").write_text("x", encoding="utf-8")
+    (txt_dir / "_click_log.jsonl").write_text("", encoding="utf-8")
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["GUID"])
+    for g in ("{" + _g(1) + "}", _g(3), _g(4)):
+        ws.append([g])
+    wb.save(str(txt_dir / GUIDS_EXCEL_FILENAME))
+    return str(txt_dir), str(list_path)
+
+
+def test_reconcile_writes_report_and_requeue(tmp_path):
+    txt_dir, list_path = _setup(tmp_path)
+    rep = reconcile(txt_dir, list_path=list_path)
+
+    with open(os.path.join(txt_dir, REPORT_FILENAME), encoding="utf-8") as f:
+        report = json.load(f)
+    assert (report["listed"], report["files"], report["ledger"]) == (4, 5, 3)
+    assert report["missing"] == [{"index": 4, "guid": _g(4)}]
+    assert report["duplicates"] == {_g(3): [f"{_g(3)}.txt", f"{_g(3)}__1.txt"]}
+    assert report["orphaned"] == [_g(9)]
+    assert report["ledger_without_file"] == [_g(4)]
+    assert report["file_without_ledger"] == [_g(2), _g(9)]
+    assert rep.as_dict()["missing"] == report["missing"]
+
+    assert os.path.isfile(os.path.join(txt_dir, REQUEUE_FILENAME))
+    assert load_requeue(txt_dir) == [(4, _g(4))]
+
+
+def test_reconcile_no_requeue_does_not_write_it(tmp_path):
+    txt_dir, list_path = _setup(tmp_path)
+    reconcile(txt_dir, list_path=list_path, write_requeue=False)
+    assert not os.path.exists(os.path.join(txt_dir, REQUEUE_FILENAME))
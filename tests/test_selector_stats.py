@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import selector_stats  # noqa: E402
+from selector_stats import ordered, record_success, snapshot  # noqa: E402
+
+
+XPATHS = ["//a[1]", "//a[2]", "//a[3]"]
+
+
+@pytest.fixture
+def stats_file(tmp_path, monkeypatch):
+    path = str(tmp_path / selector_stats.STATS_FILENAME)
+    monkeypatch.setattr(selector_stats, "stats_path", lambda: path)
+    monkeypatch.setattr(selector_stats, "_stats", None)
+    monkeypatch.setattr(selector_stats, "_pending", {})
+    return path
+
+
+def _restart(monkeypatch):
+    # как новый процесс: статистика в памяти не загружена
+    monkeypatch.setattr(selector_stats, "_stats", None)
+    monkeypatch.setattr(selector_stats, "_pending", {})
+
+
+def test_unknown_chain_keeps_order(stats_file):
+    assert ordered("шаг 1", XPATHS) == XPATHS
+    assert ordered(None, XPATHS) == XPATHS
+
+
+def test_last_success_goes_first(stats_file, monkeypatch):
+    record_success("шаг 1", XPATHS[2], missed=XPATHS[:2])
+    assert ordered("шаг 1", XPATHS) == [XPATHS[2], XPATHS[0], XPATHS[1]]
+
+    _restart(monkeypatch)
+    entries = snapshot()["шаг 1"]
+    assert entries[XPATHS[0]]["misses"] == 1 and entries[XPATHS[0]]["hits"] == 0
+    assert entries[XPATHS[2]]["hits"] == 1
+    assert ordered("шаг 1", XPATHS)[0] == XPATHS[2]
+
+    monkeypatch.setattr(selector_stats.time, "time", lambda: 4102444800.0)
+    record_success("шаг 1", XPATHS[1])
+    assert ordered("шаг 1", XPATHS) == [XPATHS[1], XPATHS[2], XPATHS[0]]
+
+
+def test_save_keeps_other_processes_wins(stats_file, monkeypatch):
+    record_success("шаг 1", XPATHS[0])  # этот процесс загрузил статистику
+    other = {"chains": {
+        "шаг 1": {XPATHS[0]: {"hits": 5, "misses": 0, "last_ok": 100.0}},
+        "период по": {XPATHS[1]: {"hits": 1, "misses": 2, "last_ok": 100.0}},
+    }}
+    with open(stats_file, "w", encoding="utf-8") as f:
+        json.dump(other, f)  # тем временем файл перезаписал другой рабочий
+
+    record_success("шаг 1", XPATHS[0])
+    with open(stats_file, encoding="utf-8") as f:
+        chains = json.load(f)["chains"]
+    assert chains["шаг 1"][XPATHS[0]]["hits"] == 6
+    assert chains["период по"][XPATHS[1]] == {"hits": 1, "misses": 2, "last_ok": 100.0}
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from work_queue import STATE_DONE, SqliteWorkQueue, split_chunks  # noqa: E402
+
+
+def _log(db, item_id, worker, event):
+    with sqlite3.connect(db, timeout=30) as c:
+        c.execute("INSERT INTO log(item, worker, event, ts) VALUES (?, ?, ?, ?)", (item_id, worker, event, time.time()))
+
+
+def _worker(db, name, stall_first):
+    # исполнитель: берёт диапазоны, пока они есть; stall_first — первую аренду держит дольше её срока
+    q = SqliteWorkQueue(db)
+    stalled = False
+    while True:
+        lease_s = 0.3 if stall_first and not stalled else 30
+        item = q.lease(name, lease_s)
+        if item is None:
+            return
+        _log(db, item.id, name, "lease")
+        if stall_first and not stalled:
+            stalled = True
+            time.sleep(1.0)
+        else:
+            time.sleep(0.05)
+        _log(db, item.id, name, "complete" if q.complete(item.id, name) else "refused")
+
+
+def _queue(tmp_path, ranges):
+    db = str(tmp_path / "queue.db")
+    q = SqliteWorkQueue(db)
+    q.add_ranges(ranges)
+    return db, q
+
+
+def test_expired_lease_is_handed_over_and_old_owner_cannot_complete(tmp_path):
+    _, q = _queue(tmp_path, [(1, 100)])
+    a = q.lease("a", lease_s=0.1)
+    assert a is not None
+    assert q.lease("b", lease_s=30) is None  # аренда a ещё действует
+
+    time.sleep(0.2)
+    b = q.lease("b", lease_s=30)
+    assert b is not None and b.id == a.id and b.attempts == 2
+    assert q.heartbeat(a.id, "a") is False
+    assert q.complete(a.id, "a") is False
+    assert q.complete(b.id, "b") is True
+    assert q.counts() == {STATE_DONE: 1}
+
+
+def test_two_processes_never_complete_a_range_twice(tmp_path):
+    db, q = _queue(tmp_path, split_chunks(1, 400, 20))
+    with sqlite3.connect(db) as c:
+        c.execute("CREATE TABLE log(item INTEGER, worker TEXT, event TEXT, ts REAL)")
+
+    ps = [
+        multiprocessing.Process(target=_worker, args=(db, "slow", True)),
+        multiprocessing.Process(target=_worker, args=(db, "fast", False)),
+    ]
+    for p in ps:
+        p.start()
+    for p in ps:
+        p.join(60)
+        assert p.exitcode == 0
+
+    with sqlite3.connect(db) as c:
+        rows = c.execute("SELECT item, worker, event FROM log ORDER BY ts").fetchall()
+    completed = [(i, w) for i, w, e in rows if e == "complete"]
+    assert sorted(i for i, _ in completed) == list(range(1, 21))
+
+    # одновременно диапазон у одного исполнителя: повторная выдача — только после просрочки,
+    # и тогда прежний владелец диапазон не завершает
+    holders = {}
+    for item, worker, event in rows:
+        if event == "lease":
+            prev = holders.get(item)
+            if prev is not None:
+                assert (item, prev) not in completed
+            holders[item] = worker
+    assert q.counts() == {STATE_DONE: 20}
@@ -5,8 +5,10 @@ import time
 import shutil
 import zipfile
 import logging
+import tempfile
+import threading
 from dataclasses import dataclass
-from typing import Callable, Optional, List, Tuple
+from typing import Callable, Dict, Optional, List, Set, Tuple
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
@@ -14,6 +16,20 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, WebDriverException
 
+from delta import FingerprintStore, load_done_guids, normalize_guid
+from grid_scrape import ListScrapeWriter
+from manifest import Manifest, ManifestPlan
+from export_window import (
+    ExportWindow, ProgressWatermark, forget_late, get_window_size, has_partial_downloads, late_guids,
+    zip_mentions_guid,
+)
+from notifications import drain_toasts
+from pacing import aimd_enabled, backoff_pause, get_controller, report_error
+from postprocess import PostJob, PostProcessPool
+from work_queue import DEFAULT_LEASE_SECONDS, LeaseKeeper, WorkQueue, default_worker_id
+from frames import ROLE_TABLE
+from preflight import register_selectors
+
 
 # кнопка обновления (запускает скрипт обновления)
 X_REFRESH_BTN = (
@@ -41,6 +57,14 @@ X_TABLE_TBODY = (
     "table/tbody/tr/td/div[1]/div[1]/div/div/div/div[1]/div/div/div/div[2]/table/tbody[1]"
 )
 
+# header row of the same grid (th cells, th[1] — selection column)
+X_TABLE_HEADER_ROW = (
+    "/html/body/div[1]/div[1]/div[2]/div[3]/div[2]/div/div/div/div/div[2]/div[2]/div/div/table/tbody/tr/td/"
+    "table/tbody/tr/td/div[1]/div[1]/div/div/div/div[1]/div/div/div/div[1]/table/tbody/tr[1]"
+)
+
+register_selectors(ROLE_TABLE, {"заголовок таблицы": [X_TABLE_HEADER_ROW]}, required=("заголовок таблицы",))
+
 # row selection cell and guid cell (relative)
 REL_TD_SELECT = "./td[1]"
 REL_TD_GUID = "./td[9]"
@@ -131,8 +155,12 @@ def _is_partial_download(path: str) -> bool:
     return low.endswith(".crdownload") or low.endswith(".tmp") or low.endswith(".part")
 
 
-def _wait_for_new_zip(download_dir: str, since_ts: float, timeout: int, stop_check=None) -> Optional[str]:
+def _wait_for_new_zip(download_dir: str, since_ts: float, timeout: int, stop_check=None,
+                      guid: Optional[str] = None) -> Optional[str]:
+    # guid — ожидаемая запись: поздние ZIP других просроченных экспортов (если их видно по имени
+    # или содержимому) пропускаются, а не выдаются за ZIP этой записи
     deadline = _now() + timeout
+    skipped: Set[str] = set()
     last_candidate = None
     last_size = None
     stable_since = None
@@ -146,7 +174,7 @@ def _wait_for_new_zip(download_dir: str, since_ts: float, timeout: int, stop_che
             try:
                 if os.path.isdir(p) or _is_partial_download(p):
                     continue
-                if not p.lower().endswith(".zip"):
+                if not p.lower().endswith(".zip") or p in skipped:
                     continue
                 if os.path.getmtime(p) >= since_ts - 0.2:
                     candidates.append(p)
@@ -169,6 +197,16 @@ def _wait_for_new_zip(download_dir: str, since_ts: float, timeout: int, stop_che
             else:
                 if size is not None and last_size is not None and size == last_size:
                     if stable_since and (_now() - stable_since) >= 1.2:
+                        other = late_guids(download_dir) - {guid}
+                        late, _ = zip_mentions_guid(cand, other) if other else (None, "")
+                        if late:
+                            logging.warning("%s — поздний ZIP просроченного экспорта %s, пропущен",
+                                            os.path.basename(cand), late)
+                            skipped.add(cand)
+                            last_candidate = None
+                            continue
+                        if guid:
+                            forget_late(download_dir, guid)
                         return cand
                 else:
                     last_size = size
@@ -266,6 +304,7 @@ def get_paging_info_with_retry(driver, cfg: WaitCfg, stop_check=None) -> Tuple[i
         if not _paging_has_error(txt):
             return cur, tot, shown, total, txt
 
+        report_error("пагинация '?'")
         if attempt < 2:
             _click_refresh_and_wait(driver, cfg, stop_check)
             _safe_sleep(0.5, stop_check)
@@ -349,6 +388,80 @@ def _ensure_row_unselected(driver, tr_el, cfg: WaitCfg, stop_check=None) -> bool
         return True
 
 
+# снимок строк одним вызовом скрипта: [GUID (td[9]: title, иначе текст), тексты ячеек без td[1]]
+# arguments[0] — tbody (все строки) или одна строка tr
+_JS_ROWS_SNAPSHOT = """
+var src = arguments[0], rows = src.rows || [src], out = [];
+for (var i = 0; i < rows.length; i++) {
+    var cells = rows[i].cells, texts = [], guid = '';
+    for (var j = 1; j < cells.length; j++) texts.push((cells[j].textContent || '').trim());
+    var td = cells[8];
+    if (td) guid = (td.getAttribute('title') || '').trim() || (td.textContent || '').trim();
+    out.push([guid, texts]);
+}
+return out;
+"""
+
+
+def _rows_snapshot(driver, el) -> List[Tuple[str, List[str]]]:
+    """[(GUID, тексты видимых ячеек)] для строк tbody или одной строки"""
+    try:
+        data = driver.execute_script(_JS_ROWS_SNAPSHOT, el) or []
+    except Exception:
+        return []
+    return [(str(g or ""), [str(c or "") for c in (cells or [])]) for g, cells in data]
+
+
+def _page_snapshot(driver, cfg: WaitCfg) -> List[Tuple[str, List[str]]]:
+    """Снимок строк текущей страницы (по порядку строк)"""
+    try:
+        tbody = _find(driver, By.XPATH, X_TABLE_TBODY, cfg.medium, cfg.poll)
+    except Exception:
+        return []
+    return _rows_snapshot(driver, tbody)
+
+
+def _skip_by_snapshot(snap: Tuple[str, List[str]], done_guids, fingerprints: Optional[FingerprintStore]) -> bool:
+    """Дельта: GUID уже выгружен; режим изменений: отпечаток строки не изменился"""
+    guid, cells = snap
+    if not guid:
+        return False
+    if fingerprints is not None:
+        return fingerprints.classify(guid, fingerprints.fingerprint(cells)) == "unchanged"
+    return normalize_guid(guid) in done_guids
+
+
+def read_grid_header(driver, cfg: WaitCfg) -> List[str]:
+    """Заголовки столбцов таблицы без столбца выделения (в порядке ячеек снимка строк)"""
+    try:
+        tr = _find(driver, By.XPATH, X_TABLE_HEADER_ROW, cfg.medium, cfg.poll)
+        texts = driver.execute_script(
+            "var c = arguments[0].cells, out = [];"
+            "for (var i = 1; i < c.length; i++) out.push((c[i].textContent || '').trim());"
+            "return out;",
+            tr,
+        ) or []
+        return [str(t or "") for t in texts]
+    except Exception:
+        return []
+
+
+def _scrape_page(scrape: ListScrapeWriter, snap: List[Tuple[str, List[str]]], first_index: int,
+                 row_start: int = 1, end_index: Optional[int] = None) -> None:
+    """Пишет строки снимка страницы начиная с row_start; first_index — номер записи первой строки страницы"""
+    rows = []
+    for r_idx in range(row_start, len(snap) + 1):
+        idx = first_index + r_idx - 1
+        if end_index and idx > end_index:
+            break
+        guid, cells = snap[r_idx - 1]
+        rows.append((idx, guid, cells))
+    try:
+        scrape.write_rows(rows)
+    except Exception as e:
+        logging.warning("Не удалось записать строки списка: %s", e)
+
+
 def _read_guid_from_row(tr_el) -> str:
     try:
         td = tr_el.find_element(By.XPATH, REL_TD_GUID)
@@ -414,8 +527,12 @@ def _init_guids_excel_for_export(txt_out_dir: str, start_index: int) -> None:
             pass
 
 
-def _write_guid_to_excel(txt_out_dir: str, record_index_1based: int, guid: str) -> None:
-    """Записывает GUID обработанной записи в строку record_index_1based (1-based) в Excel. Строка 1 — заголовок"""
+def _write_guid_to_excel(txt_out_dir: str, record_index_1based: int, guid: str, by_guid: bool = False) -> None:
+    """
+    Записывает GUID обработанной записи в строку record_index_1based (1-based) в Excel. Строка 1 — заголовок
+    by_guid=True (дельта-выгрузка) — номер строки не используется: новые документы сдвигают список,
+    поэтому GUID дописывается в конец, если его ещё нет в журнале
+    """
     try:
         from openpyxl import Workbook  # type: ignore[import-untyped]
         from openpyxl import load_workbook  # type: ignore[import-untyped]
@@ -433,6 +550,11 @@ def _write_guid_to_excel(txt_out_dir: str, record_index_1based: int, guid: str)
             ws = wb.active
             ws.title = "GUID"
             ws.cell(row=1, column=1, value="GUID")
+        if by_guid:
+            known = {normalize_guid(r[0]) for r in ws.iter_rows(min_row=2, max_col=1, values_only=True) if r and r[0]}
+            if normalize_guid(guid) in known:
+                return
+            excel_row = ws.max_row + 1
         ws.cell(row=excel_row, column=1, value=guid)
         wb.save(p)
     except Exception as e:
@@ -478,6 +600,175 @@ def ask_start_index(default_start: int) -> int:
     return start
 
 
+# выбор имени <GUID>.txt, запись в Excel и _progress.json — под одной блокировкой (постобработка в потоках)
+_commit_lock = threading.Lock()
+
+
+def _commit_txt(
+    zip_path: str, guid: str, txt_out_dir: str, global_index: int, executor=None, replace: bool = False,
+    ledger_by_guid: bool = False,
+) -> str:
+    """
+    Извлекает TXT из ZIP во временную папку, переименовывает в <GUID>.txt и пишет GUID в Excel
+    executor — пул процессов для распаковки (необязательно)
+    replace=True — заменить существующий <GUID>.txt (документ изменился), а не создавать <GUID>__N.txt
+    ledger_by_guid=True — журнал ведётся по GUID, а не по номеру записи (см. _write_guid_to_excel)
+    """
+    work_dir = tempfile.mkdtemp(prefix="_extract_", dir=txt_out_dir)
+    try:
+        if executor is not None:
+            extracted_path = executor.submit(_extract_first_txt, zip_path, work_dir).result()
+        else:
+            extracted_path = _extract_first_txt(zip_path, work_dir)
+        if not extracted_path or not os.path.exists(extracted_path):
+            raise RuntimeError("TXT не найден в ZIP или не извлечён")
+        with _commit_lock:
+            if replace and guid.strip():
+                dst_txt = os.path.join(txt_out_dir, f"{guid.strip()}.txt")
+                os.replace(extracted_path, dst_txt)
+            else:
+                dst_txt = _unique_txt_path(txt_out_dir, guid)
+                shutil.move(extracted_path, dst_txt)
+            _write_guid_to_excel(txt_out_dir, global_index, guid, by_guid=ledger_by_guid)
+        return dst_txt
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _record_done(txt_out_dir: str, progress: ProgressWatermark, global_index: int) -> None:
+    """Отмечает запись; _progress.json пишется только при сдвиге непрерывного прогресса"""
+    with _commit_lock:
+        if progress.mark(global_index):
+            save_progress(txt_out_dir, progress.last_done)
+
+
+def _make_postprocess_pool(
+    txt_out_dir: str, progress: ProgressWatermark, inline: bool = False,
+    fingerprints: Optional[FingerprintStore] = None, ledger_by_guid: bool = False,
+) -> PostProcessPool:
+    """
+    Пул постобработки: распаковка, переименование, GUID в Excel, прогресс. inline — без потоков
+    fingerprints — после записи TXT запоминается новый отпечаток строки (изменённый документ заменяется)
+    ledger_by_guid — журнал GUID по GUID, а не по номеру записи (дельта-выгрузка)
+    """
+    pool = None
+
+    def _handle(job: PostJob):
+        replace = fingerprints is not None and fingerprints.is_replacing(job.guid)
+        _commit_txt(
+            job.zip_path, job.guid, txt_out_dir, job.index, pool.process_executor,
+            replace=replace, ledger_by_guid=ledger_by_guid,
+        )
+        if fingerprints is not None:
+            fingerprints.confirm(job.guid)
+        _record_done(txt_out_dir, progress, job.index)
+
+    pool = PostProcessPool(_handle) if inline else PostProcessPool.from_env(_handle)
+    return pool
+
+
+def _requeue_failed_jobs(txt_out_dir: str, pool: PostProcessPool) -> List[Tuple[int, str]]:
+    """Дожидается очереди постобработки; неудачные записи сохраняются в _requeue.json"""
+    pool.drain()
+    failed = [(j.index, j.guid) for j in pool.take_failed()]
+    if failed:
+        save_requeue(txt_out_dir, sorted(failed))
+        logging.warning("Постобработка: %d записей не обработано, записаны в %s", len(failed), REQUEUE_FILENAME)
+    return failed
+
+
+def _export_row_sync(
+    driver, tr, download_dir: str, txt_out_dir: str, cfg: WaitCfg, stop_check,
+    global_index: int, pool: PostProcessPool,
+) -> str:
+    """Одна попытка: выделить, экспорт, дождаться ZIP, извлечь, снять выделение. Возвращает GUID"""
+    if not _ensure_row_selected(driver, tr, cfg, stop_check):
+        raise RuntimeError("Не удалось выделить строку")
+
+    guid = _read_guid_from_row(tr)
+    if not guid:
+        raise RuntimeError("GUID пустой или не найден")
+
+    since_ts = _now()
+
+    btn = _find_clickable(driver, By.XPATH, X_BTN_EXPORT_TXT, cfg.medium, cfg.poll)
+    if not _robust_click(driver, btn):
+        raise RuntimeError("Не удалось нажать экспорт TXT")
+
+    zip_path = _wait_for_new_zip(download_dir, since_ts, cfg.long, stop_check, guid=guid)
+    if not zip_path or not os.path.exists(zip_path):
+        raise RuntimeError("Не удалось дождаться нового ZIP")
+
+    # при фоновой постобработке ошибки распаковки попадут в pool.failed
+    pool.submit(PostJob(zip_path, guid, global_index))
+
+    if not _ensure_row_unselected(driver, tr, cfg, stop_check):
+        raise RuntimeError("Не удалось снять выделение строки")
+    return guid
+
+
+def _fire_row_export(driver, tr, cfg: WaitCfg, stop_check=None) -> Tuple[str, float]:
+    """Выделить строку, нажать экспорт и сразу снять выделение — без ожидания ZIP"""
+    if not _ensure_row_selected(driver, tr, cfg, stop_check):
+        raise RuntimeError("Не удалось выделить строку")
+    guid = _read_guid_from_row(tr)
+    if not guid:
+        raise RuntimeError("GUID пустой или не найден")
+    btn = _find_clickable(driver, By.XPATH, X_BTN_EXPORT_TXT, cfg.medium, cfg.poll)
+    click_ts = _now()
+    if not _robust_click(driver, btn):
+        raise RuntimeError("Не удалось нажать экспорт TXT")
+    _safe_sleep(0.3, stop_check)
+    if not _ensure_row_unselected(driver, tr, cfg, stop_check):
+        raise RuntimeError("Не удалось снять выделение строки")
+    return guid, click_ts
+
+
+def _make_window(download_dir: str, size: int) -> ExportWindow:
+    """Окно экспортов; при EB_AIMD=1 размер регулирует AIMD в пределах size"""
+    controller = get_controller("exports", maximum=size) if aimd_enabled() else None
+    return ExportWindow(download_dir, size, controller=controller)
+
+
+def _collect_window(
+    window: ExportWindow, pool: PostProcessPool, cfg: WaitCfg,
+    stop_check, failed: List[Tuple[int, str]], drain: bool = False,
+) -> int:
+    """
+    Забирает завершённые скачивания окна: пока окно заполнено, либо (drain=True) до опустошения.
+    Просроченные и неизвлечённые записи добавляются в failed как (номер, GUID). Возвращает число готовых
+    """
+    n = 0
+    while window.pending and (drain or window.is_full()):
+        if stop_check and stop_check():
+            break
+        for c in window.wait_one(cfg.long, stop_check):
+            try:
+                pool.submit(PostJob(c.zip_path, c.pending.guid, c.pending.index))
+                window.stats.done += 1
+                n += 1
+            except Exception as e:
+                logging.warning("Запись #%s (%s): %s", c.pending.index, c.pending.guid, e)
+                window.stats.errors += 1
+                failed.append((c.pending.index, c.pending.guid))
+        for p in window.expire(cfg.long):
+            logging.warning("Запись #%s (%s): ZIP не пришёл за %s с", p.index, p.guid, cfg.long)
+            failed.append((p.index, p.guid))
+    return n
+
+
+def _find_row_for_retry(driver, cfg: WaitCfg, guid: str, row_in_page: int):
+    """Строка текущей страницы по GUID, иначе по номеру на странице"""
+    rows = _get_rows(driver, cfg)
+    if guid:
+        for tr in rows:
+            if _read_guid_from_row(tr) == guid:
+                return tr
+    if 1 <= row_in_page <= len(rows):
+        return rows[row_in_page - 1]
+    return None
+
+
 def export_all_rows_to_txt(
     driver,
     download_dir: str,
@@ -485,10 +776,30 @@ def export_all_rows_to_txt(
     cfg: WaitCfg = WaitCfg(),
     stop_check=None,
     start_index: int = 1,
+    end_index: Optional[int] = None,
+    reset_ledger: bool = True,
+    delta: bool = False,
+    changes: bool = False,
+    scrape: Optional[ListScrapeWriter] = None,
+    plan: Optional[ManifestPlan] = None,
+    manifest_total: int = 0,
+    manifest: Optional[Manifest] = None,
+    rewind: Optional[Callable[[], None]] = None,
 ) -> Tuple[int, int]:
     """
     Выгружает TXT для каждой строки всех страниц
     start_index задаётся снаружи (запрос в начале программы). 0 недопустим — передавать не меньше 1
+    end_index — последняя выгружаемая запись (включительно), None — до конца списка
+    reset_ledger=False — не удалять processed_guids.xlsx при start_index=1 (диапазоны из очереди)
+    delta=True — пропускать записи, GUID которых уже есть в папке TXT или журнале (журнал не очищается)
+    changes=True — как delta, но уже выгруженные записи с изменившимся отпечатком строки выгружаются заново
+    scrape — попутно пишет ячейки каждой страницы в список (CSV/SQLite) из того же снимка страницы
+    plan, manifest_total — план по манифесту списка: точное число записей и оценка оставшегося времени по страницам
+    manifest — манифест списка как рабочий список: выгружаются только строки, GUID которых есть среди записей
+    манифеста start_index..end_index (при delta — ещё не выгруженных); когда рабочий список пройден, обход
+    страниц прекращается, а записи списка, не встреченные в таблице, уходят в _requeue.json
+    rewind() — вернуть таблицу на первую страницу перед повтором записей из _requeue.json
+    При EB_TXT_WINDOW > 1 в пределах страницы одновременно ожидается до W скачиваний
     Возвращает (total_records, downloaded_count)
     """
     if start_index <= 0:
@@ -496,6 +807,9 @@ def export_all_rows_to_txt(
     original_implicit = None
     total_records_stored = 0  # общее число записей для финального вывода
     downloaded = 0
+    window = None
+    pool = None
+    fingerprints = None
     try:
         try:
             original_implicit = driver.timeouts.implicit_wait
@@ -507,7 +821,27 @@ def export_all_rows_to_txt(
             pass
 
         os.makedirs(txt_out_dir, exist_ok=True)
-        _init_guids_excel_for_export(txt_out_dir, start_index)
+        delta = delta or changes
+        done_guids = load_done_guids(txt_out_dir, _guids_excel_path(txt_out_dir)) if delta else set()
+        fingerprints = (
+            FingerprintStore(txt_out_dir, done_guids, read_grid_header(driver, cfg)) if changes else None
+        )
+        delta_skipped = 0
+        # рабочий список по манифесту: GUID -> номер записи в списке
+        work: Dict[str, int] = {}
+        listed_skipped = 0
+        if manifest is not None:
+            for idx, g in manifest.iter_guids(start_index, end_index):
+                if changes or g not in done_guids:
+                    work.setdefault(g, idx)
+            logging.info("Манифест: к выгрузке по списку %d записей", len(work))
+        if reset_ledger and not delta:
+            _init_guids_excel_for_export(txt_out_dir, start_index)
+
+        window = _make_window(download_dir, get_window_size())
+        windowed = window.size > 1
+        progress = ProgressWatermark(start_index)
+        pool = _make_postprocess_pool(txt_out_dir, progress, fingerprints=fingerprints, ledger_by_guid=delta)
 
         cur_page, total_pages, shown, total_records, _ = get_paging_info_with_retry(
             driver, cfg, stop_check
@@ -519,6 +853,11 @@ def export_all_rows_to_txt(
             total_records = total_pages * rows_first
 
         total_records_stored = total_records  # для финального вывода "Всего M записей"
+        if manifest_total:
+            if manifest_total != total_records:
+                logging.warning("Манифест: %d записей, по пагинации %d", manifest_total, total_records)
+            total_records_stored = manifest_total
+        run_started = _now()
 
         skipped = max(0, start_index - 1)
         total_effective = max(0, total_records - skipped)
@@ -547,6 +886,9 @@ def export_all_rows_to_txt(
         while True:
             if stop_check and stop_check():
                 break
+            if manifest is not None and not work:
+                logging.info("Манифест: все записи рабочего списка пройдены")
+                break
 
             rows = _get_rows(driver, cfg)
             if not rows:
@@ -559,9 +901,47 @@ def export_all_rows_to_txt(
             if global_index > start_index:
                 row_start = 1
 
+            page_failed: List[Tuple[int, str]] = []
+            snap_needed = delta or scrape is not None or manifest is not None
+            page_snap = _page_snapshot(driver, cfg) if snap_needed else []
+            if manifest is not None and row_start <= len(page_snap):
+                # сдвиг таблицы относительно списка: номера строк не совпадают с номерами записей списка
+                first_guid = normalize_guid(page_snap[row_start - 1][0])
+                expected = manifest.guid_at(global_index)
+                if first_guid and expected and first_guid != expected:
+                    at = manifest.index_of(first_guid)
+                    logging.info(
+                        "Манифест: строка #%d таблицы — запись #%s списка (таблица сдвинута относительно списка)",
+                        global_index, at if at else "вне списка",
+                    )
+            if scrape is not None:
+                _scrape_page(scrape, page_snap, global_index - row_start + 1, row_start, end_index)
+
             for r_idx in range(row_start, len(rows) + 1):
                 if stop_check and stop_check():
                     break
+                if end_index and global_index > end_index:
+                    break
+
+                # манифест: строки вне рабочего списка (уже выгружены или нет в списке) — без выделения и клика
+                if manifest is not None and r_idx <= len(page_snap):
+                    row_guid = normalize_guid(page_snap[r_idx - 1][0])
+                    if row_guid and row_guid not in work:
+                        if row_guid in done_guids:
+                            delta_skipped += 1
+                        else:
+                            listed_skipped += 1
+                        _record_done(txt_out_dir, progress, global_index)
+                        global_index += 1
+                        continue
+                    work.pop(row_guid, None)
+
+                # дельта: уже выгруженный (и не изменившийся) GUID — без выделения и клика
+                if r_idx <= len(page_snap) and _skip_by_snapshot(page_snap[r_idx - 1], done_guids, fingerprints):
+                    _record_done(txt_out_dir, progress, global_index)
+                    delta_skipped += 1
+                    global_index += 1
+                    continue
 
                 # освежаем список строк чтобы не ловить stale
                 rows = _get_rows(driver, cfg)
@@ -569,6 +949,30 @@ def export_all_rows_to_txt(
                     break
                 tr = rows[r_idx - 1]
 
+                if windowed:
+                    # окно: только клик экспорта, ZIP забираем, когда окно заполнено
+                    fired_guid = ""
+                    for attempt in range(1, 4):
+                        if stop_check and stop_check():
+                            break
+                        try:
+                            fired_guid, click_ts = _fire_row_export(driver, tr, cfg, stop_check)
+                            window.add(fired_guid, global_index, click_ts)
+                            break
+                        except Exception:
+                            fired_guid = ""
+                            try:
+                                _ensure_row_unselected(driver, tr, cfg, stop_check)
+                            except Exception:
+                                pass
+                            _safe_sleep(backoff_pause(0.8), stop_check)
+                    if not fired_guid:
+                        window.stats.errors += 1
+                        page_failed.append((global_index, _read_guid_from_row(tr)))
+                    downloaded += _collect_window(window, pool, cfg, stop_check, page_failed)
+                    global_index += 1
+                    continue
+
                 # три попытки на одну запись
                 ok_one = False
                 last_error = None
@@ -576,47 +980,22 @@ def export_all_rows_to_txt(
                     if stop_check and stop_check():
                         break
                     try:
-                        if not _ensure_row_selected(driver, tr, cfg, stop_check):
-                            raise RuntimeError("Не удалось выделить строку")
-
-                        guid = _read_guid_from_row(tr)
-                        if not guid:
-                            raise RuntimeError("GUID пустой или не найден")
-
-                        since_ts = _now()
-
-                        btn = _find_clickable(driver, By.XPATH, X_BTN_EXPORT_TXT, cfg.medium, cfg.poll)
-                        if not _robust_click(driver, btn):
-                            raise RuntimeError("Не удалось нажать экспорт TXT")
-
-                        zip_path = _wait_for_new_zip(download_dir, since_ts, cfg.long, stop_check)
-                        if not zip_path or not os.path.exists(zip_path):
-                            raise RuntimeError("Не удалось дождаться нового ZIP")
-
-                        extracted_path = _extract_first_txt(zip_path, txt_out_dir)
-                        if not extracted_path or not os.path.exists(extracted_path):
-                            raise RuntimeError("TXT не найден в ZIP или не извлечён")
-
-                        dst_txt = _unique_txt_path(txt_out_dir, guid)
-                        shutil.move(extracted_path, dst_txt)
-
-                        save_progress(txt_out_dir, global_index)
-                        _write_guid_to_excel(txt_out_dir, global_index, guid)
-
-                        if not _ensure_row_unselected(driver, tr, cfg, stop_check):
-                            raise RuntimeError("Не удалось снять выделение строки")
-
+                        _export_row_sync(
+                            driver, tr, download_dir, txt_out_dir, cfg, stop_check, global_index, pool
+                        )
                         downloaded += 1
+                        window.stats.done += 1
                         ok_one = True
                         break
 
                     except Exception as e:
                         last_error = e
+                        window.stats.errors += 1
                         try:
                             _ensure_row_unselected(driver, tr, cfg, stop_check)
                         except Exception:
                             pass
-                        _safe_sleep(0.8, stop_check)
+                        _safe_sleep(backoff_pause(0.8), stop_check)
 
                 if not ok_one:
                     # Восстановление при сбое (например, в систему пришла новая запись): обновить, перейти на нужную страницу, повторить 3 попытки
@@ -634,6 +1013,8 @@ def export_all_rows_to_txt(
                         _safe_sleep(0.8, stop_check)
                         _click_refresh_and_wait(driver, cfg, stop_check)
                     rows = _get_rows(driver, cfg)
+                    if snap_needed:
+                        page_snap = _page_snapshot(driver, cfg)
                     row_in_page = ((global_index - 1) % page_size) + 1
                     if row_in_page > len(rows):
                         err_text = str(last_error or "")
@@ -651,37 +1032,21 @@ def export_all_rows_to_txt(
                         if stop_check and stop_check():
                             break
                         try:
-                            if not _ensure_row_selected(driver, tr, cfg, stop_check):
-                                raise RuntimeError("Не удалось выделить строку")
-                            guid = _read_guid_from_row(tr)
-                            if not guid:
-                                raise RuntimeError("GUID пустой или не найден")
-                            since_ts = _now()
-                            btn = _find_clickable(driver, By.XPATH, X_BTN_EXPORT_TXT, cfg.medium, cfg.poll)
-                            if not _robust_click(driver, btn):
-                                raise RuntimeError("Не удалось нажать экспорт TXT")
-                            zip_path = _wait_for_new_zip(download_dir, since_ts, cfg.long, stop_check)
-                            if not zip_path or not os.path.exists(zip_path):
-                                raise RuntimeError("Не удалось дождаться нового ZIP")
-                            extracted_path = _extract_first_txt(zip_path, txt_out_dir)
-                            if not extracted_path or not os.path.exists(extracted_path):
-                                raise RuntimeError("TXT не найден в ZIP или не извлечён")
-                            dst_txt = _unique_txt_path(txt_out_dir, guid)
-                            shutil.move(extracted_path, dst_txt)
-                            save_progress(txt_out_dir, global_index)
-                            _write_guid_to_excel(txt_out_dir, global_index, guid)
-                            if not _ensure_row_unselected(driver, tr, cfg, stop_check):
-                                raise RuntimeError("Не удалось снять выделение строки")
+                            _export_row_sync(
+                                driver, tr, download_dir, txt_out_dir, cfg, stop_check, global_index, pool
+                            )
                             downloaded += 1
+                            window.stats.done += 1
                             ok_one = True
                             break
                         except Exception as e:
                             last_error = e
+                            window.stats.errors += 1
                             try:
                                 _ensure_row_unselected(driver, tr, cfg, stop_check)
                             except Exception:
                                 pass
-                            _safe_sleep(0.8, stop_check)
+                            _safe_sleep(backoff_pause(0.8), stop_check)
                     if not ok_one:
                         err_text = str(last_error or "")
                         if "выделить строку" in err_text.lower():
@@ -699,15 +1064,71 @@ def export_all_rows_to_txt(
                 if r_idx == len(rows):
                     _safe_sleep(1.5, stop_check)
 
+            if windowed:
+                # до перехода на следующую страницу: дождаться всех скачиваний окна,
+                # затем повторить сбойные записи этой страницы по одной
+                downloaded += _collect_window(
+                    window, pool, cfg, stop_check, page_failed, drain=True
+                )
+                for idx, guid in sorted(page_failed):
+                    if stop_check and stop_check():
+                        break
+                    last_error = None
+                    ok_one = False
+                    for attempt in range(1, 4):
+                        if stop_check and stop_check():
+                            break
+                        tr = _find_row_for_retry(driver, cfg, guid, ((idx - 1) % page_size) + 1)
+                        if tr is None:
+                            last_error = RuntimeError("строка не найдена на странице")
+                            break
+                        try:
+                            _export_row_sync(driver, tr, download_dir, txt_out_dir, cfg, stop_check, idx, pool)
+                            downloaded += 1
+                            window.stats.done += 1
+                            ok_one = True
+                            break
+                        except Exception as e:
+                            last_error = e
+                            window.stats.errors += 1
+                            try:
+                                _ensure_row_unselected(driver, tr, cfg, stop_check)
+                            except Exception:
+                                pass
+                            _safe_sleep(backoff_pause(0.8), stop_check)
+                    if not ok_one and not (stop_check and stop_check()):
+                        print(f"Всего {total_records_stored} записей. Скачано {downloaded} записей.")
+                        print(f"ОШИБКА. Последняя успешно обработанная запись: {load_progress(txt_out_dir)}")
+                        raise RuntimeError(f"Не удалось обработать запись #{idx}: {last_error}")
+                _safe_sleep(1.5, stop_check)
+
+            if fingerprints is not None:
+                fingerprints.save()
+            # уведомления страницы (печать, экспорт, сессия) — один вызов скрипта, только в лог
+            for t in drain_toasts(driver):
+                if t.is_error:
+                    report_error("уведомление об ошибке")
+            if plan is not None and plan.todo:
+                passed = downloaded + delta_skipped
+                elapsed = _now() - run_started
+                left = max(0, plan.todo - downloaded)
+                eta = (elapsed / downloaded * left) if downloaded else (plan.eta_s or 0)
+                logging.info(
+                    "Страница %d: выгружено %d из %d (пройдено записей %d), осталось ~%d мин",
+                    cur_page, downloaded, plan.todo, passed, int(eta // 60),
+                )
+
             if stop_check and stop_check():
                 break
+            if end_index and global_index > end_index:
+                break
 
             # если страниц больше нет
             cur_page, tot_pages_now, shown_now, total_now, _ = get_paging_info(driver, cfg)
             total_pages = tot_pages_now or total_pages
             total_records = total_now or total_records
             # на последней странице уточняем общее число записей
-            if tot_pages_now > 1 and cur_page >= tot_pages_now and shown_now > 0:
+            if not manifest_total and tot_pages_now > 1 and cur_page >= tot_pages_now and shown_now > 0:
                 total_records_stored = (tot_pages_now - 1) * rows_on_first_page + shown_now
 
             if cur_page >= total_pages:
@@ -721,10 +1142,391 @@ def export_all_rows_to_txt(
             # После перехода на новую страницу нажимаем кнопку обновления
             _click_refresh_and_wait(driver, cfg, stop_check)
 
+        failed = _requeue_failed_jobs(txt_out_dir, pool)
+        if work and not (stop_check and stop_check()):
+            unseen = sorted((idx, g) for g, idx in work.items())
+            logging.warning(
+                "Манифест: %d записей списка не встречено в таблице, записаны в %s", len(unseen), REQUEUE_FILENAME
+            )
+            failed = sorted(set(failed) | set(unseen))
+            save_requeue(txt_out_dir, failed)
+        if failed and not (stop_check and stop_check()):
+            downloaded += export_requeued(
+                driver, download_dir, txt_out_dir, cfg, stop_check, progress=progress, fingerprints=fingerprints,
+                ledger_by_guid=delta, rewind=rewind,
+            )
+
+        if listed_skipped:
+            logging.info("Манифест: пропущено %d строк таблицы, которых нет в рабочем списке", listed_skipped)
+        if fingerprints is not None:
+            fingerprints.report()
+        elif delta:
+            logging.info("Дельта-выгрузка: пропущено %d уже выгруженных записей, новых %d", delta_skipped, downloaded)
         print(f"Всего {total_records_stored} записей. Скачано {downloaded} записей.")
         return total_records_stored, downloaded
 
     finally:
+        if pool is not None:
+            pool.close()
+        if fingerprints is not None:
+            fingerprints.save()
+        if window is not None:
+            window.report(txt_out_dir)
+        try:
+            if original_implicit is not None:
+                driver.implicitly_wait(int(original_implicit))
+            else:
+                driver.implicitly_wait(5)
+        except Exception:
+            pass
+
+
+def scrape_grid_list(
+    driver,
+    scrape: ListScrapeWriter,
+    cfg: WaitCfg = WaitCfg(),
+    stop_check=None,
+) -> int:
+    """
+    Список всех записей без экспорта TXT: постраничный снимок ячеек (один вызов скрипта на страницу)
+    Возвращает число записанных строк
+    """
+    original_implicit = None
+    try:
+        try:
+            original_implicit = driver.timeouts.implicit_wait
+        except Exception:
+            original_implicit = None
+        try:
+            driver.implicitly_wait(0)
+        except Exception:
+            pass
+
+        cur_page, total_pages, _, _, _ = get_paging_info_with_retry(driver, cfg, stop_check)
+        if not scrape.header:
+            scrape.header = read_grid_header(driver, cfg)
+        page_size = 0
+        while True:
+            if stop_check and stop_check():
+                break
+            snap = _page_snapshot(driver, cfg)
+            if not snap:
+                break
+            page_size = page_size or len(snap)
+            _scrape_page(scrape, snap, (cur_page - 1) * page_size + 1)
+
+            cur_page, tot_pages_now, _, _, _ = get_paging_info(driver, cfg)
+            total_pages = tot_pages_now or total_pages
+            if cur_page >= total_pages:
+                break
+            if not _go_next_page(driver, cfg, stop_check):
+                break
+            cur_page, _, _, _, _ = get_paging_info(driver, cfg)
+            _safe_sleep(0.8, stop_check)
+            _click_refresh_and_wait(driver, cfg, stop_check)
+        return scrape.rows_written
+    finally:
+        try:
+            if original_implicit is not None:
+                driver.implicitly_wait(int(original_implicit))
+            else:
+                driver.implicitly_wait(5)
+        except Exception:
+            pass
+
+
+CLICK_LOG_FILENAME = "_clicks.jsonl"
+REQUEUE_FILENAME = "_requeue.json"
+
+
+def _click_log_path(txt_out_dir: str) -> str:
+    return os.path.join(txt_out_dir, CLICK_LOG_FILENAME)
+
+
+def _requeue_path(txt_out_dir: str) -> str:
+    return os.path.join(txt_out_dir, REQUEUE_FILENAME)
+
+
+def _append_click(txt_out_dir: str, global_index: int, guid: str, click_ts: float) -> None:
+    """Дописывает клик экспорта в журнал кликов (одна JSON-строка на клик)"""
+    try:
+        with open(_click_log_path(txt_out_dir), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"index": int(global_index), "guid": guid, "ts": click_ts}, ensure_ascii=False) + "\n")
+    except Exception as e:
+        logging.warning("Не удалось записать клик в журнал: %s", e)
+
+
+def load_click_log(txt_out_dir: str) -> List[dict]:
+    """Читает журнал кликов; при повторных кликах одного GUID остаётся последний"""
+    by_guid = {}
+    try:
+        with open(_click_log_path(txt_out_dir), "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("guid"):
+                    by_guid[rec["guid"]] = rec
+    except Exception:
+        pass
+    return sorted(by_guid.values(), key=lambda r: r.get("ts", 0))
+
+
+def save_requeue(txt_out_dir: str, items: List[Tuple[int, str]]) -> None:
+    """Сохраняет записи для повторного экспорта: [(номер, GUID), ...]"""
+    try:
+        with open(_requeue_path(txt_out_dir), "w", encoding="utf-8") as f:
+            json.dump(
+                {"items": [{"index": int(i), "guid": g} for i, g in items]},
+                f, ensure_ascii=False, indent=2,
+            )
+    except Exception:
+        pass
+
+
+def load_requeue(txt_out_dir: str) -> List[Tuple[int, str]]:
+    try:
+        with open(_requeue_path(txt_out_dir), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return [(int(it.get("index", 0)), it.get("guid", "")) for it in data.get("items", [])]
+    except Exception:
+        return []
+
+
+def _walk_rows(driver, cfg: WaitCfg, stop_check, start_index: int, on_row: Callable,
+               end_index: Optional[int] = None, rewind: Optional[Callable[[], None]] = None) -> int:
+    """
+    Обходит строки всех страниц начиная с записи start_index и вызывает on_row(tr, global_index)
+    Если on_row вернул False или пройдена запись end_index — обход прекращается.
+    Таблица уже дальше страницы записи start_index — rewind() (возврат к первой странице), без него — RuntimeError:
+    кнопки «предыдущая» обход не использует
+    Возвращает общее число записей по пагинации
+    """
+    cur_page, total_pages, _, total_records, _ = get_paging_info_with_retry(driver, cfg, stop_check)
+    page_size = max(1, len(_get_rows(driver, cfg)))
+    if total_records <= 0:
+        total_records = total_pages * page_size
+    target_page = ((max(1, start_index) - 1) // page_size) + 1
+    if cur_page > target_page and rewind is not None:
+        logging.info("Таблица на странице %d, нужна %d — возврат к первой странице", cur_page, target_page)
+        rewind()
+        cur_page, _, _, _, _ = get_paging_info_with_retry(driver, cfg, stop_check)
+    if cur_page > target_page:
+        raise RuntimeError(f"Таблица на странице {cur_page}, а обход должен начаться со страницы {target_page}")
+
+    while cur_page < target_page:
+        if stop_check and stop_check():
+            return total_records
+        if not _go_next_page(driver, cfg, stop_check):
+            raise RuntimeError(f"Не удалось перейти на страницу {cur_page + 1}")
+        cur_page, _, _, _, _ = get_paging_info(driver, cfg)
+        _safe_sleep(0.6, stop_check)
+
+    while True:
+        if stop_check and stop_check():
+            break
+        rows = _get_rows(driver, cfg)
+        if not rows:
+            break
+        for r_idx in range(1, len(rows) + 1):
+            if stop_check and stop_check():
+                break
+            global_index = (cur_page - 1) * page_size + r_idx
+            if global_index < start_index:
+                continue
+            if end_index and global_index > end_index:
+                return total_records
+            rows = _get_rows(driver, cfg)
+            if r_idx - 1 >= len(rows):
+                break
+            if on_row(rows[r_idx - 1], global_index) is False:
+                return total_records
+
+        if stop_check and stop_check():
+            break
+        cur_page, tot_pages_now, _, total_now, _ = get_paging_info(driver, cfg)
+        total_pages = tot_pages_now or total_pages
+        total_records = total_now or total_records
+        if cur_page >= total_pages:
+            break
+        if not _go_next_page(driver, cfg, stop_check):
+            break
+        cur_page, _, _, _, _ = get_paging_info(driver, cfg)
+        _safe_sleep(0.8, stop_check)
+        _click_refresh_and_wait(driver, cfg, stop_check)
+    return total_records
+
+
+def collect_clicked_exports(
+    download_dir: str,
+    txt_out_dir: str,
+    since_ts: float,
+    pool: PostProcessPool,
+    idle_timeout: float,
+    stop_check=None,
+) -> Tuple[int, List[Tuple[int, str]]]:
+    """
+    Вторая фаза: сопоставляет ZIP из папки загрузок (новее since_ts) с журналом кликов
+    только по GUID в имени файла, именах файлов архива или содержимом: при сотнях кликов
+    один пропавший архив сдвинул бы сопоставление по порядку для всех следующих.
+    Несопоставленные архивы остаются в папке, их записи уходят на повтор
+    Ждёт, пока idle_timeout секунд не появляется новых архивов и нет незавершённых скачиваний
+    Возвращает (число извлечённых, [(номер, GUID) без архива])
+    """
+    clicks = load_click_log(txt_out_dir)
+    window = ExportWindow(download_dir, max(1, len(clicks)), since_ts=since_ts, by_order=False)
+    for rec in clicks:
+        window.add(rec["guid"], int(rec.get("index", 0)), float(rec.get("ts", since_ts)))
+
+    collected = 0
+    missing: List[Tuple[int, str]] = []
+    last_activity = _now()
+    while window.pending:
+        if stop_check and stop_check():
+            break
+        done = window.poll()
+        for c in done:
+            try:
+                pool.submit(PostJob(c.zip_path, c.pending.guid, c.pending.index))
+                window.stats.done += 1
+                collected += 1
+            except Exception as e:
+                logging.warning("Запись #%s (%s): %s", c.pending.index, c.pending.guid, e)
+                window.stats.errors += 1
+                missing.append((c.pending.index, c.pending.guid))
+        if done or has_partial_downloads(download_dir):
+            last_activity = _now()
+        elif _now() - last_activity > idle_timeout:
+            break
+        time.sleep(0.25)
+
+    if window.unmatched:
+        logging.warning("Экспорт в 2 фазы: %d архивов без GUID в имени и содержимом не сопоставлено",
+                        len(window.unmatched))
+    missing.extend((p.index, p.guid) for p in window.pending)
+    window.stats.errors += len(window.pending)
+    pool.drain()
+    failed = [(j.index, j.guid) for j in pool.take_failed()]
+    collected -= len(failed)
+    missing.extend(failed)
+    window.report(txt_out_dir)
+    return collected, sorted(missing)
+
+
+def export_fire_then_collect(
+    driver,
+    download_dir: str,
+    txt_out_dir: str,
+    cfg: WaitCfg = WaitCfg(),
+    stop_check=None,
+    start_index: int = 1,
+    end_index: Optional[int] = None,
+    delta: bool = False,
+    changes: bool = False,
+    rewind: Optional[Callable[[], None]] = None,
+) -> Tuple[int, int]:
+    """
+    Двухфазный экспорт:
+    1. Обход всех страниц: клик экспорта TXT по каждой записи без ожидания скачивания, клики пишутся в журнал
+    2. Сопоставление скачанных ZIP с журналом кликов, извлечение TXT
+    3. Записи без архива сохраняются в _requeue.json и выгружаются повторно по одной
+    delta=True — записи с уже выгруженным GUID пропускаются без клика
+    changes=True — пропускаются только записи, отпечаток строки которых не изменился
+    rewind() — вернуть таблицу на первую страницу перед повтором (после обхода она на последней)
+    Возвращает (total_records, downloaded_count)
+    """
+    if start_index <= 0:
+        start_index = 1
+    original_implicit = None
+    pool = None
+    fingerprints = None
+    try:
+        try:
+            original_implicit = driver.timeouts.implicit_wait
+        except Exception:
+            original_implicit = None
+        try:
+            driver.implicitly_wait(0)
+        except Exception:
+            pass
+
+        os.makedirs(txt_out_dir, exist_ok=True)
+        delta = delta or changes
+        done_guids = load_done_guids(txt_out_dir, _guids_excel_path(txt_out_dir)) if delta else set()
+        fingerprints = (
+            FingerprintStore(txt_out_dir, done_guids, read_grid_header(driver, cfg)) if changes else None
+        )
+        if not delta:
+            _init_guids_excel_for_export(txt_out_dir, start_index)
+        try:
+            if os.path.isfile(_click_log_path(txt_out_dir)):
+                os.remove(_click_log_path(txt_out_dir))
+        except Exception:
+            pass
+
+        run_start = _now()
+        progress = ProgressWatermark(start_index)
+        pool = _make_postprocess_pool(txt_out_dir, progress, fingerprints=fingerprints, ledger_by_guid=delta)
+        fire_failed: List[Tuple[int, str]] = []
+
+        def _fire(tr, global_index):
+            if end_index and global_index > end_index:
+                return False
+            if delta:
+                snap = _rows_snapshot(driver, tr)
+                if snap and _skip_by_snapshot(snap[0], done_guids, fingerprints):
+                    _record_done(txt_out_dir, progress, global_index)
+                    return
+            for attempt in range(1, 4):
+                if stop_check and stop_check():
+                    return
+                try:
+                    guid, click_ts = _fire_row_export(driver, tr, cfg, stop_check)
+                    _append_click(txt_out_dir, global_index, guid, click_ts)
+                    return
+                except Exception:
+                    try:
+                        _ensure_row_unselected(driver, tr, cfg, stop_check)
+                    except Exception:
+                        pass
+                    _safe_sleep(backoff_pause(0.8), stop_check)
+            fire_failed.append((global_index, _read_guid_from_row(tr)))
+
+        total_records = _walk_rows(driver, cfg, stop_check, start_index, _fire, rewind=rewind)
+        logging.info(
+            "Экспорт в 2 фазы: клики выполнены за %.1f с, неудачных кликов %d",
+            _now() - run_start, len(fire_failed),
+        )
+        if stop_check and stop_check():
+            return total_records, 0
+
+        downloaded, missing = collect_clicked_exports(
+            download_dir, txt_out_dir, run_start, pool, idle_timeout=cfg.long, stop_check=stop_check,
+        )
+        requeue = sorted(set(missing) | set(fire_failed))
+        save_requeue(txt_out_dir, requeue)
+        logging.info("Экспорт в 2 фазы: извлечено %d, на повтор %d", downloaded, len(requeue))
+
+        if requeue and not (stop_check and stop_check()):
+            downloaded += export_requeued(
+                driver, download_dir, txt_out_dir, cfg, stop_check, progress=progress, fingerprints=fingerprints,
+                ledger_by_guid=delta, rewind=rewind,
+            )
+
+        if fingerprints is not None:
+            fingerprints.report()
+        print(f"Всего {total_records} записей. Скачано {downloaded} записей.")
+        return total_records, downloaded
+
+    finally:
+        if pool is not None:
+            pool.close()
+        if fingerprints is not None:
+            fingerprints.save()
         try:
             if original_implicit is not None:
                 driver.implicitly_wait(int(original_implicit))
@@ -732,3 +1534,483 @@ def export_all_rows_to_txt(
                 driver.implicitly_wait(5)
         except Exception:
             pass
+
+
+def export_requeued(
+    driver,
+    download_dir: str,
+    txt_out_dir: str,
+    cfg: WaitCfg = WaitCfg(),
+    stop_check=None,
+    progress: Optional[ProgressWatermark] = None,
+    fingerprints: Optional[FingerprintStore] = None,
+    ledger_by_guid: bool = False,
+    rewind: Optional[Callable[[], None]] = None,
+) -> int:
+    """
+    Повторно выгружает записи из _requeue.json по одной (с ожиданием ZIP)
+    Строки ищутся по GUID (при пустом GUID — по номеру). Неудавшиеся остаются в _requeue.json
+    Страницы проходятся кнопкой «следующая» от первой записи списка до последней с запасом в одну страницу
+    с каждой стороны (сдвиг таблицы); переход сразу на нужную страницу таблица не поддерживает
+    rewind() — вернуть таблицу на первую страницу (после основного прохода она стоит на последней);
+    без него записи на уже пройденных страницах не выгружаются и остаются в _requeue.json
+    ledger_by_guid — журнал GUID по GUID, а не по номеру записи (дельта-выгрузка)
+    Возвращает число выгруженных
+    """
+    items = load_requeue(txt_out_dir)
+    if not items:
+        return 0
+    # GUID в _requeue.json — из таблицы, списка или сверки: сравниваются в виде normalize_guid
+    by_guid = {normalize_guid(g): (i, g) for i, g in items if g}
+    by_index = {i for i, g in items if not g}
+    if progress is None:
+        progress = ProgressWatermark(load_progress(txt_out_dir) + 1)
+    pool = _make_postprocess_pool(
+        txt_out_dir, progress, inline=True, fingerprints=fingerprints, ledger_by_guid=ledger_by_guid,
+    )
+    done = set()
+
+    def _retry(tr, global_index):
+        if len(done) >= len(items):
+            return False
+        guid = normalize_guid(_read_guid_from_row(tr))
+        if guid in by_guid:
+            key = by_guid[guid]
+        elif global_index in by_index:
+            key = (global_index, "")
+        else:
+            return
+        if key in done:
+            return
+        for attempt in range(1, 4):
+            if stop_check and stop_check():
+                return
+            try:
+                _export_row_sync(driver, tr, download_dir, txt_out_dir, cfg, stop_check, key[0], pool)
+                done.add(key)
+                return
+            except Exception:
+                try:
+                    _ensure_row_unselected(driver, tr, cfg, stop_check)
+                except Exception:
+                    pass
+                _safe_sleep(backoff_pause(0.8), stop_check)
+
+    page_size = max(1, len(_get_rows(driver, cfg)))
+    first = max(1, min(i for i, _ in items) - page_size)
+    try:
+        _walk_rows(
+            driver, cfg, stop_check, first, _retry, end_index=max(i for i, _ in items) + page_size, rewind=rewind,
+        )
+    except RuntimeError as e:
+        logging.warning("Повторный экспорт прерван: %s", e)
+    left = [it for it in items if it not in done]
+    save_requeue(txt_out_dir, left)
+    if left:
+        logging.warning("Повторный экспорт: не выгружено %d записей (см. %s)", len(left), REQUEUE_FILENAME)
+    return len(done)
+
+
+@dataclass
+class TabShard:
+    """Вкладка браузера с собственным диапазоном страниц общего отфильтрованного списка"""
+    number: int  # номер вкладки (1-based)
+    handle: str
+    frame_path: Tuple[int, ...] = ()  # путь iframe с таблицей от верхнего документа (() — default content)
+    first_page: int = 1
+    last_page: int = 1
+    cur_page: int = 1
+    row: int = 1  # следующая строка на текущей странице (1-based)
+    fired: int = 0
+    conflicts: int = 0
+    errors: int = 0
+    finished: bool = False
+    started: float = 0.0
+    # разбиение, к которому относится прогресс вкладки: при продолжении должно совпасть
+    start_index: int = 1
+    end_index: Optional[int] = None
+    page_size: int = 0
+    tabs: int = 1
+
+
+def _tab_progress_path(txt_out_dir: str, number: int) -> str:
+    return os.path.join(txt_out_dir, f"_progress_tab{number}.json")
+
+
+def _save_tab_progress(txt_out_dir: str, shard: TabShard) -> None:
+    try:
+        with open(_tab_progress_path(txt_out_dir, shard.number), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "start_index": shard.start_index, "end_index": shard.end_index,
+                    "page_size": shard.page_size, "tabs": shard.tabs,
+                    "first_page": shard.first_page, "last_page": shard.last_page,
+                    "page": shard.cur_page, "row": shard.row, "fired": shard.fired,
+                    "conflicts": shard.conflicts, "errors": shard.errors, "finished": shard.finished,
+                },
+                f, ensure_ascii=False, indent=2,
+            )
+    except Exception:
+        pass
+
+
+def _load_tab_progress(txt_out_dir: str, tabs: int, page_size: int, start_index: int,
+                       end_index: Optional[int]) -> Optional[List[dict]]:
+    """
+    Прогресс прерванной выгрузки вкладками, если её можно продолжить: файлы всех вкладок есть, число вкладок,
+    размер страницы и конец диапазона те же, не все вкладки закончили, а start_index не раньше начала
+    сохранённого разбиения. Иначе None — выгрузка заново (для нового начала удалить _progress_tab*.json)
+    """
+    saved = []
+    for number in range(1, tabs + 1):
+        try:
+            with open(_tab_progress_path(txt_out_dir, number), "r", encoding="utf-8") as f:
+                saved.append(json.load(f))
+        except Exception:
+            return None
+    try:
+        first = saved[0]
+        if any(
+            int(p.get("tabs", 0)) != tabs or int(p.get("page_size", 0)) != page_size
+            or int(p.get("start_index", 0)) != int(first.get("start_index", 0))
+            or p.get("end_index") != end_index
+            for p in saved
+        ):
+            return None
+        if start_index < int(first["start_index"]) or all(p.get("finished") for p in saved):
+            return None
+        for p in saved:
+            int(p["first_page"]), int(p["last_page"]), int(p["page"]), int(p["row"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return saved
+
+
+def _shard_step(
+    driver, shard: TabShard, page_size: int, window: ExportWindow, done_guids: dict,
+    cfg: WaitCfg, stop_check, failed: List[Tuple[int, str]], txt_out_dir: str, end_index: Optional[int] = None,
+) -> None:
+    """Один шаг вкладки: клик экспорта по следующей строке или переход на следующую страницу диапазона"""
+    rows = _get_rows(driver, cfg)
+    if shard.row > len(rows):
+        if shard.cur_page >= shard.last_page or not _go_next_page(driver, cfg, stop_check):
+            shard.finished = True
+        else:
+            shard.cur_page = get_paging_info(driver, cfg)[0]
+            shard.row = 1
+            _safe_sleep(0.8, stop_check)
+            _click_refresh_and_wait(driver, cfg, stop_check)
+        _save_tab_progress(txt_out_dir, shard)
+        return
+
+    tr = rows[shard.row - 1]
+    global_index = (shard.cur_page - 1) * page_size + shard.row
+    if end_index and global_index > end_index:
+        shard.finished = True
+        _save_tab_progress(txt_out_dir, shard)
+        return
+    shard.row += 1
+    guid = _read_guid_from_row(tr)
+    if guid and guid in done_guids:
+        # запись уже выгружена другой вкладкой (список сдвинулся)
+        shard.conflicts += 1
+        return
+
+    for attempt in range(1, 4):
+        if stop_check and stop_check():
+            return
+        try:
+            guid, click_ts = _fire_row_export(driver, tr, cfg, stop_check)
+            window.add(guid, global_index, click_ts)
+            done_guids[guid] = shard.number
+            shard.fired += 1
+            return
+        except Exception:
+            try:
+                _ensure_row_unselected(driver, tr, cfg, stop_check)
+            except Exception:
+                pass
+            _safe_sleep(backoff_pause(0.8), stop_check)
+    shard.errors += 1
+    failed.append((global_index, guid))
+
+
+def export_sharded_tabs(
+    driver,
+    shards: List[TabShard],
+    activate: Callable[[TabShard], None],
+    download_dir: str,
+    txt_out_dir: str,
+    cfg: WaitCfg = WaitCfg(),
+    stop_check=None,
+    start_index: int = 1,
+    end_index: Optional[int] = None,
+    rewind: Optional[Callable[[], None]] = None,
+) -> Tuple[int, int]:
+    """
+    Экспорт TXT несколькими вкладками одного браузера. Каждая вкладка получает непересекающийся
+    диапазон страниц; вкладки обслуживаются по очереди (по одной строке), скачивания идут параллельно.
+    activate(shard) — переключение драйвера на вкладку и её iframe
+    end_index — последняя выгружаемая запись (включительно), None — до конца списка
+    rewind() — вернуть таблицу активной вкладки на первую страницу (повтор записей вкладкой 1)
+    Возвращает (total_records, downloaded_count)
+    """
+    if start_index <= 0:
+        start_index = 1
+    os.makedirs(txt_out_dir, exist_ok=True)
+
+    activate(shards[0])
+    _, total_pages, _, total_records, _ = get_paging_info_with_retry(driver, cfg, stop_check)
+    page_size = max(1, len(_get_rows(driver, cfg)))
+    if total_records <= 0:
+        total_records = total_pages * page_size
+
+    progress = ProgressWatermark(start_index)
+    saved = _load_tab_progress(txt_out_dir, len(shards), page_size, start_index, end_index)
+    if saved is None:
+        # выгрузка заново: журнал GUID очищается только здесь (при start_index=1)
+        _init_guids_excel_for_export(txt_out_dir, start_index)
+        split_start = start_index
+        first_page = ((start_index - 1) // page_size) + 1
+        last_page = min(total_pages, ((end_index - 1) // page_size) + 1) if end_index else total_pages
+        n_pages = max(0, last_page - first_page + 1)
+        per_tab = max(1, -(-n_pages // len(shards)))
+        for k, shard in enumerate(shards):
+            shard.first_page = first_page + k * per_tab
+            shard.last_page = min(last_page, shard.first_page + per_tab - 1)
+            shard.finished = shard.first_page > last_page
+            shard.cur_page = shard.first_page
+            shard.row = ((start_index - 1) % page_size) + 1 if k == 0 else 1
+    else:
+        # продолжение: каждая вкладка — со своей сохранённой страницы и строки, журнал GUID не трогаем
+        split_start = int(saved[0]["start_index"])
+        for shard, p in zip(shards, saved):
+            shard.first_page, shard.last_page = int(p["first_page"]), int(p["last_page"])
+            shard.cur_page, shard.row = int(p["page"]), int(p["row"])
+            shard.finished = bool(p.get("finished"))
+            shard.fired = int(p.get("fired", 0))
+            shard.conflicts, shard.errors = int(p.get("conflicts", 0)), int(p.get("errors", 0))
+            # записи вкладки до сохранённой позиции уже выгружены — для непрерывного прогресса
+            begin = max(split_start, (shard.first_page - 1) * page_size + 1)
+            end = shard.last_page * page_size + 1 if shard.finished else (shard.cur_page - 1) * page_size + shard.row
+            for idx in range(max(begin, progress.last_done + 1), end):
+                progress.mark(idx)
+        logging.info(
+            "Выгрузка вкладками продолжается: %s",
+            ", ".join(f"вкладка {s.number} — {'готова' if s.finished else f'стр. {s.cur_page}, строка {s.row}'}"
+                      for s in shards),
+        )
+    for shard in shards:
+        shard.start_index, shard.end_index = split_start, end_index
+        shard.page_size, shard.tabs = page_size, len(shards)
+
+    # вывести каждую вкладку на страницу, с которой она начинает (первая страница диапазона или сохранённая)
+    for shard in shards:
+        if shard.finished or (stop_check and stop_check()):
+            continue
+        activate(shard)
+        cur_page = get_paging_info_with_retry(driver, cfg, stop_check)[0]
+        while cur_page < shard.cur_page:
+            if stop_check and stop_check():
+                break
+            if not _go_next_page(driver, cfg, stop_check):
+                raise RuntimeError(f"Вкладка {shard.number}: не удалось перейти на страницу {cur_page + 1}")
+            cur_page = get_paging_info(driver, cfg)[0]
+            _safe_sleep(0.6, stop_check)
+        if cur_page != shard.cur_page:
+            raise RuntimeError(f"Вкладка {shard.number}: таблица на странице {cur_page}, нужна {shard.cur_page}")
+        shard.started = _now()
+        _save_tab_progress(txt_out_dir, shard)
+        logging.info("Вкладка %d: страницы %d-%d, с %d", shard.number, shard.first_page, shard.last_page, cur_page)
+
+    window = _make_window(download_dir, len(shards) * get_window_size())
+    pool = _make_postprocess_pool(txt_out_dir, progress)
+    done_guids = {}
+    failed: List[Tuple[int, str]] = []
+    try:
+        while any(not s.finished for s in shards):
+            if stop_check and stop_check():
+                break
+            for shard in shards:
+                if shard.finished or (stop_check and stop_check()):
+                    continue
+                activate(shard)
+                _shard_step(
+                    driver, shard, page_size, window, done_guids, cfg, stop_check, failed, txt_out_dir, end_index,
+                )
+                _collect_window(window, pool, cfg, stop_check, failed)
+        _collect_window(window, pool, cfg, stop_check, failed, drain=True)
+
+        pool.drain()
+        failed.extend((j.index, j.guid) for j in pool.take_failed())
+        save_requeue(txt_out_dir, sorted(set(failed)))
+        failed_guids = {g for _, g in failed}
+        downloaded = len([g for g in done_guids if g not in failed_guids])
+
+        for shard in shards:
+            elapsed = max(0.001, _now() - shard.started) if shard.started else 0.001
+            ok = len([g for g, n in done_guids.items() if n == shard.number and g not in failed_guids])
+            logging.info(
+                "Вкладка %d: страницы %d-%d, выгружено %d за %.1f с (%.2f зап/мин), конфликтов %d, ошибок %d",
+                shard.number, shard.first_page, shard.last_page, ok, elapsed, ok * 60.0 / elapsed,
+                shard.conflicts, shard.errors + (shard.fired - ok),
+            )
+            _save_tab_progress(txt_out_dir, shard)
+
+        if failed and not (stop_check and stop_check()):
+            activate(shards[0])
+            downloaded += export_requeued(
+                driver, download_dir, txt_out_dir, cfg, stop_check, progress=progress, rewind=rewind,
+            )
+
+        print(f"Всего {total_records} записей. Скачано {downloaded} записей.")
+        return total_records, downloaded
+    finally:
+        pool.close()
+        window.report(txt_out_dir)
+
+
+def _merge_guid_ledger(src_path: str, txt_out_dir: str) -> int:
+    """
+    Переносит строки processed_guids.xlsx рабочего процесса в общий файл (по тем же номерам строк);
+    уже записанные GUID пропускаются, занятая другим GUID строка не перезаписывается
+    """
+    try:
+        from openpyxl import Workbook  # type: ignore[import-untyped]
+        from openpyxl import load_workbook  # type: ignore[import-untyped]
+    except ImportError:
+        logging.warning("openpyxl не установлен: GUID не переносятся в Excel")
+        return 0
+    try:
+        src = load_workbook(src_path, read_only=True)
+        rows = [
+            (i, r[0]) for i, r in enumerate(src.active.iter_rows(min_row=2, max_col=1, values_only=True), start=2)
+            if r and r[0]
+        ]
+        src.close()
+    except Exception as e:
+        logging.warning("Не удалось прочитать %s: %s", src_path, e)
+        return 0
+    if not rows:
+        return 0
+    p = _guids_excel_path(txt_out_dir)
+    with _commit_lock:
+        try:
+            if os.path.isfile(p):
+                wb = load_workbook(p)
+                ws = wb.active
+            else:
+                wb = Workbook()
+                ws = wb.active
+                ws.title = "GUID"
+                ws.cell(row=1, column=1, value="GUID")
+            known = {normalize_guid(r[0]) for r in ws.iter_rows(min_row=2, max_col=1, values_only=True) if r and r[0]}
+            for excel_row, guid in rows:
+                if normalize_guid(guid) in known:
+                    continue
+                # строка занята другим GUID (дельта-выгрузка ведёт журнал по GUID) — в конец
+                if ws.cell(row=excel_row, column=1).value:
+                    excel_row = ws.max_row + 1
+                ws.cell(row=excel_row, column=1, value=guid)
+                known.add(normalize_guid(guid))
+            wb.save(p)
+        except Exception as e:
+            logging.warning("Не удалось записать GUID в Excel: %s", e)
+            return 0
+    return len(rows)
+
+
+def merge_staging_outputs(staging_dir: str, txt_out_dir: str) -> int:
+    """
+    Переносит <GUID>.txt из папки рабочего процесса в общую папку TXT Outputs
+    и строки его processed_guids.xlsx в общий файл. Возвращает число перенесённых TXT
+    """
+    os.makedirs(txt_out_dir, exist_ok=True)
+    moved = 0
+    try:
+        names = sorted(os.listdir(staging_dir))
+    except Exception:
+        return 0
+    for name in names:
+        src = os.path.join(staging_dir, name)
+        if not name.lower().endswith(".txt") or not os.path.isfile(src):
+            continue
+        guid = re.sub(r"__\d+$", "", name[:-4])
+        try:
+            with _commit_lock:
+                shutil.move(src, _unique_txt_path(txt_out_dir, guid))
+            moved += 1
+        except Exception as e:
+            logging.warning("Не удалось перенести %s: %s", src, e)
+    src_ledger = _guids_excel_path(staging_dir)
+    if os.path.isfile(src_ledger):
+        _merge_guid_ledger(src_ledger, txt_out_dir)
+    return moved
+
+
+def export_from_queue(
+    driver,
+    queue: WorkQueue,
+    download_dir: str,
+    txt_out_dir: str,
+    cfg: WaitCfg = WaitCfg(),
+    stop_check=None,
+    rewind: Optional[Callable[[], None]] = None,
+    worker_id: Optional[str] = None,
+    lease_s: float = DEFAULT_LEASE_SECONDS,
+) -> Tuple[int, int]:
+    """
+    Выгрузка диапазонов, взятых в аренду из общей очереди (вместо start_index)
+    Пока диапазон выгружается, аренда продлевается в фоне вместе с прогрессом из _progress.json
+    rewind() — вернуть таблицу на первую страницу (если очередной диапазон раньше текущей позиции)
+    Возвращает (число диапазонов, downloaded_count)
+    """
+    worker_id = worker_id or default_worker_id()
+    position = 0  # последняя пройденная запись: таблица пролистана до неё
+    ranges_done = 0
+    downloaded = 0
+    while not (stop_check and stop_check()):
+        item = queue.lease(worker_id, lease_s, after=position + 1)
+        if item is None:
+            break
+        logging.info(
+            "Очередь: диапазон %d-%d (с %d), попытка %d",
+            item.first, item.last, item.resume_from, item.attempts,
+        )
+        if item.resume_from <= position and rewind is not None:
+            rewind()
+        keeper = LeaseKeeper(queue, item, worker_id, lambda: load_progress(txt_out_dir), lease_s)
+        try:
+            with keeper:
+                _, n = export_all_rows_to_txt(
+                    driver, download_dir, txt_out_dir, cfg, stop_check,
+                    start_index=item.resume_from, end_index=item.last, reset_ledger=False,
+                )
+            downloaded += n
+        except Exception as e:
+            state = queue.fail(item.id, worker_id, str(e), keeper.last_done())
+            logging.warning("Очередь: диапазон %d-%d не выгружен (%s) → %s", item.first, item.last, e, state)
+            position = item.last
+            if rewind is not None:
+                rewind()
+                position = 0
+            continue
+        position = item.last
+        if stop_check and stop_check():
+            queue.release(item.id, worker_id, keeper.last_done())
+            break
+        if keeper.lost.is_set():
+            # диапазон уже мог взять другой исполнитель — завершает его владелец аренды
+            logging.warning(
+                "Очередь: аренда диапазона %d-%d потеряна во время выгрузки, диапазон не завершён",
+                item.first, item.last,
+            )
+            continue
+        if not queue.complete(item.id, worker_id):
+            logging.warning(
+                "Очередь: диапазон %d-%d не завершён — аренда принадлежит другому исполнителю", item.first, item.last
+            )
+            continue
+        ranges_done += 1
+    logging.info("Очередь: выгружено диапазонов %d, записей %d; %s", ranges_done, downloaded, queue.counts())
+    return ranges_done, downloaded
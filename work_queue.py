@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+Очередь диапазонов записей с арендой (lease) для совместной выгрузки с нескольких машин.
+Каждый диапазон выдаётся одному исполнителю на ограниченное время; исполнитель продлевает
+аренду (heartbeat) и сообщает прогресс. Просроченная аренда возвращает диапазон в очередь,
+после MAX_ATTEMPTS неудач диапазон переводится в dead (на ручной разбор).
+
+Хранилище выбирается по адресу: sqlite:///путь/к/файлу.db. Для сетевого хранилища
+достаточно реализовать WorkQueue и добавить схему в open_work_queue.
+
+Командная строка:
+  python work_queue.py init --db queue.db --total 12000 [--start 1] [--chunk 500]
+  python work_queue.py status --db queue.db
+  python work_queue.py release --db queue.db        (dead → pending)
+  python work_queue.py simulate --db sim.db --total 2000 --procs 4
+"""
+import os
+import sys
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_URL_ENV = "EB_WORK_QUEUE"
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_CHUNK = 500
+MAX_ATTEMPTS = 3
+
+STATE_PENDING = "pending"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+STATE_DEAD = "dead"
+
+
+@dataclass
+class WorkItem:
+    id: int
+    first: int  # первая запись диапазона (1-based)
+    last: int  # последняя запись (включительно)
+    attempts: int
+    last_done: int  # последняя подтверждённая запись диапазона (first-1 — ничего)
+
+    @property
+    def resume_from(self) -> int:
+        return max(self.first, self.last_done + 1)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue(ABC):
+    """Интерфейс очереди. Все методы атомарны относительно других исполнителей."""
+
+    @abstractmethod
+    def add_ranges(self, ranges: List[Tuple[int, int]]) -> int:
+        ...
+
+    @abstractmethod
+    def lease(self, worker_id: str, lease_s: float = DEFAULT_LEASE_SECONDS, after: int = 0) -> Optional[WorkItem]:
+        """Выдаёт свободный (или просроченный) диапазон; предпочтительно first >= after."""
+
+    @abstractmethod
+    def heartbeat(self, item_id: int, worker_id: str, lease_s: float = DEFAULT_LEASE_SECONDS,
+                  last_done: Optional[int] = None) -> bool:
+        """Продлевает аренду и сохраняет прогресс; False — аренда потеряна."""
+
+    @abstractmethod
+    def complete(self, item_id: int, worker_id: str) -> bool:
+        """Отмечает диапазон выгруженным, только если аренда ещё у worker_id; False — аренда потеряна."""
+
+    @abstractmethod
+    def fail(self, item_id: int, worker_id: str, error: str, last_done: Optional[int] = None) -> str:
+        """Возвращает диапазон в очередь или в dead; возвращает новое состояние."""
+
+    @abstractmethod
+    def release(self, item_id: int, worker_id: str, last_done: Optional[int] = None) -> bool:
+        """Возвращает диапазон в очередь без учёта попытки (остановка пользователем)."""
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def release_dead(self) -> int:
+        ...
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    Очередь в файле SQLite. Каждая операция — отдельное соединение и транзакция BEGIN IMMEDIATE,
+    поэтому файл можно делить между процессами одной машины или (с осторожностью) сетевой папкой.
+    """
+
+    def __init__(self, path: str, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        with self._tx() as c:
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS work_items ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " first INTEGER NOT NULL, last INTEGER NOT NULL,"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " owner TEXT, lease_until REAL NOT NULL DEFAULT 0,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " last_done INTEGER NOT NULL DEFAULT 0,"
+                " error TEXT, updated REAL NOT NULL DEFAULT 0,"
+                " UNIQUE(first, last))"
+            )
+
+    def _tx(self):
+        return _SqliteTx(self.path)
+
+    @staticmethod
+    def _item(row) -> WorkItem:
+        return WorkItem(id=row[0], first=row[1], last=row[2], attempts=row[3], last_done=max(row[4], row[1] - 1))
+
+    def add_ranges(self, ranges: List[Tuple[int, int]]) -> int:
+        now = time.time()
+        with self._tx() as c:
+            before = c.execute("SELECT COUNT(*) FROM work_items").fetchone()[0]
+            c.executemany(
+                "INSERT OR IGNORE INTO work_items(first, last, last_done, updated) VALUES (?, ?, ?, ?)",
+                [(a, b, a - 1, now) for a, b in ranges],
+            )
+            after = c.execute("SELECT COUNT(*) FROM work_items").fetchone()[0]
+        return after - before
+
+    def lease(self, worker_id: str, lease_s: float = DEFAULT_LEASE_SECONDS, after: int = 0) -> Optional[WorkItem]:
+        now = time.time()
+        free = "(state = 'pending' OR (state = 'leased' AND lease_until < ?))"
+        with self._tx() as c:
+            # просроченные аренды с исчерпанными попытками — в dead
+            c.execute(
+                "UPDATE work_items SET state = 'dead', owner = NULL, error = COALESCE(error, 'lease expired'),"
+                " updated = ? WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = c.execute(
+                f"SELECT id, first, last, attempts, last_done FROM work_items WHERE {free} AND first >= ?"
+                " ORDER BY first LIMIT 1",
+                (now, after),
+            ).fetchone()
+            if row is None:
+                row = c.execute(
+                    f"SELECT id, first, last, attempts, last_done FROM work_items WHERE {free} ORDER BY first LIMIT 1",
+                    (now,),
+                ).fetchone()
+            if row is None:
+                return None
+            c.execute(
+                "UPDATE work_items SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1,"
+                " updated = ? WHERE id = ?",
+                (worker_id, now + lease_s, now, row[0]),
+            )
+        item = self._item(row)
+        item.attempts += 1
+        return item
+
+    def heartbeat(self, item_id: int, worker_id: str, lease_s: float = DEFAULT_LEASE_SECONDS,
+                  last_done: Optional[int] = None) -> bool:
+        now = time.time()
+        with self._tx() as c:
+            cur = c.execute(
+                "UPDATE work_items SET lease_until = ?, last_done = MAX(last_done, COALESCE(?, last_done)),"
+                " updated = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                (now + lease_s, last_done, now, item_id, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, item_id: int, worker_id: str) -> bool:
+        now = time.time()
+        with self._tx() as c:
+            cur = c.execute(
+                "UPDATE work_items SET state = 'done', owner = NULL, last_done = last, error = NULL, updated = ?"
+                " WHERE id = ? AND owner = ? AND state = 'leased'",
+                (now, item_id, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, item_id: int, worker_id: str, error: str, last_done: Optional[int] = None) -> str:
+        now = time.time()
+        with self._tx() as c:
+            row = c.execute(
+                "SELECT attempts FROM work_items WHERE id = ? AND owner = ? AND state = 'leased'",
+                (item_id, worker_id),
+            ).fetchone()
+            if row is None:
+                return ""
+            state = STATE_DEAD if row[0] >= self.max_attempts else STATE_PENDING
+            c.execute(
+                "UPDATE work_items SET state = ?, owner = NULL, lease_until = 0, error = ?,"
+                " last_done = MAX(last_done, COALESCE(?, last_done)), updated = ? WHERE id = ?",
+                (state, (error or "")[:500], last_done, now, item_id),
+            )
+        return state
+
+    def release(self, item_id: int, worker_id: str, last_done: Optional[int] = None) -> bool:
+        now = time.time()
+        with self._tx() as c:
+            cur = c.execute(
+                "UPDATE work_items SET state = 'pending', owner = NULL, lease_until = 0,"
+                " attempts = MAX(0, attempts - 1), last_done = MAX(last_done, COALESCE(?, last_done)), updated = ?"
+                " WHERE id = ? AND owner = ? AND state = 'leased'",
+                (last_done, now, item_id, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def counts(self) -> Dict[str, int]:
+        with self._tx() as c:
+            rows = c.execute("SELECT state, COUNT(*) FROM work_items GROUP BY state").fetchall()
+        return {s: n for s, n in rows}
+
+    def items(self) -> List[tuple]:
+        with self._tx() as c:
+            return c.execute(
+                "SELECT id, first, last, state, owner, attempts, last_done, error FROM work_items ORDER BY first"
+            ).fetchall()
+
+    def release_dead(self) -> int:
+        with self._tx() as c:
+            cur = c.execute(
+                "UPDATE work_items SET state = 'pending', attempts = 0, error = NULL, updated = ? WHERE state = 'dead'",
+                (time.time(),),
+            )
+            return cur.rowcount
+
+
+class _SqliteTx:
+    """Соединение + BEGIN IMMEDIATE; commit при выходе без исключения."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+        return False
+
+
+def open_work_queue(url: str) -> WorkQueue:
+    """sqlite:///путь — SqliteWorkQueue; путь без схемы тоже считается файлом SQLite."""
+    url = (url or "").strip()
+    if url.startswith("sqlite:///"):
+        return SqliteWorkQueue(url[len("sqlite:///"):])
+    if "://" not in url and url:
+        return SqliteWorkQueue(url)
+    raise ValueError(f"Неподдерживаемое хранилище очереди: {url}")
+
+
+def split_chunks(start: int, total: int, chunk: int) -> List[Tuple[int, int]]:
+    return [(a, min(total, a + chunk - 1)) for a in range(max(1, start), total + 1, max(1, chunk))]
+
+
+class LeaseKeeper:
+    """Фоновое продление аренды; progress() — текущая последняя подтверждённая запись."""
+
+    def __init__(self, queue: WorkQueue, item: WorkItem, worker_id: str,
+                 progress: Callable[[], Optional[int]], lease_s: float = DEFAULT_LEASE_SECONDS):
+        self.queue = queue
+        self.item = item
+        self.worker_id = worker_id
+        self.progress = progress
+        self.lease_s = lease_s
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        return False
+
+    def last_done(self) -> Optional[int]:
+        try:
+            v = self.progress()
+        except Exception:
+            return None
+        if v is None:
+            return None
+        return v if self.item.first - 1 <= v <= self.item.last else None
+
+    def _loop(self):
+        while not self._stop.wait(self.lease_s / 3.0):
+            try:
+                if not self.queue.heartbeat(self.item.id, self.worker_id, self.lease_s, self.last_done()):
+                    logger.warning("очередь: аренда диапазона %d-%d потеряна", self.item.first, self.item.last)
+                    self.lost.set()
+                    return
+            except Exception as e:
+                logger.debug("очередь: heartbeat не выполнен: %s", e)
+
+
+def _simulate_worker(db: str, n: int, lease_s: float, crash_every: int):
+    # имитация исполнителя: «выгружает» записи, записывает их в таблицу exported, иногда «падает»
+    q = SqliteWorkQueue(db)
+    wid = f"sim-{n}:{os.getpid()}"
+    while True:
+        item = q.lease(wid, lease_s)
+        if item is None:
+            return
+        if crash_every and item.id % crash_every == 0 and item.attempts == 1:
+            # половина диапазона выгружена, затем сбой — повтор должен продолжить со следующей записи
+            mid = item.resume_from + (item.last - item.resume_from) // 2
+            with _SqliteTx(db) as c:
+                c.executemany(
+                    "INSERT INTO exported(record, worker) VALUES (?, ?)",
+                    [(r, wid) for r in range(item.resume_from, mid + 1)],
+                )
+            q.fail(item.id, wid, "имитация сбоя", last_done=mid)
+            continue
+        with _SqliteTx(db) as c:
+            c.executemany(
+                "INSERT INTO exported(record, worker) VALUES (?, ?)",
+                [(r, wid) for r in range(item.resume_from, item.last + 1)],
+            )
+        q.heartbeat(item.id, wid, lease_s, item.last)
+        q.complete(item.id, wid)
+
+
+def _simulate(db: str, total: int, procs: int, chunk: int) -> bool:
+    import multiprocessing
+    if os.path.exists(db):
+        os.remove(db)
+    q = SqliteWorkQueue(db)
+    with _SqliteTx(db) as c:
+        c.execute("CREATE TABLE exported(record INTEGER, worker TEXT)")
+    q.add_ranges(split_chunks(1, total, chunk))
+    t0 = time.time()
+    ps = [multiprocessing.Process(target=_simulate_worker, args=(db, i, 30, 7)) for i in range(procs)]
+    for p in ps:
+        p.start()
+    for p in ps:
+        p.join()
+    with _SqliteTx(db) as c:
+        n, distinct = c.execute("SELECT COUNT(*), COUNT(DISTINCT record) FROM exported").fetchone()
+        lo, hi = c.execute("SELECT MIN(record), MAX(record) FROM exported").fetchone()
+    ok = n == distinct == total and lo == 1 and hi == total and q.counts() == {STATE_DONE: len(split_chunks(1, total, chunk))}
+    print(f"simulate: процессов {procs}, записей {n} (уникальных {distinct}), {q.counts()}, "
+          f"{time.time() - t0:.1f} с — {'OK' if ok else 'ОШИБКА'}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Очередь диапазонов записей с арендой")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_init = sub.add_parser("init")
+    p_init.add_argument("--db", required=True)
+    p_init.add_argument("--total", type=int, required=True)
+    p_init.add_argument("--start", type=int, default=1)
+    p_init.add_argument("--chunk", type=int, default=DEFAULT_CHUNK)
+    p_status = sub.add_parser("status")
+    p_status.add_argument("--db", required=True)
+    p_release = sub.add_parser("release")
+    p_release.add_argument("--db", required=True)
+    p_sim = sub.add_parser("simulate")
+    p_sim.add_argument("--db", required=True)
+    p_sim.add_argument("--total", type=int, default=2000)
+    p_sim.add_argument("--procs", type=int, default=4)
+    p_sim.add_argument("--chunk", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "init":
+        q = SqliteWorkQueue(args.db)
+        added = q.add_ranges(split_chunks(args.start, args.total, args.chunk))
+        print(f"Добавлено диапазонов: {added}. {q.counts()}")
+    elif args.cmd == "status":
+        q = SqliteWorkQueue(args.db)
+        for row in q.items():
+            if row[3] != STATE_DONE:
+                print(row)
+        print(q.counts())
+    elif args.cmd == "release":
+        print(f"Возвращено в очередь: {SqliteWorkQueue(args.db).release_dead()}")
+    elif args.cmd == "simulate":
+        return 0 if _simulate(args.db, args.total, args.procs, args.chunk) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())